@@ -0,0 +1,135 @@
+"""Persistent TTL/LRU cache for Perplexity article lookups with stale-while-revalidate"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from concurrency import SingleFlight, submit
+from rate_limit import BACKGROUND, priority
+from storage import cache_path
+from tracing import annotate, loggable_query
+
+logger = logging.getLogger(__name__)
+
+# Fresh for ARTICLE_CACHE_TTL, then served stale (and refreshed) for ARTICLE_CACHE_MAX_STALE more
+ARTICLE_CACHE_TTL = float(os.getenv("ARTICLE_CACHE_TTL", str(6 * 3600)))
+ARTICLE_CACHE_MAX_STALE = float(os.getenv("ARTICLE_CACHE_MAX_STALE", str(7 * 24 * 3600)))
+ARTICLE_CACHE_MAX_ENTRIES = int(os.getenv("ARTICLE_CACHE_MAX_ENTRIES", "2000"))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def normalize_query(query):
+    """Normalize a search query so trivially different phrasings share a cache entry"""
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.strip(" ?!.,;:")
+
+
+class ArticleCache:
+    """SQLite-backed article cache shared by all sessions and surviving restarts"""
+
+    def __init__(self, path, ttl=ARTICLE_CACHE_TTL, max_stale=ARTICLE_CACHE_MAX_STALE, max_entries=ARTICLE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._flights = SingleFlight("articles")
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS articles_accessed ON articles (accessed_at)")
+        self._conn.commit()
+
+    def get_or_fetch(self, query, fetch, cacheable=bool):
+        """Return cached articles for query, calling fetch(query) on a miss
+
+        Fresh entries are returned as-is. Stale entries are returned right away
+        while fetch runs in the background to replace them. Anything older than
+        ttl + max_stale is fetched synchronously, once for all concurrent callers
+        with the same query. Exceptions from fetch are not cached and propagate
+        to the caller, and neither are results cacheable(value) rejects (e.g.
+        "no articles found"), so one empty search does not hide articles for ttl.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        entry = self._get(key, now)
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < self.ttl:
+                annotate(cache="hit")
+                return value
+            if age < self.ttl + self.max_stale:
+                annotate(cache="stale")
+                self._refresh_in_background(key, query, fetch, cacheable)
+                return value
+
+        annotate(cache="miss")
+        # Identical searches started while this one runs wait for it instead of calling Perplexity again
+        return self._flights.do(key, self._fetch_and_put, key, query, fetch, cacheable)
+
+    def _fetch_and_put(self, key, query, fetch, cacheable):
+        value = fetch(query)
+        if cacheable(value):
+            self._put(key, value)
+        return value
+
+    def _get(self, key, now):
+        with self._lock:
+            row = self._conn.execute("SELECT value, fetched_at FROM articles WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE articles SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            return row
+
+    def _put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO articles (key, value, fetched_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            # Evict least recently used entries beyond the size limit
+            self._conn.execute(
+                "DELETE FROM articles WHERE key IN ("
+                "SELECT key FROM articles ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def _refresh_in_background(self, key, query, fetch, cacheable):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                # An empty result keeps the stale articles rather than replacing them
+                self._fetch_and_put(key, query, fetch, cacheable)
+            except Exception:
+                logger.warning("Background article refresh failed for %s", loggable_query(query), exc_info=True)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # The caller already has an answer, so the refresh yields to anyone still waiting for one
+        with priority(BACKGROUND):
+            submit(refresh)
+
+
+def get_article_cache():
+    """Return the process-wide article cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ArticleCache(cache_path("articles.sqlite3"))
+    return _cache
@@ -0,0 +1,72 @@
+"""Benchmark guardrail scanning against the previous per-keyword checks
+
+Run from the repository root: python benchmarks/bench_guardrails.py
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rendering import build_response  # noqa: E402
+from guardrails import get_guardrails  # noqa: E402
+
+LEGACY_PII = [
+    r'\b\d{3}-\d{2}-\d{4}\b',
+    r'\b\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b',
+    r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+]
+LEGACY_KEYWORDS = [
+    'racial slur', 'discrimination', 'violence against', 'hate speech',
+    'terrorist', 'terrorism', 'bomb', 'explosive', 'weapon', 'gun',
+    'suicide', 'self harm', 'kill yourself', 'harm others',
+    'sexual content', 'explicit', 'pornographic', 'arousal',
+    'gambling', 'casino', 'betting', 'illegal drugs', 'pharmaceuticals',
+    'phishing', 'scam', 'fraud', 'illegal activity', 'jailbreak',
+    'threaten', 'intimidate', 'bully', 'abuse', 'harass'
+]
+
+
+def legacy_validate(text):
+    """The check as it was before the guardrail engine"""
+    lowered = text.lower()
+    for pattern in LEGACY_PII:
+        if re.search(pattern, text):
+            return False
+    for keyword in LEGACY_KEYWORDS:
+        if keyword in lowered:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=4, help="response sections (about 0.8 KB each)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = get_guardrails()
+    # A clean response is the worst case: every position has to be rejected
+    content = build_response(args.sections).replace("Please provide relevant articles for this section", "")
+    if engine.scan(content, "output") is not None:
+        sys.exit("Benchmark corpus unexpectedly violates a rule")
+
+    print(f"{len(content)} characters")
+    # A trigger word without the rest of its phrase forces the full keyword regex to run
+    near_miss = content + "\nOperators plan to build a second hub in Jeddah"
+    cases = (
+        ("legacy", lambda: legacy_validate(content)),
+        ("input", lambda: engine.scan(content, "input")),
+        ("output", lambda: engine.scan(content, "output")),
+        ("near-miss", lambda: engine.scan(near_miss, "output")),
+    )
+    for name, func in cases:
+        best = min(timeit.repeat(func, repeat=args.repeat, number=args.number)) / args.number
+        print(f"{name:>9}: {best * 1e6:.1f} us per scan")
+
+
+if __name__ == "__main__":
+    main()
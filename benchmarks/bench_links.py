@@ -0,0 +1,125 @@
+"""Micro-benchmark of the link extractor against the previous per-line regex parsing
+
+Run from the repository root: python benchmarks/bench_links.py
+
+Checks every response in fixtures/perplexity_responses.jsonl against its
+expected links, then times the legacy parser, the extractor on whole
+responses and the extractor fed in small chunks as if streamed.
+
+The legacy parser neither canonicalizes nor deduplicates, so on short
+answers it is the faster of the two (canonical_url alone is about 1 us per
+link); the extractor wins once answers repeat links. The streamed figures
+include the cost of cutting the text into chunks.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from link_extractor import LinkExtractor, extract_links  # noqa: E402
+
+FIXTURES_PATH = os.path.join(BENCHMARK_DIR, "fixtures", "perplexity_responses.jsonl")
+
+
+def legacy_format_article_links(content):
+    """The parser as it was before the link extractor (without the guardrail filter)"""
+    lines = content.split('\n')
+    clean_lines = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if '[' in line and '](' in line and ('http' in line or 'www' in line):
+            if not re.match(r'^\[Article\s*\d*\]', line, re.IGNORECASE):
+                clean_lines.append(f"• {line}")
+        elif re.search(r'https?://[^\s]+', line):
+            urls = re.findall(r'https?://[^\s]+', line)
+            if urls:
+                url = urls[0]
+                title_part = re.sub(r'https?://[^\s]+', '', line).strip()
+                title_part = re.sub(r'[•\-\*\d\.\)]+', '', title_part).strip()
+                if title_part and len(title_part) > 10:
+                    clean_lines.append(f"• [{title_part}]({url})")
+                else:
+                    domain = re.search(r'https?://(?:www\.)?([^/]+)', url)
+                    domain_name = domain.group(1) if domain else url
+                    clean_lines.append(f"• [{domain_name}]({url})")
+    if len(clean_lines) < 3:
+        all_urls = re.findall(r'https?://[^\s)]+', content)
+        for i, url in enumerate(all_urls[:5]):
+            if not any(url in line for line in clean_lines):
+                domain = re.search(r'https?://(?:www\.)?([^/]+)', url)
+                domain_name = domain.group(1) if domain else f"Source {i+1}"
+                clean_lines.append(f"• [{domain_name}]({url})")
+    return '\n'.join(clean_lines)
+
+
+def load_fixtures(path=FIXTURES_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stream_links(content, chunk_size):
+    """Feed content to a LinkExtractor chunk_size characters at a time"""
+    extractor = LinkExtractor()
+    for start in range(0, len(content), chunk_size):
+        extractor.feed(content[start:start + chunk_size])
+    extractor.close()
+    return extractor.links
+
+
+def build_long_response(links, distinct):
+    """A long answer with links repeated (and re-tagged) as a model may do"""
+    lines = []
+    for i in range(links):
+        n = i % distinct
+        lines.append(f"{i + 1}. [Logistics market update number {n}](https://www.example{n % 7}.com/news/{n}?utm_source=perplexity) - Example")
+        if i % 3 == 0:
+            lines.append(f"Further reading: https://www.example{n % 7}.com/news/{n}/")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--long-links", type=int, default=400, help="links in the long synthetic response")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    failures = 0
+    for fixture in fixtures:
+        links = extract_links(fixture["content"], fixture.get("citations"), fixture.get("search_results"))
+        streamed = stream_links(fixture["content"], args.chunk_size) if not fixture.get("citations") else links
+        if [link.url for link in links] != fixture["expected"] or streamed != links:
+            failures += 1
+            print(f"MISMATCH {fixture['name']}: {[link.url for link in links]}")
+    print(f"{len(fixtures) - failures}/{len(fixtures)} fixtures match")
+
+    def best(func, number):
+        return min(timeit.repeat(func, repeat=args.repeat, number=number)) / number
+
+    corpus = [fixture["content"] for fixture in fixtures]
+    long_response = build_long_response(args.long_links, distinct=40)
+    cases = (
+        ("legacy", legacy_format_article_links),
+        ("extractor", extract_links),
+        ("streamed", lambda content: stream_links(content, args.chunk_size)),
+    )
+    print(f"fixture corpus ({sum(map(len, corpus))} characters) and a {len(long_response)}-character response with {args.long_links} links")
+    for name, func in cases:
+        corpus_time = best(lambda: [func(content) for content in corpus], args.number)
+        long_time = best(lambda: func(long_response), max(1, args.number // 20))
+        print(f"{name:>10}: {corpus_time * 1e6:8.1f} us per corpus, {long_time * 1e3:8.3f} ms per long response")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Micro-benchmark of the markdown converter against the previous regex cascade
+
+Run from the repository root: python benchmarks/bench_rendering.py
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rendering import SKIPPED_PHRASES, process_content_to_html  # noqa: E402
+
+
+def legacy_process_content_to_html(content):
+    """The converter as it was before the single-pass rewrite (no escaping)"""
+    lines = content.split('\n')
+    html_lines = []
+    in_list = False
+
+    for line in lines:
+        line_stripped = line.strip()
+        if not line_stripped:
+            if in_list:
+                html_lines.append('</ul>')
+                in_list = False
+            html_lines.append('<br>')
+            continue
+        if any(phrase in line_stripped for phrase in SKIPPED_PHRASES):
+            continue
+        if re.match(r'^\d+\.\s+[📊🏢🔗]', line_stripped):
+            if in_list:
+                html_lines.append('</ul>')
+                in_list = False
+            html_lines.append(f'<h2>{line_stripped}</h2>')
+            continue
+        if line_stripped.startswith('## '):
+            if in_list:
+                html_lines.append('</ul>')
+                in_list = False
+            html_lines.append(f'<h2>{line_stripped[3:].strip()}</h2>')
+            continue
+        if re.match(r'^\d+\.\s+[A-Z]', line_stripped) and not re.match(r'^\d+\.\s+[📊🏢🔗]', line_stripped):
+            if in_list:
+                html_lines.append('</ul>')
+                in_list = False
+            html_lines.append(f'<h3 style="color: #2c2c2c; font-size: 1rem; font-weight: 600; margin: 1rem 0 0.5rem 0;">{line_stripped}</h3>')
+            continue
+        if line_stripped.startswith('• ') or line_stripped.startswith('- '):
+            if not in_list:
+                html_lines.append('<ul>')
+                in_list = True
+            item_text = re.sub(r'\[(.+?)\]\((.+?)\)', r'<a href="\2" target="_blank">\1</a>', line_stripped[2:].strip())
+            html_lines.append(f'<li>{item_text}</li>')
+            continue
+        if '[' in line_stripped and '](' in line_stripped:
+            if not in_list:
+                html_lines.append('<ul>')
+                in_list = True
+            converted_line = re.sub(r'\[(.+?)\]\((.+?)\)', r'<a href="\2" target="_blank">\1</a>', line_stripped)
+            html_lines.append(f'<li>{converted_line}</li>')
+            continue
+        if line_stripped.startswith('http'):
+            if not in_list:
+                html_lines.append('<ul>')
+                in_list = True
+            html_lines.append(f'<li><a href="{line_stripped}" target="_blank">{line_stripped}</a></li>')
+            continue
+        if not in_list:
+            html_lines.append('<ul>')
+            in_list = True
+        html_lines.append(f'<li>{line_stripped}</li>')
+
+    if in_list:
+        html_lines.append('</ul>')
+    return '\n'.join(html_lines)
+
+
+SECTION = """1. 📊 Summary of Findings
+The MENA logistics market grew 12% year over year, led by KSA and UAE
+- Last-mile delivery margins improved to 14.2% on average
+- Cold chain operators in Egypt show ROE above 18%
+• Warehouse automation remains capital intensive
+
+2. 🏢 Insights
+1. Investment Opportunities:
+- Fetchr Logistics: EBITDA margin 22.5%, backed by Sequoia
+- Aramex Express: revenue $1.2bn, debt-to-equity 0.4
+1. Risks:
+Customs delays continue to weigh on cross-border express volumes
+
+3. 🔗 Relevant Articles
+## Latest coverage
+- [Gulf logistics funding hits record](https://example.com/news/gulf-logistics-funding)
+[Saudi cold chain expansion](https://example.com/ksa-cold-chain) and [UAE drones](https://example.com/uae-drones)
+https://example.com/reports/mena-logistics-2025
+Please provide relevant articles for this section
+"""
+
+
+def build_response(sections):
+    """A long multi-section response made of repeated sections"""
+    return "\n".join(SECTION for _ in range(sections))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=50, help="sections per response")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    content = build_response(args.sections)
+    if process_content_to_html(content) != legacy_process_content_to_html(content):
+        sys.exit("Converters disagree on a corpus with nothing to escape")
+
+    print(f"{len(content.splitlines())} lines, {len(content)} characters")
+    for name, func in (("legacy", legacy_process_content_to_html), ("current", process_content_to_html)):
+        best = min(timeit.repeat(lambda: func(content), repeat=args.repeat, number=args.number)) / args.number
+        print(f"{name:>8}: {best * 1e3:.3f} ms per response")
+
+
+if __name__ == "__main__":
+    main()
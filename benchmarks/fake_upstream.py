@@ -0,0 +1,209 @@
+"""Local stand-in for the OpenAI and Perplexity chat completion APIs
+
+Serves canned responses after a configurable latency so the pipeline can be
+benchmarked without keys or network. Point the app at it with
+OPENAI_BASE_URL=http://host:port/v1 and PERPLEXITY_BASE_URL=http://host:port.
+
+    python benchmarks/fake_upstream.py --port 8765 --openai-latency 0.8,0.4
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_rendering import build_response  # noqa: E402
+
+# Lognormal delay with the given median and shape (sigma); sigma 0 is a fixed delay
+Latency = namedtuple("Latency", ["median", "sigma"])
+
+ROUTE_KEYWORDS = (
+    ("SEARCH_AND_ANALYZE", ("compare", "benchmark", "industry average", "global")),
+    ("SEARCH_WEB", ("article", "news", "latest")),
+    ("ANALYZE_DATA", ("dataset", "companies", "which")),
+)
+
+# Perplexity's structured sources, also written out as markdown links in the answer text
+SEARCH_RESULTS = [
+    {"title": title, "url": f"https://news.example.com/{slug}", "date": "2025-01-15"}
+    for title, slug in (
+        ("Gulf logistics funding hits a record in 2025", "gulf-logistics-funding"),
+        ("Saudi cold chain operators expand capacity", "ksa-cold-chain"),
+        ("UAE trials autonomous last-mile delivery", "uae-last-mile"),
+        ("Egypt's freight corridor attracts investors", "egypt-freight"),
+        ("Warehouse automation spending in MENA doubles", "mena-automation"),
+    )
+]
+ARTICLES = "\n".join(f"[{result['title']}]({result['url']})" for result in SEARCH_RESULTS)
+
+
+def parse_latency(text):
+    """"median,sigma" or "median" (seconds) as a Latency"""
+    median, _, sigma = text.partition(",")
+    return Latency(float(median), float(sigma or 0))
+
+
+def sample(latency, rng):
+    if latency.median <= 0:
+        return 0.0
+    return latency.median * math.exp(rng.gauss(0, latency.sigma)) if latency.sigma else latency.median
+
+
+def canned_completion(messages, sections):
+    """Response text chosen from the system prompt, like the real model would be asked"""
+    system = messages[0]["content"] if messages else ""
+    question = messages[-1]["content"] if messages else ""
+    if "routing assistant" in system:
+        lowered = question.lower()
+        for route, keywords in ROUTE_KEYWORDS:
+            if any(keyword in lowered for keyword in keywords):
+                return route
+        return "GENERAL_RESPONSE"
+    if "running summary" in system:
+        return "The analyst reviewed logistics companies in KSA and Egypt, focusing on ROE and EBITDA margins."
+    return build_response(sections).replace("Please provide relevant articles for this section\n", "")
+
+
+class FakeUpstream:
+    """Threaded HTTP server answering /v1/chat/completions (OpenAI) and /chat/completions (Perplexity)"""
+
+    def __init__(self, host="127.0.0.1", port=0, openai_latency=Latency(0.05, 0.3), perplexity_latency=Latency(0.08, 0.3),
+                 token_interval=0.002, sections=2, seed=0):
+        self.openai_latency = openai_latency
+        self.perplexity_latency = perplexity_latency
+        self.token_interval = token_interval
+        self.sections = sections
+        self.requests = {"openai": 0, "perplexity": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self, provider):
+        with self._lock:
+            self.requests[provider] += 1
+            return sample(self.openai_latency if provider == "openai" else self.perplexity_latency, self._rng)
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.rstrip("/").endswith("/v1/chat/completions"):
+                    self.openai(body)
+                elif self.path.rstrip("/").endswith("/chat/completions"):
+                    self.perplexity(body)
+                else:
+                    self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def openai(self, body):
+                time.sleep(upstream.delay("openai"))
+                text = canned_completion(body.get("messages", []), upstream.sections)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                if not body.get("stream"):
+                    self.send_json(200, {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "gpt-4"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                # Roughly one token per word, like the real stream
+                for piece in re.findall(r"\S*\s*", text):
+                    if not piece:
+                        continue
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "gpt-4"),
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    }
+                    self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                    if upstream.token_interval:
+                        time.sleep(upstream.token_interval)
+                self.write_chunk("data: [DONE]\n\n")
+                self.write_chunk("")
+
+            def write_chunk(self, text):
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def perplexity(self, body):
+                time.sleep(upstream.delay("perplexity"))
+                self.send_json(200, {
+                    "id": uuid.uuid4().hex,
+                    "model": body.get("model", "sonar-pro"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": ARTICLES}, "finish_reason": "stop"}],
+                    "citations": [result["url"] for result in SEARCH_RESULTS],
+                    "search_results": SEARCH_RESULTS,
+                })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--openai-latency", type=parse_latency, default=Latency(0.8, 0.4), help="median,sigma in seconds before the first token")
+    parser.add_argument("--perplexity-latency", type=parse_latency, default=Latency(2.0, 0.4), help="median,sigma in seconds")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--sections", type=int, default=2, help="size of canned analyses, in sections")
+    args = parser.parse_args()
+
+    server = FakeUpstream(args.host, args.port, args.openai_latency, args.perplexity_latency, args.token_interval, args.sections)
+    print(f"Serving on {server.url} (OPENAI_BASE_URL={server.url}/v1 PERPLEXITY_BASE_URL={server.url})")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
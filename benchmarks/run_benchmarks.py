@@ -0,0 +1,235 @@
+"""Offline end-to-end benchmarks against a local fake OpenAI/Perplexity server
+
+Run from the repository root:
+
+    python benchmarks/run_benchmarks.py --output benchmark-results.json
+
+Measures time to first update and total time per route, the cost of parsing
+and rendering steps, and the cost of a Streamlit rerun as the transcript
+grows. Results are written as JSON for comparison between releases.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fake_upstream import ARTICLES, SEARCH_RESULTS, FakeUpstream, Latency, canned_completion, parse_latency  # noqa: E402
+
+# Questions the local router sends down each follow-up route
+ROUTE_QUESTIONS = {
+    "FIRST_QUERY": "What are the top cold chain investment opportunities in KSA?",
+    "SEARCH_WEB": "Show me the latest news articles about logistics in Saudi Arabia",
+    "ANALYZE_DATA": "Which companies in the dataset have the strongest balance sheets in Egypt?",
+    "SEARCH_AND_ANALYZE": "Compare our EBITDA margins with the global industry average benchmark",
+    "GENERAL_RESPONSE": "What is a free trade zone?",
+}
+
+# Dataset lookups the query engine answers before any route is chosen
+QUERY_ENGINE_QUESTION = "Top 5 companies by ROE in Egypt"
+
+
+def summarize(samples):
+    """p50/p95/mean/min/max of a list of seconds, in milliseconds"""
+    values = np.array(samples) * 1e3
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "mean": round(float(values.mean()), 3),
+        "min": round(float(values.min()), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def configure_environment(server, cache_dir):
+    """Point the app at the fake server and turn off caches and limits that would distort upstream latency"""
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "PERPLEXITY_API_KEY": "pplx-benchmark",
+        "OPENAI_BASE_URL": f"{server.url}/v1",
+        "PERPLEXITY_BASE_URL": server.url,
+        "PIF_CACHE_DIR": cache_dir,
+        "ARTICLE_CACHE_TTL": "0",
+        "ARTICLE_CACHE_MAX_STALE": "0",
+        "RESPONSE_CACHE_THRESHOLD": "2",
+        "SESSION_STORE_BACKEND": "memory",
+        # Client-side rate limits would throttle the benchmark itself
+        "OPENAI_RPM": "0",
+        "OPENAI_TPM": "0",
+        "PERPLEXITY_RPM": "0",
+    })
+
+
+def bench_routes(iterations):
+    """Time to first update and to the finished answer for each route"""
+    from agent import stream_ai_response
+    from router import route_query
+
+    results = {}
+    for route, question in [*ROUTE_QUESTIONS.items(), ("QUERY_ENGINE", QUERY_ENGINE_QUESTION)]:
+        is_first_query = route == "FIRST_QUERY"
+        if route in ROUTE_QUESTIONS and not is_first_query and route_query(question).route != route:
+            raise RuntimeError(f"Router no longer sends {question!r} to {route}")
+        first_updates, totals = [], []
+        # One untimed run warms connections, indexes and lazily built singletons
+        for iteration in range(iterations + 1):
+            started = time.perf_counter()
+            first_update = None
+            response = ""
+            for response in stream_ai_response(question, is_first_query):
+                if first_update is None:
+                    first_update = time.perf_counter() - started
+            total = time.perf_counter() - started
+            if response.startswith("Error:"):
+                raise RuntimeError(f"{route} failed: {response}")
+            if iteration:
+                first_updates.append(first_update)
+                totals.append(total)
+        results[route] = {"iterations": iterations, "first_update_ms": summarize(first_updates), "total_ms": summarize(totals)}
+        print(f"{route:>19}: first update p50 {results[route]['first_update_ms']['p50']:8.1f} ms, total p50 {results[route]['total_ms']['p50']:8.1f} ms")
+    return results
+
+
+def bench_micro(sections):
+    """Per-call cost of the CPU-bound steps, best of several repeats, in microseconds"""
+    from agent import format_article_links, get_dataset, segment_statistics
+    from guardrails import get_guardrails
+    from prompt_builder import rows_to_csv_lines, select_columns
+    from query_engine import execute, plan_query
+    from rendering import StreamingHtmlRenderer, process_content_to_html, render_message_html
+
+    dataset = get_dataset()
+    question = ROUTE_QUESTIONS["FIRST_QUERY"]
+    analysis = canned_completion([{"role": "system", "content": ""}], sections)
+    rows = dataset.retriever.search(question, k=10)
+    columns = select_columns(rows.columns, question, dataset.retriever.parse(question), first_query=True)
+    words = analysis.split(" ")
+    snapshots = [" ".join(words[:i]) for i in range(1, len(words) + 1, 5)]
+
+    def stream_render():
+        renderer = StreamingHtmlRenderer()
+        for snapshot in snapshots:
+            renderer.update(snapshot)
+
+    cases = {
+        "format_article_links_text": lambda: format_article_links(ARTICLES),
+        "format_article_links_search_results": lambda: format_article_links(ARTICLES, search_results=SEARCH_RESULTS),
+        "retriever_search": lambda: dataset.retriever.search(question, k=10),
+        "semantic_index_search": lambda: dataset.semantic_index.search(question),
+        "query_engine_plan_and_execute": lambda: execute(plan_query(QUERY_ENGINE_QUESTION, dataset.retriever), dataset.retriever),
+        "segment_statistics": lambda: segment_statistics(dataset, question),
+        "prompt_rows_csv": lambda: rows_to_csv_lines(rows, columns),
+        "guardrail_output_scan": lambda: get_guardrails().scan(analysis, "output"),
+        "process_content_to_html": lambda: process_content_to_html(analysis),
+        "render_message_html_cached": lambda: render_message_html("assistant", analysis),
+        "streaming_render_full_answer": stream_render,
+    }
+    results = {}
+    for name, func in cases.items():
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        results[name] = round(min(timer.repeat(repeat=5, number=number)) / number * 1e6, 2)
+        print(f"{name:>36}: {results[name]:10.1f} us")
+    return {"unit": "us", "analysis_characters": len(analysis), "results": results}
+
+
+def bench_reruns(session_lengths, sections, repeats=3):
+    """Wall time of a Streamlit rerun with a transcript of each length"""
+    from streamlit.testing.v1 import AppTest
+
+    answer = canned_completion([{"role": "system", "content": ""}], sections)
+    results = {}
+    os.chdir(REPO_DIR)
+    for length in session_lengths:
+        messages = [
+            {"role": "user", "content": f"Question {i // 2} about logistics in KSA"} if i % 2 == 0
+            else {"role": "assistant", "content": answer}
+            for i in range(length)
+        ]
+        app = AppTest.from_file("streamlit_app.py", default_timeout=120)
+        app.session_state["messages"] = messages
+        app.session_state["first_message_sent"] = bool(messages)
+        app.run()
+        if app.exception:
+            raise RuntimeError(f"App failed with {length} messages: {app.exception}")
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            app.run()
+            samples.append(time.perf_counter() - started)
+        results[str(length)] = summarize(samples)
+        print(f"rerun with {length:>4} messages: p50 {results[str(length)]['p50']:8.1f} ms")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON results")
+    parser.add_argument("--iterations", type=int, default=5, help="timed runs per route")
+    parser.add_argument("--openai-latency", type=parse_latency, default=Latency(0.05, 0.3), help="median,sigma in seconds")
+    parser.add_argument("--perplexity-latency", type=parse_latency, default=Latency(0.08, 0.3), help="median,sigma in seconds")
+    parser.add_argument("--token-interval", type=float, default=0.001, help="seconds between streamed tokens")
+    parser.add_argument("--sections", type=int, default=2, help="size of canned analyses, in sections")
+    parser.add_argument("--session-lengths", default="0,10,50,200", help="transcript lengths for the rerun benchmark")
+    parser.add_argument("--skip-reruns", action="store_true", help="skip the Streamlit rerun benchmark")
+    args = parser.parse_args()
+
+    server = FakeUpstream(
+        openai_latency=args.openai_latency,
+        perplexity_latency=args.perplexity_latency,
+        token_interval=args.token_interval,
+        sections=args.sections
+    ).start()
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            configure_environment(server, cache_dir)
+            results = {
+                "meta": {
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "git_revision": git_revision(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "config": {
+                        "iterations": args.iterations,
+                        "openai_latency": args.openai_latency._asdict(),
+                        "perplexity_latency": args.perplexity_latency._asdict(),
+                        "token_interval": args.token_interval,
+                        "sections": args.sections,
+                    },
+                },
+                "routes": bench_routes(args.iterations),
+                "micro": bench_micro(args.sections),
+            }
+            if not args.skip_reruns:
+                lengths = [int(length) for length in args.session_lengths.split(",") if length]
+                results["reruns"] = bench_reruns(lengths, args.sections)
+            results["meta"]["upstream_requests"] = dict(server.requests)
+    finally:
+        server.stop()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Command-line access to the investment research pipeline
+
+    python cli.py ask "Top cold chain companies in KSA?"
+    python cli.py questions > questions.jsonl
+    python cli.py batch questions.jsonl results.jsonl --concurrency 4 --rate 20
+
+Batch input is JSONL with a "question" and optional "id" per line. Results are
+appended to the output as each question finishes, so an interrupted run picks
+up where it left off when started again with the same output file.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+from agent import WITHHELD_RESPONSE, get_ai_response, get_dataset, stream_ai_response, validate_responsible_ai  # noqa: E402
+from rate_limit import BATCH, priority  # noqa: E402
+from rendering import render_message_html  # noqa: E402
+
+logger = logging.getLogger("cli")
+
+DEFAULT_QUESTION_TEMPLATE = "What are the most attractive {subsector} investment opportunities in {country}?"
+
+# Statuses that count as done when resuming; errors are retried
+FINAL_STATUSES = ("ok", "rejected", "withheld")
+
+
+def read_questions(path):
+    """Questions from a JSONL file as dicts with id and question"""
+    questions = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            question_id = str(item.get("id", f"line-{line_number}"))
+            if question_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate id {question_id!r}")
+            seen.add(question_id)
+            questions.append({"id": question_id, "question": item["question"]})
+    return questions
+
+
+def completed_ids(path):
+    """Ids already answered in an existing output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    # The last line may end inside a multibyte character; replaced, it simply fails to parse below
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interruption
+                continue
+            if record.get("status") in FINAL_STATUSES:
+                done.add(record["id"])
+    return done
+
+
+def finish_partial_line(path):
+    """End a line left incomplete by an interrupted run, so the next record starts on a line of its own"""
+    if not os.path.exists(path):
+        return
+    # Binary mode: the last byte may be part of a character the interruption cut in half
+    with open(path, "rb+") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def answer_question(item, include_html=False):
+    """Run one question through the pipeline and return its result record"""
+    started = time.monotonic()
+    record = {"id": item["id"], "question": item["question"]}
+    try:
+        rule = validate_responsible_ai(item["question"])
+        if rule is not None:
+            record.update(status="rejected", rule=rule.name)
+        else:
+            # Analysts using the app at the same time get the provider capacity first
+            with priority(BATCH):
+                answer = get_ai_response(item["question"], is_first_query=True)
+            if answer.startswith("Error:"):
+                record.update(status="error", error=answer[len("Error:"):].strip())
+            else:
+                record.update(status="withheld" if answer == WITHHELD_RESPONSE else "ok", answer=answer)
+                if include_html:
+                    record["html"] = render_message_html("assistant", answer)
+    except Exception as e:
+        logger.exception("Question %s failed", item["id"])
+        record.update(status="error", error=str(e))
+    record["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    record["completed_at"] = datetime.now(timezone.utc).isoformat()
+    return record
+
+
+def run_batch(questions, output_path, concurrency=4, rate=None, include_html=False):
+    """Answer questions with at most concurrency in flight and at most rate starts per minute
+
+    Each result is written and flushed as soon as it finishes. Returns the
+    number of results written by this run.
+    """
+    done = completed_ids(output_path)
+    pending = [item for item in questions if item["id"] not in done]
+    logger.info("%d questions, %d already done, %d to run", len(questions), len(questions) - len(pending), len(pending))
+    interval = 60.0 / rate if rate else 0.0
+    next_start = time.monotonic()
+    written = 0
+
+    # Top-level questions get their own threads; the shared pool stays free for their article searches
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    in_flight = {}
+    finish_partial_line(output_path)
+    with open(output_path, "a", encoding="utf-8") as out:
+        try:
+            while pending or in_flight:
+                now = time.monotonic()
+                can_start = bool(pending) and len(in_flight) < concurrency
+                if can_start and now >= next_start:
+                    item = pending.pop(0)
+                    in_flight[executor.submit(answer_question, item, include_html)] = item
+                    next_start = max(next_start, now) + interval
+                    continue
+                timeout = next_start - now if can_start else None
+                if not in_flight:
+                    time.sleep(timeout)
+                    continue
+                finished, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del in_flight[future]
+                    record = future.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    written += 1
+                    logger.info("%s: %s in %.1fs", record["id"], record["status"], record["elapsed_seconds"])
+        except KeyboardInterrupt:
+            logger.warning("Interrupted; %d questions in flight are discarded and will run on resume", len(in_flight))
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    executor.shutdown()
+    return written
+
+
+def generate_questions(template=DEFAULT_QUESTION_TEMPLATE):
+    """One question per country x subsector present in the dataset"""
+    df = get_dataset().df
+    pairs = df[["Country", "Subsector"]].dropna().astype(str).drop_duplicates().sort_values(["Country", "Subsector"])
+    return [
+        {"id": f"{country}/{subsector}", "question": template.format(country=country, subsector=subsector)}
+        for country, subsector in pairs.itertuples(index=False)
+    ]
+
+
+def check_api_keys():
+    missing = [name for name in ("OPENAI_API_KEY", "PERPLEXITY_API_KEY") if not os.getenv(name)]
+    if missing:
+        sys.exit(f"Missing environment variables: {', '.join(missing)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PIF investment research pipeline")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ask = commands.add_parser("ask", help="answer one question, streaming it to stdout")
+    ask.add_argument("question")
+
+    questions = commands.add_parser("questions", help="write one question per country x subsector as JSONL")
+    questions.add_argument("--template", default=DEFAULT_QUESTION_TEMPLATE, help="uses {country} and {subsector}")
+
+    batch = commands.add_parser("batch", help="answer questions from a JSONL file, appending results to a JSONL file")
+    batch.add_argument("input")
+    batch.add_argument("output")
+    batch.add_argument("--concurrency", type=int, default=4, help="questions in flight at once")
+    batch.add_argument("--rate", type=float, default=None, help="maximum questions started per minute")
+    batch.add_argument("--html", action="store_true", help="include the rendered chat bubble HTML")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(name)s %(message)s")
+
+    if args.command == "questions":
+        for item in generate_questions(args.template):
+            print(json.dumps(item, ensure_ascii=False))
+        return 0
+
+    check_api_keys()
+    if args.command == "ask":
+        rule = validate_responsible_ai(args.question)
+        if rule is not None:
+            sys.exit(f"Question rejected by Responsible AI rule {rule.name}")
+        if not sys.stdout.isatty():
+            # Piped output gets the final answer only
+            print(get_ai_response(args.question))
+            return 0
+        shown = ""
+        for text in stream_ai_response(args.question):
+            if text.startswith(shown):
+                sys.stdout.write(text[len(shown):])
+            else:
+                # Earlier text was rewritten (e.g. articles spliced in); redraw the screen
+                sys.stdout.write("\033[2J\033[H" + text)
+            sys.stdout.flush()
+            shown = text
+        sys.stdout.write("\n")
+        return 0
+
+    try:
+        written = run_batch(read_questions(args.input), args.output, args.concurrency, args.rate, args.html)
+    except KeyboardInterrupt:
+        return 130
+    print(f"Wrote {written} results to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
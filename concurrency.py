@@ -0,0 +1,236 @@
+"""Shared execution layer for running upstream calls concurrently"""
+import contextvars
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
+
+from rate_limit import SharedPriority, current_priority, priority
+from tracing import annotate
+
+# One pool per process, shared by every Streamlit session and rerun
+MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", "16"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Outcome of a single call: exactly one of value / error is meaningful
+TaskResult = namedtuple("TaskResult", ["value", "error", "elapsed"])
+
+
+class CallTimeout(Exception):
+    """Raised in place of a result when a call runs past its timeout"""
+
+
+def get_executor():
+    """Return the process-wide thread pool used for upstream calls"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="upstream")
+    return _executor
+
+
+def submit(func, *args, **kwargs):
+    """Schedule func on the shared pool and return its future
+
+    func runs in a copy of the caller's context, so tracing spans it opens
+    are children of the caller's current span.
+    """
+    return get_executor().submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def _timed_out(future, started, reason):
+    """Abandon a future and record why"""
+    # Threads cannot be interrupted; a running call finishes in the background
+    future.cancel()
+    return TaskResult(None, CallTimeout(reason), time.monotonic() - started)
+
+
+def collect_result(future, started, timeout):
+    """Wait for a future until its own deadline and wrap the outcome"""
+    remaining = None if timeout is None else max(0.0, started + timeout - time.monotonic())
+    try:
+        value = future.result(timeout=remaining)
+        return TaskResult(value, None, time.monotonic() - started)
+    except FutureTimeoutError:
+        return _timed_out(future, started, f"timed out after {timeout:g}s")
+    except Exception as e:
+        return TaskResult(None, e, time.monotonic() - started)
+
+
+def fan_out(func, items, max_concurrency=4, timeout=None, deadline=None):
+    """Call func(item) for every item with bounded concurrency
+
+    Returns one TaskResult per item, in the order of `items`. At most
+    `max_concurrency` calls are in flight at once. A call running longer than
+    `timeout` is abandoned. Once `deadline` seconds have passed, calls still in
+    flight are abandoned and calls not yet started are cancelled, so the caller
+    can carry on with whatever came back in time.
+    """
+    started = time.monotonic()
+    end = None if deadline is None else started + deadline
+    results = [None] * len(items)
+    in_flight = {}
+    next_index = 0
+
+    while next_index < len(items) or in_flight:
+        while next_index < len(items) and len(in_flight) < max_concurrency:
+            in_flight[submit(func, items[next_index])] = (next_index, time.monotonic())
+            next_index += 1
+
+        # Sleep until something finishes or the nearest timeout/deadline
+        now = time.monotonic()
+        limits = [call_started + timeout - now for _, call_started in in_flight.values()] if timeout is not None else []
+        if end is not None:
+            limits.append(end - now)
+        done, _ = wait(in_flight, timeout=max(0.0, min(limits)) if limits else None, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            index, call_started = in_flight.pop(future)
+            results[index] = collect_result(future, call_started, None)
+
+        now = time.monotonic()
+        if timeout is not None:
+            for future, (index, call_started) in list(in_flight.items()):
+                if now - call_started >= timeout:
+                    del in_flight[future]
+                    results[index] = _timed_out(future, call_started, f"timed out after {timeout:g}s")
+
+        if end is not None and now >= end:
+            for future, (index, call_started) in in_flight.items():
+                results[index] = _timed_out(future, call_started, f"deadline of {deadline:g}s reached")
+            in_flight.clear()
+            for index in range(next_index, len(items)):
+                results[index] = TaskResult(None, CallTimeout("cancelled at deadline before starting"), 0.0)
+            break
+
+    return results
+
+
+class _Broadcast:
+    """Latest snapshot of a shared stream, with a condition to wait for the next one"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.latest = None
+        self.version = 0
+        self.done = False
+        self.error = None
+
+    def publish(self, value):
+        with self.condition:
+            self.latest = value
+            self.version += 1
+            self.condition.notify_all()
+
+    def close(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def subscribe(self):
+        """Yield snapshots until the stream ends; a slow reader skips to the latest one"""
+        seen = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.version > seen or self.done)
+                version, latest, done, error = self.version, self.latest, self.done, self.error
+            if version > seen:
+                seen = version
+                yield latest
+            elif done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key so only one of them reaches upstream
+
+    Callers that arrive while a call for their key is in flight wait for it
+    and share its result (or exception). The call runs at the most urgent
+    priority among the callers waiting on it. Nothing is remembered once the
+    call finishes; caching finished results is the caches' job.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        # key -> (Future or _Broadcast, SharedPriority of the call)
+        self._in_flight = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def _join(self, key, create):
+        """Return (entry, call priority, is_leader) for key, creating the entry if nothing is in flight"""
+        level = current_priority()
+        with self._lock:
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = self._in_flight[key] = (create(), SharedPriority(level))
+                self.leaders += 1
+                return flight + (True,)
+            self.shared += 1
+        entry, call_priority = flight
+        # A more urgent caller waiting on the call must not wait at the leader's priority
+        call_priority.raise_to(level)
+        return entry, call_priority, False
+
+    def _leave(self, key, entry):
+        with self._lock:
+            if self._in_flight.get(key, (None,))[0] is entry:
+                del self._in_flight[key]
+
+    def do(self, key, func, *args):
+        """Return func(*args), or the result of the identical call already in flight"""
+        future, call_priority, leader = self._join(key, Future)
+        if not leader:
+            annotate(single_flight=self.name)
+            return future.result()
+        try:
+            with priority(call_priority):
+                value = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._leave(key, future)
+
+    def stream(self, key, func, *args):
+        """Yield the snapshots of func(*args), a generator, shared with identical concurrent callers
+
+        The generator runs on its own thread until it is exhausted, even if
+        every caller stops reading, so an answer that has been paid for still
+        finishes (and reaches the caches).
+        """
+        broadcast, call_priority, leader = self._join(key, _Broadcast)
+        if leader:
+            def produce():
+                try:
+                    with priority(call_priority):
+                        for value in func(*args):
+                            broadcast.publish(value)
+                except BaseException as e:
+                    broadcast.close(e)
+                else:
+                    broadcast.close()
+                finally:
+                    self._leave(key, broadcast)
+
+            # A dedicated thread: the producer itself submits work to the shared pool and waits for it
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(produce,), name=f"{self.name}-flight", daemon=True).start()
+        else:
+            annotate(single_flight=self.name)
+        yield from broadcast.subscribe()
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._in_flight)}
@@ -0,0 +1,124 @@
+"""Bounded conversation context for follow-up questions"""
+import logging
+import os
+import uuid
+
+from concurrency import submit
+from rate_limit import BACKGROUND, priority
+from tokens import MESSAGE_OVERHEAD_TOKENS, count_message_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens of history sent with a follow-up: summary, company references and recent turns together
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_REFERENCES = int(os.getenv("CONTEXT_MAX_REFERENCES", "10"))
+
+
+class ConversationContext:
+    """Rolling view of one chat: recent turns verbatim, older turns as a summary
+
+    Turns that no longer fit the budget are folded into the summary in the
+    background by summarize(previous_summary, messages) -> str, so a follow-up
+    never waits for it. Until a summary update lands, the questions it covers
+    stand in for it. Companies retrieved for earlier answers are kept by name.
+    """
+
+    def __init__(self, summarize, budget=CONTEXT_TOKEN_BUDGET, max_references=CONTEXT_MAX_REFERENCES):
+        self.summarize = summarize
+        # Never reused, unlike id(self), so it can key work shared within this conversation
+        self.conversation_id = uuid.uuid4().hex
+        self.budget = budget
+        self.max_references = max_references
+        self.summary = ""
+        # Messages [0, summarized_count) of the history are covered by the summary
+        self.summarized_count = 0
+        self.references = []
+        self._pending = None
+
+    def add_references(self, names):
+        """Remember companies shown to the model, most recent last"""
+        for name in names:
+            if name in self.references:
+                self.references.remove(name)
+            self.references.append(name)
+        del self.references[:-self.max_references]
+
+    def messages(self, history):
+        """Chat messages carrying the conversation so far, within the token budget"""
+        self._collect_summary()
+        # The summary and company references come first; an oversized summary is cut to the budget
+        notes = self._notes([])
+        if _note_cost(notes) > self.budget:
+            notes = truncate_to_tokens(notes, self.budget - MESSAGE_OVERHEAD_TOKENS)
+        remaining = self.budget - _note_cost(notes)
+
+        # Newest turns first, for as long as they fit; the last one is cut if it alone is too long
+        start = len(history)
+        recent = []
+        for message in reversed(history[self.summarized_count:]):
+            cost = count_message_tokens([message])
+            if cost > remaining:
+                if not recent and remaining > MESSAGE_OVERHEAD_TOKENS:
+                    content = truncate_to_tokens(message["content"], remaining - MESSAGE_OVERHEAD_TOKENS)
+                    recent.append({"role": message["role"], "content": content})
+                    start -= 1
+                break
+            recent.append({"role": message["role"], "content": message["content"]})
+            remaining -= cost
+            start -= 1
+        recent.reverse()
+
+        if start > self.summarized_count:
+            self._start_summary(history, start)
+            # Until the summary lands, the questions it will cover fill whatever room the recent turns left
+            questions = [m["content"] for m in history[self.summarized_count:start] if m["role"] == "user"]
+            notes = self._fit_notes(notes, questions, _note_cost(notes) + remaining)
+        context = [{"role": "system", "content": notes}] if notes else []
+        return context + recent
+
+    def _fit_notes(self, notes, questions, allowance):
+        """Notes with as many of the newest questions as fit in allowance tokens, else notes unchanged"""
+        low, high = 0, len(questions)
+        while low < high:
+            kept = (low + high + 1) // 2
+            if _note_cost(self._notes(questions[-kept:])) <= allowance:
+                low = kept
+            else:
+                high = kept - 1
+        return self._notes(questions[len(questions) - low:]) if low else notes
+
+    def _notes(self, questions):
+        """Summary, questions not yet summarized and company references, as one system note"""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if questions:
+            parts.append("Earlier questions:\n" + "\n".join(f"- {question}" for question in questions))
+        if self.references:
+            parts.append("Companies discussed earlier: " + ", ".join(self.references))
+        return "\n\n".join(parts)
+
+    def _start_summary(self, history, end):
+        if self._pending is not None:
+            return
+        previous, turns = self.summary, list(history[self.summarized_count:end])
+        # Summaries can wait; the question being answered goes first
+        with priority(BACKGROUND):
+            self._pending = (submit(self.summarize, previous, turns), end)
+
+    def _collect_summary(self):
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, end = self._pending
+        self._pending = None
+        try:
+            self.summary = future.result()
+            self.summarized_count = end
+        except Exception as e:
+            # Once per turn while the summarizer is down, so no traceback
+            logger.warning("Conversation summary update failed (%s); will retry on the next turn", e)
+
+
+def _note_cost(notes):
+    """Tokens the system note takes up, nothing if there is none"""
+    return count_message_tokens([{"content": notes}]) if notes else 0
@@ -0,0 +1,102 @@
+"""Typed, columnar loading of the company dataset with a memory-mapped Arrow sidecar"""
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from storage import cache_path
+
+logger = logging.getLogger(__name__)
+
+# Explicit schema: categories for repeated labels, float32 where 7 significant digits are plenty
+SCHEMA = {
+    "Company Name": "string[pyarrow]",
+    "Country": "category",
+    "Sector": "category",
+    "Subsector": "category",
+    "Revenue (USD)": "float64",
+    "Growth Rate": "float32",
+    "Investors": "category",
+    "Notes": "category",
+    "EBITDA Margin (%)": "float32",
+    "Net Profit Margin (%)": "float32",
+    "ROE (%)": "float32",
+    "ROA (%)": "float32",
+    "Debt-to-Equity": "float32",
+    "Current Ratio": "float32",
+    "Quick Ratio": "float32",
+    "Cash Conversion Cycle (days)": "float32",
+    "Inventory Turnover": "float32",
+    "Asset Turnover": "float32",
+}
+
+# Stored as text in the CSV ("40%") but numeric in the schema
+PERCENT_TEXT_COLUMNS = ("Growth Rate",)
+
+SIDECAR_FINGERPRINT_KEY = b"source_fingerprint"
+
+
+def dataset_fingerprint(path):
+    """Identify the current version of a file by modification time and size"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def _sidecar_path(path):
+    return cache_path(os.path.splitext(os.path.basename(path))[0] + ".arrow")
+
+
+def parse_csv(path):
+    """Read the CSV and coerce every known column to its schema dtype"""
+    text_columns = {column: "string[pyarrow]" for column in PERCENT_TEXT_COLUMNS}
+    df = pd.read_csv(path, dtype=text_columns, engine="pyarrow")
+    for column in PERCENT_TEXT_COLUMNS:
+        if column in df:
+            df[column] = pd.to_numeric(df[column].str.strip().str.rstrip("%").str.replace(",", ""), errors="coerce")
+    return df.astype({column: dtype for column, dtype in SCHEMA.items() if column in df})
+
+
+def _arrow_string_dtype(arrow_type):
+    return pd.StringDtype("pyarrow") if arrow_type in (pa.string(), pa.large_string()) else None
+
+
+def _read_sidecar(sidecar, fingerprint):
+    """Memory-map the sidecar if it was written from this version of the CSV"""
+    try:
+        with pa.memory_map(sidecar) as source:
+            reader = pa.ipc.open_file(source)
+            metadata = reader.schema.metadata or {}
+            if metadata.get(SIDECAR_FINGERPRINT_KEY) != fingerprint.encode():
+                return None
+            table = reader.read_all()
+        # Keep text Arrow-backed rather than materializing Python string objects
+        return table.to_pandas(split_blocks=True, types_mapper=_arrow_string_dtype)
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+
+
+def _write_sidecar(sidecar, df, fingerprint):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), SIDECAR_FINGERPRINT_KEY: fingerprint.encode()})
+    temporary = f"{sidecar}.{os.getpid()}.tmp"
+    with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    # Atomic swap so concurrent readers never see a half-written file
+    os.replace(temporary, sidecar)
+
+
+def load_companies(path):
+    """Load the typed dataset, parsing the CSV only when its Arrow sidecar is missing or stale"""
+    fingerprint = dataset_fingerprint(path)
+    sidecar = _sidecar_path(path)
+    df = _read_sidecar(sidecar, fingerprint)
+    if df is not None:
+        return df
+    df = parse_csv(path)
+    try:
+        _write_sidecar(sidecar, df, fingerprint)
+    except OSError:
+        logger.warning("Could not write dataset sidecar %s", sidecar, exc_info=True)
+    return df
+
@@ -0,0 +1,230 @@
+"""The current dataset and everything derived from it, kept in step with the CSV as it changes"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from dataset import dataset_fingerprint, load_companies
+from response_cache import get_response_cache
+from retrieval import INDEXED_COLUMNS, NAME_COLUMN, DatasetRetriever
+from screening import ScreeningEngine
+from semantic_index import SemanticIndex
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Without watchdog the file is checked on every access instead
+    FileSystemEventHandler, Observer = object, None
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.getenv("PIF_DATA_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "investable_logistics_companies_mena.csv"))
+
+# Watch the CSV and reload it in the background; set to 0 to check its modification time on access instead
+DATASET_WATCH = os.getenv("DATASET_WATCH", "1") != "0"
+
+# Seconds without further file events before reloading, so a save written in several steps reloads once
+DATASET_RELOAD_DELAY = float(os.getenv("DATASET_RELOAD_DELAY", "0.5"))
+
+# One version of the dataset with the indexes built from it; none of its parts change after it is published
+DatasetSnapshot = namedtuple("DatasetSnapshot", ["version", "df", "retriever", "screening_engine", "semantic_index"])
+
+# Company names added, removed and changed between two versions of the dataset
+DatasetChange = namedtuple("DatasetChange", ["added", "removed", "changed"])
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def _row_hashes(df):
+    """One hash per company over its whole row, indexed by company name"""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    series = pd.Series(hashes, index=pd.Index(df[NAME_COLUMN].astype(str), name=NAME_COLUMN))
+    return series[~series.index.duplicated(keep="last")]
+
+
+def diff_rows(old, new):
+    """Which companies were added, removed or edited between two versions of the dataset"""
+    if list(old.columns) != list(new.columns):
+        # A new or dropped column touches every company
+        return DatasetChange(list(new[NAME_COLUMN].astype(str)), list(old[NAME_COLUMN].astype(str)), [])
+    old_hashes, new_hashes = _row_hashes(old), _row_hashes(new)
+    common = old_hashes.index.intersection(new_hashes.index)
+    changed = common[old_hashes[common].to_numpy() != new_hashes[common].to_numpy()]
+    return DatasetChange(
+        list(new_hashes.index.difference(old_hashes.index)),
+        list(old_hashes.index.difference(new_hashes.index)),
+        list(changed),
+    )
+
+
+def touched_segments(old, new, change):
+    """Country/subsector/investor values of every added, removed or edited company, before and after the change"""
+    names = set(change.added) | set(change.removed) | set(change.changed)
+    columns = [column for column in INDEXED_COLUMNS if column in old and column in new]
+    touched = []
+    for df in (old, new):
+        rows = df.loc[df[NAME_COLUMN].astype(str).isin(names), columns]
+        for cells in rows.itertuples(index=False):
+            touched.append({
+                column: {value for value in re.split(r"\s*[,;&/]\s*", str(cell)) if value} if pd.notna(cell) else set()
+                for column, cell in zip(columns, cells)
+            })
+    return touched
+
+
+def _answer_still_valid(touched):
+    """Predicate for cached answers: those about a segment no changed company is in survive"""
+    def keep(segments):
+        # An answer not narrowed to a segment may have used any company
+        if not segments:
+            return False
+        return not any(
+            all(set(values) & company.get(column, set()) for column, values in segments.items())
+            for company in touched
+        )
+    return keep
+
+
+class _CsvChangeHandler(FileSystemEventHandler):
+    """Schedules a reload when an event concerns the dataset file (editors often save via a rename)"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def on_any_event(self, event):
+        paths = (event.src_path, getattr(event, "dest_path", ""))
+        if any(os.path.abspath(path) == self.manager.path for path in paths if path):
+            self.manager.schedule_reload()
+
+
+class DatasetManager:
+    """The current DatasetSnapshot, reloaded in the background when the CSV changes
+
+    A reload diffs rows by company name and passes on only the differences:
+    segment aggregates and the semantic index update what the changed
+    companies touch, the retriever keeps its inverted indexes when only
+    figures changed, and cached answers survive unless they are about a
+    segment a changed company is in. Every applied change bumps version,
+    which dependent caches key on.
+    """
+
+    def __init__(self, path=DATA_PATH, watch=DATASET_WATCH):
+        self.path = os.path.abspath(path)
+        self.watch = watch and Observer is not None
+        self.reloads = 0
+        self.reloaded_at = None
+        self.last_change = None
+        self._snapshot = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+        self._observer = None
+
+    def snapshot(self):
+        """The current snapshot; without a watcher, reloads first if the file changed"""
+        if self._snapshot is None or (self._observer is None and dataset_fingerprint(self.path) != self._fingerprint):
+            self.reload()
+            self._start_watching()
+        return self._snapshot
+
+    def schedule_reload(self):
+        """Reload after DATASET_RELOAD_DELAY unless another event arrives first"""
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(DATASET_RELOAD_DELAY, self._reload_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        except Exception:
+            # Most likely a save caught half-way; the next file event retries
+            logger.exception("Could not reload %s; still serving version %s", self.path, self._snapshot and self._snapshot.version)
+
+    def reload(self):
+        """Load the file if it changed since the last load and apply the differences; returns the DatasetChange or None"""
+        with self._lock:
+            fingerprint = dataset_fingerprint(self.path)
+            if self._snapshot is not None and fingerprint == self._fingerprint:
+                return None
+            started = time.perf_counter()
+            df = load_companies(self.path)
+            previous = self._snapshot
+            if previous is None:
+                self._snapshot = DatasetSnapshot(1, df, DatasetRetriever(df), ScreeningEngine(df, 1), SemanticIndex().refreshed(df, 1))
+                self._fingerprint = fingerprint
+                return None
+            change = diff_rows(previous.df, df)
+            self._fingerprint = fingerprint
+            if not (change.added or change.removed or change.changed):
+                # Saved without edits: keep the snapshot and everything cached against it
+                return change
+            version = previous.version + 1
+            # Every part is derived into a new object, so requests still holding previous keep a consistent view
+            self._snapshot = DatasetSnapshot(
+                version,
+                df,
+                previous.retriever.refreshed(df),
+                previous.screening_engine.refreshed(df, version),
+                previous.semantic_index.refreshed(df, version),
+            )
+            get_response_cache().carry_over(version, _answer_still_valid(touched_segments(previous.df, df, change)))
+            self.reloads += 1
+            self.reloaded_at = time.time()
+            self.last_change = change
+            logger.info(
+                "Dataset version %d: %d added, %d removed, %d changed in %.0f ms",
+                version, len(change.added), len(change.removed), len(change.changed), (time.perf_counter() - started) * 1e3,
+            )
+            return change
+
+    def _start_watching(self):
+        if not self.watch or self._observer is not None:
+            return
+        with self._lock:
+            if self._observer is not None:
+                return
+            observer = Observer()
+            observer.schedule(_CsvChangeHandler(self), os.path.dirname(self.path), recursive=False)
+            observer.daemon = True
+            try:
+                observer.start()
+            except OSError:
+                logger.warning("Could not watch %s; checking it on access instead", self.path, exc_info=True)
+                self.watch = False
+                return
+            self._observer = observer
+
+    def stop(self):
+        """Stop watching the file"""
+        with self._lock:
+            observer, self._observer = self._observer, None
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+def get_dataset_manager(path=DATA_PATH):
+    """Return the process-wide dataset manager"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = DatasetManager(path)
+    return _manager
+
+
+def get_dataset():
+    """Return the current dataset snapshot"""
+    return get_dataset_manager().snapshot()
@@ -0,0 +1,108 @@
+"""Local text embeddings from hashed word and character n-grams"""
+import re
+import zlib
+
+import numpy as np
+
+EMBEDDING_DIM = 512
+
+# Spellings analysts use interchangeably, rewritten to one canonical form
+PHRASE_ALIASES = [
+    (re.compile(r"\bksa\b|\bsaudi\b(?!\s+arabia)"), "saudi arabia"),
+    (re.compile(r"\buae\b|\bemirates\b(?<!arab emirates)"), "united arab emirates"),
+    (re.compile(r"\blast[\s-]+mile\b"), "last mile"),
+    (re.compile(r"\bcold[\s-]+chain\b"), "cold chain"),
+    (re.compile(r"\be[\s-]+commerce\b"), "ecommerce"),
+]
+
+# Words that carry no signal in this domain (every question is about logistics companies)
+STOPWORDS = frozenset("""
+    a an the in of for and or to on at by with from about me my our us we i you is are be
+    what which who how show list give tell find get please can could would some any all
+    company companies firm firms business businesses player players logistics
+    recommend investable invest investment investments opportunities
+""".split())
+
+COUNTRIES = (
+    "saudi arabia", "united arab emirates", "egypt", "oman", "qatar", "kuwait", "bahrain",
+    "jordan", "morocco", "lebanon", "tunisia", "algeria", "iraq", "turkey", "pakistan",
+)
+
+# Words that flip what a question asks for while barely moving its embedding ("above" vs "below 20%")
+DIRECTION_WORDS = {
+    "above": ("above", "over", "greater than", "more than", "higher than", "exceeding", "in excess of", ">"),
+    "at least": ("at least", "no less than", "minimum of", ">="),
+    "below": ("below", "under", "less than", "lower than", "beneath", "<"),
+    "at most": ("at most", "no more than", "maximum of", "<="),
+    "between": ("between",),
+}
+NEGATION_WORDS = ("excluding", "exclude", "except", "without", "other than", "outside", "not", "non", "no", "never")
+
+_DIRECTION_LOOKUP = {phrase: direction for direction, phrases in DIRECTION_WORDS.items() for phrase in phrases}
+_DIRECTION_PATTERN = re.compile("|".join(
+    rf"\b{re.escape(phrase)}\b" if phrase[0].isalpha() else rf"(?<![<>=]){re.escape(phrase)}(?!=)"
+    for phrase in sorted(_DIRECTION_LOOKUP, key=len, reverse=True)
+))
+_NEGATION_PATTERN = re.compile(rf"\b(?:{'|'.join(re.escape(word) for word in NEGATION_WORDS)})\b|n't\b")
+
+
+def normalize_text(text):
+    """Lowercase, canonicalize aliases and return the meaningful word tokens"""
+    text = text.lower()
+    for pattern, replacement in PHRASE_ALIASES:
+        text = pattern.sub(replacement, text)
+    return [token for token in re.findall(r"[a-z0-9]+(?:\.[0-9]+)?", text) if token not in STOPWORDS]
+
+
+def entity_signature(text, parsed=None):
+    """Return what two queries must agree on to share an answer, however similar they read
+
+    That is the countries, numbers, comparison directions and whether anything
+    is negated, plus the values, filters and ranking parsed (a retrieval
+    ParsedQuery) when given.
+    """
+    tokens = normalize_text(text)
+    joined = " ".join(tokens)
+    countries = frozenset(country for country in COUNTRIES if re.search(rf"\b{country}\b", joined))
+    numbers = frozenset(token for token in tokens if token[0].isdigit())
+    lowered = " ".join(text.lower().split())
+    directions = frozenset(_DIRECTION_LOOKUP[phrase] for phrase in _DIRECTION_PATTERN.findall(lowered))
+    negated = _NEGATION_PATTERN.search(lowered) is not None
+    understood = None
+    if parsed is not None:
+        understood = (
+            frozenset((column, tuple(values)) for column, values in parsed.values.items()),
+            frozenset(parsed.filters),
+            parsed.sort_column,
+            parsed.ascending,
+        )
+    return countries, numbers, directions, negated, understood
+
+
+def _add_feature(vector, feature, weight):
+    digest = zlib.crc32(feature.encode("utf-8"))
+    sign = 1.0 if digest & 0x80000000 else -1.0
+    vector[digest % len(vector)] += sign * weight
+
+
+def embed_text(text, dim=EMBEDDING_DIM):
+    """Embed text as an L2-normalized float32 vector"""
+    vector = np.zeros(dim, dtype=np.float32)
+    tokens = normalize_text(text)
+    for token in tokens:
+        _add_feature(vector, "w:" + token, 1.0)
+        padded = f"<{token}>"
+        for i in range(len(padded) - 2):
+            _add_feature(vector, "c:" + padded[i:i + 3], 0.25)
+    for first, second in zip(tokens, tokens[1:]):
+        _add_feature(vector, f"b:{first} {second}", 0.5)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_texts(texts, dim=EMBEDDING_DIM):
+    """Embed many texts into a (len(texts), dim) float32 matrix"""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        matrix[i] = embed_text(text, dim)
+    return matrix
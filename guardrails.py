@@ -0,0 +1,153 @@
+"""Responsible AI guardrails compiled from a rules file into one matcher per target"""
+import json
+import os
+import re
+import string
+from collections import namedtuple
+
+RULES_PATH = os.getenv("GUARDRAIL_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "guardrail_rules.json"))
+
+# What a rule can be applied to: user questions, model answers, fetched article titles
+TARGETS = ("input", "output", "article")
+
+# Keywords also match their plurals and common inflections ("weapons", "bullying");
+# a keyword ending in * is a stem and matches any word it starts ("harass*": "harassment")
+KEYWORD_SUFFIXES = ("s", "es", "ed", "ing")
+STEM_MARKER = "*"
+
+# Punctuation becomes whitespace before tokenizing; digits fold to 0 for pattern literals.
+# Byte tables, since str.translate is slow on text containing emoji.
+_PUNCTUATION_TO_SPACE = bytes.maketrans(string.punctuation.encode(), b" " * len(string.punctuation))
+_DIGITS_TO_ZERO = bytes.maketrans(string.digits.encode(), b"0" * len(string.digits))
+
+# A keyword list or a regex pattern, applied to the listed targets (only user input unless
+# the rule says otherwise). A pattern only runs when one of its literals occurs in the
+# lowercased, digit-folded text.
+Rule = namedtuple("Rule", ["name", "category", "keywords", "pattern", "literals", "targets"])
+
+
+def _normalize_keyword(keyword):
+    return " ".join(keyword.lower().replace("-", " ").split())
+
+
+def _trie_pattern(words):
+    """Regex alternation that shares common prefixes, e.g. terroris(?:m|t)
+
+    Python's re tries alternatives one by one; factoring prefixes makes the
+    alternation behave like a trie so each position is rejected after a
+    character or two.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        if "" in node and len(node) == 1:
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(trie)
+
+
+def load_rules(path=RULES_PATH):
+    """Read rules from a JSON file of the form {"rules": [{name, category, keywords | pattern, literals, targets}]}"""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)["rules"]
+    rules = []
+    for entry in entries:
+        if bool(entry.get("keywords")) == bool(entry.get("pattern")):
+            raise ValueError(f"Guardrail rule {entry.get('name')!r} needs exactly one of keywords or pattern")
+        targets = tuple(entry.get("targets", ("input",)))
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            raise ValueError(f"Guardrail rule {entry['name']!r} has unknown targets {sorted(unknown)}")
+        rules.append(Rule(
+            entry["name"],
+            entry.get("category", "harmful"),
+            tuple(_normalize_keyword(keyword) for keyword in entry.get("keywords", ())),
+            entry.get("pattern"),
+            tuple(entry.get("literals", ())),
+            targets
+        ))
+    return rules
+
+
+class _TargetMatcher:
+    """All rules for one target: a keyword trie behind a token-set prefilter, plus gated patterns"""
+
+    def __init__(self, rules):
+        self.keyword_rules = {}
+        stems = set()
+        for rule in rules:
+            for keyword in rule.keywords:
+                if keyword.endswith(STEM_MARKER):
+                    keyword = keyword[:-len(STEM_MARKER)]
+                    stems.add(keyword)
+                self.keyword_rules.setdefault(keyword, rule)
+        words = sorted(set(self.keyword_rules) - stems)
+        # Any inflected first word of a keyword; a text without one (or without a stem) cannot match
+        first_words = {keyword.split()[0] for keyword in words}
+        self.trigger_words = frozenset(
+            word.encode() for word in first_words | {word + suffix for word in first_words for suffix in KEYWORD_SUFFIXES}
+        )
+        self.trigger_stems = tuple(stem.encode() for stem in sorted(stems))
+        self.keyword_regex = None
+        alternatives = []
+        if words:
+            # Spaces in a phrase match whitespace or hyphens ("self harm", "self-harm")
+            trie = _trie_pattern(words).replace(r"\ ", r"[\s-]+")
+            alternatives.append(rf"(?P<word>{trie})(?:{'|'.join(KEYWORD_SUFFIXES)})?")
+        if stems:
+            alternatives.append(rf"(?P<stem>{_trie_pattern(sorted(stems))})\w*")
+        if alternatives:
+            self.keyword_regex = re.compile(rf"\b(?:{'|'.join(alternatives)})\b")
+        self.patterns = [
+            (rule, re.compile(rule.pattern, re.IGNORECASE), tuple(literal.encode() for literal in rule.literals))
+            for rule in rules if rule.pattern
+        ]
+
+    def scan(self, text):
+        lowered = text.lower()
+        encoded = lowered.encode()
+        folded = encoded.translate(_DIGITS_TO_ZERO)
+        for rule, regex, literals in self.patterns:
+            if literals and not any(literal in folded for literal in literals):
+                continue
+            if regex.search(text):
+                return rule
+        if self.keyword_regex is None:
+            return None
+        if self.trigger_words.isdisjoint(encoded.translate(_PUNCTUATION_TO_SPACE).split()) and not any(stem in encoded for stem in self.trigger_stems):
+            return None
+        match = self.keyword_regex.search(lowered)
+        if match is None:
+            return None
+        return self.keyword_rules[_normalize_keyword(match.group("word") or match.group("stem"))]
+
+
+class GuardrailEngine:
+    """Scan text against the rules that apply to a target (input, output or article)"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._matchers = {target: _TargetMatcher([rule for rule in self.rules if target in rule.targets]) for target in TARGETS}
+
+    def scan(self, text, target="input"):
+        """Return the rule text violates, or None; pattern rules are checked before keywords"""
+        return self._matchers[target].scan(text)
+
+
+_engine = None
+
+
+def get_guardrails():
+    """Return the process-wide guardrail engine built from RULES_PATH"""
+    global _engine
+    if _engine is None:
+        _engine = GuardrailEngine(load_rules())
+    return _engine
@@ -0,0 +1,165 @@
+"""Article links from Perplexity answers: structured citations first, text parsing otherwise"""
+import os
+import re
+from collections import namedtuple
+
+# Most links listed per search
+MAX_ARTICLE_LINKS = int(os.getenv("MAX_ARTICLE_LINKS", "10"))
+
+# Below this many real titles, links with placeholder titles ("[Article 1]") are kept too
+MIN_ARTICLE_LINKS = 3
+
+# Web links only (http, https or www.); they may contain balanced parentheses (e.g. Wikipedia) but not whitespace.
+# Shared with rendering, which turns nothing else into an anchor.
+URL_PATTERN = r"(?:https?://|www\.)(?:[^\s()<>\[\]]+|\([^\s()]*\))+"
+MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\[\]]+)\]\((" + URL_PATTERN + r")\)")
+BARE_URL_PATTERN = re.compile(r"https?://(?:[^\s()<>\[\]]+|\([^\s()]*\))+")
+PLACEHOLDER_TITLE_PATTERN = re.compile(r"(?:article|source|link)\s*\d*", re.IGNORECASE)
+CITATION_MARKER_PATTERN = re.compile(r"\[\d+\]")
+LIST_MARKER_PATTERN = re.compile(r"^\s*(?:[•\-\*]|\d+[.)])\s*")
+TRAILING_PUNCTUATION = ".,;:!?'\""
+TITLE_SEPARATORS = " \t-–—:|"
+
+# Query parameters that only track the click and would defeat deduplication
+TRACKING_PARAMETERS = frozenset({"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"})
+
+Link = namedtuple("Link", ["title", "url"])
+
+
+def _split_url(url):
+    """(host without www, path, query) with the scheme and fragment dropped"""
+    rest = url.partition("://")[2] or url
+    rest, _, query = rest.partition("#")[0].partition("?")
+    host, slash, path = rest.partition("/")
+    host = host.lower()
+    return host[4:] if host.startswith("www.") else host, slash + path, query
+
+
+def canonical_url(url):
+    """URL reduced to what identifies the page: any scheme, lower-case host without www, no fragment, tracking or trailing slash"""
+    host, path, query = _split_url(url)
+    canonical = host + path.rstrip("/")
+    if query:
+        kept = [
+            parameter for parameter in query.split("&")
+            if parameter and not parameter.startswith("utm_") and parameter.partition("=")[0] not in TRACKING_PARAMETERS
+        ]
+        if kept:
+            canonical += "?" + "&".join(kept)
+    return canonical
+
+
+def domain_title(url):
+    """Host name without www, used when a link has no usable title"""
+    return _split_url(url)[0] or url
+
+
+def _clean_url(url):
+    url = url.rstrip(TRAILING_PUNCTUATION)
+    return url if "://" in url else f"https://{url}"
+
+
+def _clean_title(title):
+    if "[" in title:
+        title = CITATION_MARKER_PATTERN.sub("", title).replace("[", "(").replace("]", ")")
+    return LIST_MARKER_PATTERN.sub("", title).strip(TITLE_SEPARATORS)
+
+
+class LinkExtractor:
+    """Collects unique links from text fed in arbitrary chunks (e.g. a streamed answer)
+
+    Only complete lines are parsed, so a link split across chunks is seen
+    once it is whole. feed() and close() return the links they added.
+    """
+
+    def __init__(self, max_links=MAX_ARTICLE_LINKS):
+        self.max_links = max_links
+        self.links = []
+        self._seen = set()
+        self._placeholders = []
+        self._buffer = ""
+
+    def add(self, title, url):
+        """Keep a link unless its canonical URL was already seen; returns whether it was kept
+
+        title is used as given (markdown-safe, no list markers); an empty one is replaced by the site name.
+        """
+        if len(self.links) >= self.max_links:
+            return False
+        url = _clean_url(url)
+        key = canonical_url(url)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self.links.append(Link(title or domain_title(url), url))
+        return True
+
+    def feed(self, chunk):
+        if "\n" not in chunk:
+            # Nothing completes a line; most streamed deltas end here
+            self._buffer += chunk
+            return []
+        start = len(self.links)
+        complete, newline, self._buffer = (self._buffer + chunk).rpartition("\n")
+        if newline and len(self.links) < self.max_links:
+            for line in complete.split("\n"):
+                self._parse_line(line)
+        return self.links[start:]
+
+    def close(self):
+        start = len(self.links)
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ""
+        # Too few real titles: fall back to the placeholder-titled links, named after their sites
+        if len(self.links) < MIN_ARTICLE_LINKS:
+            for url in self._placeholders:
+                self.add("", url)
+        self._placeholders = []
+        return self.links[start:]
+
+    def _parse_line(self, line):
+        if len(self.links) >= self.max_links:
+            return
+        if "](" in line:
+            links = MARKDOWN_LINK_PATTERN.findall(line)
+            for title, url in links:
+                title = title.strip()
+                if PLACEHOLDER_TITLE_PATTERN.fullmatch(title):
+                    self._placeholders.append(url)
+                else:
+                    self.add(title, url)
+            if links:
+                return
+        if "http" in line:
+            match = BARE_URL_PATTERN.search(line)
+            if match:
+                # The rest of the line is the title when it says something, e.g. "Title - https://..."
+                title = _clean_title(BARE_URL_PATTERN.sub(" ", line))
+                self.add(title if len(title) > 10 else "", match.group())
+
+
+def extract_links(content, citations=None, search_results=None, max_links=MAX_ARTICLE_LINKS):
+    """Links for an answer, preferring the response's structured search results and citations
+
+    search_results are Perplexity's {"title", "url"} entries and citations its
+    list of URLs. Citations carry no titles, so those come from the matching
+    links in the text, or the site name.
+    """
+    extractor = LinkExtractor(max_links)
+    if not search_results and not citations:
+        extractor.feed(content)
+        extractor.close()
+        return extractor.links
+    titles = {}
+    if citations and not search_results:
+        text_links = LinkExtractor(max_links=len(citations) + max_links)
+        text_links.feed(content)
+        text_links.close()
+        titles = {canonical_url(link.url): link.title for link in text_links.links}
+    for result in search_results or ():
+        if result.get("url"):
+            extractor.add(_clean_title(result.get("title") or ""), result["url"])
+    for url in citations or ():
+        extractor.add(titles.get(canonical_url(_clean_url(url)), ""), url)
+    return extractor.links
@@ -0,0 +1,130 @@
+"""Compact, token-budgeted prompt sections with per-section token accounting"""
+import logging
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from retrieval import NAME_COLUMN
+from tokens import count_message_tokens, count_tokens
+from tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+# Tokens for everything we send (the 8k GPT-4 context also has to hold the answer)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+# Always sent, so the model can name and place each company
+IDENTITY_COLUMNS = (NAME_COLUMN, "Country", "Subsector")
+
+# Sent when the question names no metric
+DEFAULT_PROMPT_METRICS = (
+    "Revenue (USD)",
+    "Growth Rate",
+    "EBITDA Margin (%)",
+    "Net Profit Margin (%)",
+    "ROE (%)",
+    "Debt-to-Equity",
+)
+
+# Text columns are only worth their tokens when the question is about them
+TEXT_COLUMN_TRIGGERS = {
+    "Investors": re.compile(r"\b(investors?|backed|backers?|funded|funding|vc|shareholders?|owned)\b", re.IGNORECASE),
+    "Notes": re.compile(r"\b(notes?|business model|strateg\w*|describe|description|overview|profile|what does|what do)\b", re.IGNORECASE),
+}
+
+_totals = Counter()
+_prompt_count = 0
+_totals_lock = threading.Lock()
+
+
+def select_columns(columns, query, parsed, first_query=False, matched_columns=()):
+    """Columns worth sending for a question: identity, the metrics it is about, and text columns it asks for or matched"""
+    named = [f.column for f in parsed.filters]
+    if parsed.sort_column and parsed.sort_column != "Revenue (USD)":
+        named.append(parsed.sort_column)
+    metrics = list(dict.fromkeys(named + list(DEFAULT_PROMPT_METRICS))) if first_query or not named else ["Revenue (USD)"] + named
+    wanted = list(IDENTITY_COLUMNS) + metrics
+    for column, trigger in TEXT_COLUMN_TRIGGERS.items():
+        if column in parsed.values or trigger.search(query):
+            wanted.append(column)
+    wanted.extend(matched_columns)
+    return [column for column in dict.fromkeys(wanted) if column in columns]
+
+
+def _format_number(value):
+    if np.isnan(value):
+        return ""
+    return np.format_float_positional(value, precision=2, trim="-")
+
+
+def rows_to_csv_lines(rows, columns):
+    """Header line and one CSV line per row, numbers without float32 noise or trailing zeros"""
+    frame = rows[columns].astype({column: "float64" for column in columns if rows[column].dtype.kind == "f"})
+    lines = frame.to_csv(index=False, float_format=_format_number, lineterminator="\n").splitlines()
+    return lines[0], lines[1:]
+
+
+class PromptBuilder:
+    """Collects the sections of one prompt and fits dataset rows into what the budget leaves
+
+    Add fixed sections (instructions, question, statistics, articles,
+    conversation) first; add_rows then keeps as many of the most relevant
+    rows as still fit. finish() logs tokens per section and adds them to the
+    process-wide totals shown in the sidebar.
+    """
+
+    def __init__(self, route, budget=PROMPT_TOKEN_BUDGET):
+        self.route = route
+        self.budget = budget
+        self.sections = {}
+
+    def add(self, name, text):
+        """Record a fixed section and return its text"""
+        self.sections[name] = self.sections.get(name, 0) + count_tokens(text)
+        return text
+
+    def add_messages(self, name, messages):
+        """Record chat messages (e.g. conversation history) as one section"""
+        self.sections[name] = self.sections.get(name, 0) + count_message_tokens(messages)
+        return messages
+
+    def remaining(self):
+        return self.budget - sum(self.sections.values())
+
+    def add_rows(self, name, rows, columns):
+        """Rows as CSV (header once), trimmed from the least relevant end to fit the budget"""
+        header, lines = rows_to_csv_lines(rows, columns)
+        remaining = self.remaining() - count_tokens(header)
+        kept = []
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if cost > remaining:
+                break
+            kept.append(line)
+            remaining -= cost
+        if len(kept) < len(lines):
+            logger.info("Prompt budget kept %d of %d %s rows", len(kept), len(lines), name)
+        return self.add(name, "\n".join([header] + kept))
+
+    def finish(self, messages):
+        """Log and accumulate tokens per section; anything not in a section counts as "template\""""
+        global _prompt_count
+        report = dict(self.sections)
+        report["template"] = max(0, count_message_tokens(messages) - sum(self.sections.values()))
+        logger.info("Prompt tokens for %s: %s", self.route, report)
+        annotate(prompt_tokens=sum(report.values()), prompt_sections=report)
+        with _totals_lock:
+            _prompt_count += 1
+            _totals.update(report)
+        return messages
+
+
+def token_report():
+    """Average prompt tokens per section across every prompt built in this process"""
+    with _totals_lock:
+        if not _prompt_count:
+            return {}
+        return {section: tokens / _prompt_count for section, tokens in _totals.most_common()}
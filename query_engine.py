@@ -0,0 +1,193 @@
+"""Exact answers to dataset lookups, rankings and aggregates, planned from the question without the LLM"""
+import logging
+import re
+import threading
+from collections import Counter, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from retrieval import FILTER_PATTERN, METRIC_LOOKUP, METRIC_PATTERN, NAME_COLUMN, SORT_PATTERN, ParsedQuery
+from tracing import loggable_query
+
+logger = logging.getLogger(__name__)
+
+# Rows listed when a question does not say how many
+DEFAULT_LIST_LIMIT = 10
+
+LIMIT_PATTERN = re.compile(r"\b(?:top|bottom|first|last)\s+(?P<limit>\d+)\b|\b(?P<count>\d+)\s+(?=(?:companies|firms|players|operators|names)\b)", re.IGNORECASE)
+AGGREGATE_PATTERN = re.compile(
+    rf"\b(?P<function>average|avg|mean|median|total|sum|minimum|min|maximum|max)\s+(?:of\s+)?(?:the\s+)?(?P<metric>{METRIC_PATTERN})",
+    re.IGNORECASE
+)
+COUNT_PATTERN = re.compile(r"\b(?:how many|number of|count of|count)\b", re.IGNORECASE)
+GROUP_PATTERN = re.compile(r"\b(?:by|per|for each|in each|across|which)\s+(?P<dimension>countr(?:y|ies)|subsectors?|sectors?|segments?|investors?)\b", re.IGNORECASE)
+BARE_METRIC_PATTERN = re.compile(rf"\b(?:{METRIC_PATTERN})\b", re.IGNORECASE)
+
+AGGREGATE_FUNCTIONS = {
+    "average": "mean", "avg": "mean", "mean": "mean", "median": "median", "total": "sum", "sum": "sum",
+    "minimum": "min", "min": "min", "maximum": "max", "max": "max",
+}
+GROUP_COLUMNS = {"countr": "Country", "subsector": "Subsector", "sector": "Subsector", "segment": "Subsector", "investor": "Investors"}
+FUNCTION_LABELS = {"count": "Number of companies", "mean": "Average", "median": "Median", "sum": "Total", "min": "Minimum", "max": "Maximum"}
+
+# Words a lookup may contain besides values, metrics and conditions; anything else (e.g. "why",
+# "these", "recommend") means the question needs reasoning or the conversation, so it goes to the LLM
+STRUCTURAL_WORDS = frozenset("""
+    a an the in of for and with from to on at by per is are was were be do does
+    which what who show list give me us find display return get rank ranked ranking sorted sort order ordered
+    companies company firms firm players player operators operator businesses names
+    all every each any our dataset data please only just have has having their its that
+    backed funded based located headquartered operating
+    highest lowest top bottom most least largest smallest biggest
+""".split())
+
+# What the engine understood: the rows to keep, their order and how many, or an aggregate (optionally per group);
+# metrics are the ones the question names, shown alongside the ranking
+QueryPlan = namedtuple("QueryPlan", ["values", "filters", "sort_column", "ascending", "limit", "aggregate", "group_by", "metrics"])
+
+_paths = Counter()
+_paths_lock = threading.Lock()
+
+
+def plan_query(query, retriever):
+    """A QueryPlan if every part of query is a value, metric, condition or ranking the engine understands, else None"""
+    parsed = retriever.parse(query)
+    limit_match = LIMIT_PATTERN.search(query)
+    aggregate_match = AGGREGATE_PATTERN.search(query)
+    group_match = GROUP_PATTERN.search(query)
+    aggregate = None
+    if aggregate_match:
+        aggregate = (AGGREGATE_FUNCTIONS[aggregate_match.group("function").lower()], METRIC_LOOKUP[aggregate_match.group("metric").lower()])
+    elif COUNT_PATTERN.search(query) or group_match:
+        aggregate = ("count", None)
+    group_by = None
+    if group_match:
+        dimension = group_match.group("dimension").lower()
+        group_by = next(column for prefix, column in GROUP_COLUMNS.items() if dimension.startswith(prefix))
+    if group_by and aggregate is None:
+        aggregate = ("count", None)
+
+    if not (parsed.values or parsed.filters or SORT_PATTERN.search(query) or limit_match or aggregate):
+        return None
+    if _unexplained_words(query, retriever):
+        return None
+    limit = None
+    if limit_match:
+        limit = int(limit_match.group("limit") or limit_match.group("count"))
+    metrics = tuple(dict.fromkeys(METRIC_LOOKUP[phrase.lower()] for phrase in BARE_METRIC_PATTERN.findall(query)))
+    return QueryPlan(parsed.values, parsed.filters, parsed.sort_column, parsed.ascending, limit, aggregate, group_by, metrics)
+
+
+def _unexplained_words(query, retriever):
+    text = query
+    for pattern in (FILTER_PATTERN, SORT_PATTERN, LIMIT_PATTERN, AGGREGATE_PATTERN, COUNT_PATTERN, GROUP_PATTERN, BARE_METRIC_PATTERN):
+        text = pattern.sub(" ", text)
+    words = re.findall(r"[a-z0-9]+", retriever.without_values(text))
+    return [word for word in words if word not in STRUCTURAL_WORDS]
+
+
+def _mask(plan, retriever):
+    """Rows matching every value and numeric filter in plan"""
+    mask = retriever.filter_mask(plan.filters)
+    if plan.values:
+        mask &= retriever.match_scores(ParsedQuery(plan.values, plan.filters, plan.sort_column, plan.ascending)) == len(plan.values)
+    return mask
+
+
+def execute(plan, retriever):
+    """Run plan over the dataset: (result DataFrame, number of companies matching its conditions)"""
+    mask = _mask(plan, retriever)
+    matched = int(mask.sum())
+    if plan.aggregate is not None:
+        function, column = plan.aggregate
+        frame = pd.DataFrame({"value": retriever.numeric(column)[mask] if column else np.ones(matched)})
+        if plan.group_by:
+            frame[plan.group_by] = retriever.df[plan.group_by].to_numpy()[mask]
+            grouped = frame.groupby(plan.group_by, observed=True)["value"]
+            result = pd.DataFrame({"value": grouped.agg(function), "companies": grouped.size()})
+            result = result.sort_values("value", ascending=plan.ascending, kind="stable")
+            return result.head(plan.limit) if plan.limit else result, matched
+        value = frame["value"].agg(function) if matched else np.nan
+        return pd.DataFrame({"value": [value], "companies": [matched]}), matched
+
+    positions = np.flatnonzero(mask)
+    keys = retriever.numeric(plan.sort_column)
+    if keys is not None and len(positions):
+        keys = keys[positions]
+        # Missing figures go last whichever way the ranking runs
+        keys = np.where(np.isnan(keys), np.inf if plan.ascending else -np.inf, keys)
+        positions = positions[np.argsort(keys if plan.ascending else -keys, kind="stable")]
+    return retriever.df.iloc[positions[:plan.limit or DEFAULT_LIST_LIMIT]], matched
+
+
+def metric_label(column):
+    """Column name without the unit, which the formatted value carries"""
+    return re.sub(r"\s*\((?:%|days)\)$", "", column)
+
+
+def format_value(column, value):
+    """A figure as an analyst would write it"""
+    if value is None or pd.isna(value):
+        return "n/a"
+    if column == "Revenue (USD)":
+        return f"${value:,.0f}"
+    if column and (column.endswith("(%)") or column == "Growth Rate"):
+        return f"{value:.1f}%"
+    if column and column.endswith("(days)"):
+        return f"{value:.0f} days"
+    return f"{value:,.2f}".rstrip("0").rstrip(".") if column else f"{value:,.0f}"
+
+
+def describe_conditions(plan):
+    """The plan's conditions in words, e.g. "in Egypt, Cold Chain, with ROE (%) > 20\""""
+    parts = [" / ".join(values) for values in plan.values.values()]
+    for numeric_filter in plan.filters:
+        if numeric_filter.op == "between":
+            low, high = numeric_filter.value
+            parts.append(f"{metric_label(numeric_filter.column)} between {format_value(numeric_filter.column, low)} and {format_value(numeric_filter.column, high)}")
+        else:
+            parts.append(f"{metric_label(numeric_filter.column)} {numeric_filter.op} {format_value(numeric_filter.column, numeric_filter.value)}")
+    return ", ".join(parts) if parts else "all companies"
+
+
+def format_answer(plan, result, matched):
+    """Bullet-list answer for the chat, headed by what was computed"""
+    conditions = describe_conditions(plan)
+    if plan.aggregate is not None:
+        function, column = plan.aggregate
+        label = FUNCTION_LABELS[function] + (f" {metric_label(column)}" if column else "")
+        if plan.group_by:
+            lines = [f"{label} by {plan.group_by} ({conditions}; {matched} companies):"]
+            lines += [
+                f"• {row.Index}: {format_value(column, row.value)}" + ("" if function == "count" else f" ({row.companies} companies)")
+                for row in result.itertuples()
+            ]
+            return "\n".join(lines)
+        if function == "count":
+            return f"• {label} ({conditions}): {matched}"
+        return f"• {label} ({conditions}): {format_value(column, result['value'].iloc[0])} across {matched} companies"
+
+    if result.empty:
+        return f"• No companies in the dataset match: {conditions}"
+    metrics = list(dict.fromkeys([plan.sort_column] + [f.column for f in plan.filters] + list(plan.metrics)))
+    direction = "lowest" if plan.ascending else "highest"
+    lines = [f"Companies with the {direction} {metric_label(plan.sort_column)} ({conditions}; showing {len(result)} of {matched}):"]
+    for _, row in result.iterrows():
+        where = ", ".join(str(row[column]) for column in ("Country", "Subsector") if column in row and pd.notna(row[column]))
+        figures = ", ".join(f"{metric_label(metric)} {format_value(metric, row[metric])}" for metric in metrics if metric in row)
+        lines.append(f"• {row[NAME_COLUMN]} ({where}): {figures}")
+    return "\n".join(lines)
+
+
+def record_path(path, query):
+    """Count how a dataset question was answered ("query_engine" or "llm")"""
+    with _paths_lock:
+        _paths[path] += 1
+    logger.info("Dataset question answered via %s: %s", path, loggable_query(query))
+
+
+def path_counts():
+    """Dataset questions answered per path in this process"""
+    with _paths_lock:
+        return dict(_paths)
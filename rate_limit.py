@@ -0,0 +1,167 @@
+"""Client-side request and token rate limits per provider, served in priority order"""
+import heapq
+import itertools
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Per-minute limits; set them to your account's tier. 0 turns a limit off
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "40000"))
+PERPLEXITY_RPM = float(os.getenv("PERPLEXITY_RPM", "50"))
+
+# Longest a call waits for its turn before giving up with RateLimitTimeout
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))
+
+# Lower runs first; calls inherit the priority of the context that made them
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+
+# A level, or a SharedPriority for work done on behalf of several callers
+_priority = ContextVar("request_priority", default=INTERACTIVE)
+
+# Every limiter, so a raised SharedPriority can wake calls already waiting in their queues
+_limiters = weakref.WeakSet()
+
+
+class RateLimitTimeout(Exception):
+    """A call waited RATE_LIMIT_MAX_WAIT for capacity without getting it"""
+
+
+class SharedPriority:
+    """Priority of one call shared by several callers: the most urgent of theirs
+
+    An interactive question that joins a batch run's identical call in flight
+    raises the call to interactive priority, including rate limit waits it is
+    already queued in.
+    """
+
+    def __init__(self, level):
+        self.level = level
+
+    def raise_to(self, level):
+        if level >= self.level:
+            return
+        self.level = level
+        for limiter in list(_limiters):
+            limiter.reprioritize()
+
+
+def current_priority():
+    """Priority level of the current context"""
+    level = _priority.get()
+    return level.level if isinstance(level, SharedPriority) else level
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed calls (and work they submit to the shared pool) at level, a level or a SharedPriority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Holds up to a minute's worth of capacity, refilled continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (0 if it is now)"""
+        self._refill(now)
+        return max(0.0, (min(amount, self.capacity) - self._level) / self.rate)
+
+    def take(self, amount):
+        self._level -= min(amount, self.capacity)
+
+    def drain(self, now):
+        self._refill(now)
+        self._level = min(self._level, 0.0)
+
+
+class RateLimiter:
+    """RPM and TPM buckets for one provider with a priority queue of waiting calls
+
+    Only the call at the head of the queue (lowest priority level, then
+    arrival order) may take capacity, so interactive questions overtake batch
+    runs and background refreshes instead of racing them.
+    """
+
+    def __init__(self, name, rpm=0, tpm=0, max_wait=RATE_LIMIT_MAX_WAIT):
+        self.name = name
+        self.max_wait = max_wait
+        self._buckets = [(TokenBucket(rpm), False)] if rpm else []
+        if tpm:
+            self._buckets.append((TokenBucket(tpm), True))
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+        _limiters.add(self)
+
+    def _wait_time(self, tokens, now):
+        waits = [bucket.wait_time(tokens if counts_tokens else 1, now) for bucket, counts_tokens in self._buckets]
+        return max(waits + [self._paused_until - now, 0.0])
+
+    def acquire(self, tokens=0):
+        """Block until one request of tokens fits the limits; return the seconds spent waiting"""
+        if not self._buckets:
+            return 0.0
+        started = time.monotonic()
+        entry = (current_priority(), next(self._order))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    level = current_priority()
+                    if level < entry[0]:
+                        # Someone more urgent now waits on this call; it moves up, keeping its arrival order
+                        self._waiting.remove(entry)
+                        heapq.heapify(self._waiting)
+                        entry = (level, entry[1])
+                        heapq.heappush(self._waiting, entry)
+                    now = time.monotonic()
+                    wait = self._wait_time(tokens, now) if self._waiting[0] == entry else None
+                    if wait == 0.0:
+                        for bucket, counts_tokens in self._buckets:
+                            bucket.take(tokens if counts_tokens else 1)
+                        return now - started
+                    remaining = started + self.max_wait - now
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"{self.name} is busy right now, please try again in a minute")
+                    self._condition.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                # The next call in line may be able to go now
+                self._condition.notify_all()
+
+    def reprioritize(self):
+        """Wake waiting calls so they pick up a raised SharedPriority"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def pause(self, seconds):
+        """Hold every call back for seconds, e.g. after the provider answered 429 with Retry-After"""
+        now = time.monotonic()
+        with self._condition:
+            self._paused_until = max(self._paused_until, now + seconds)
+            for bucket, _ in self._buckets:
+                bucket.drain(now)
+
+    def depth(self):
+        """Calls waiting for their turn"""
+        with self._condition:
+            return len(self._waiting)
@@ -0,0 +1,225 @@
+"""Markdown-to-HTML conversion and memoized chat bubble rendering"""
+import functools
+import html
+import os
+import re
+
+from link_extractor import MARKDOWN_LINK_PATTERN, URL_PATTERN
+
+# Distinct messages whose rendered HTML is kept in memory (shared by all sessions)
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "2048"))
+
+# Cleanup applied to assistant messages before conversion
+TAG_PATTERN = re.compile(r'<[^>]*>')
+ENTITY_PATTERN = re.compile(r'&[a-zA-Z]+;')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+
+# Model chatter about the article section that should never reach the user
+SKIPPED_PHRASES = (
+    "Please provide relevant articles",
+    "Please provide the relevant articles",
+    "I will provide current articles separately",
+    "these will be filled in separately",
+)
+SKIPPED_PATTERN = re.compile('|'.join(re.escape(phrase) for phrase in SKIPPED_PHRASES))
+
+# Block type of a stripped line, decided by a single anchored match
+BLOCK_PATTERN = re.compile(
+    r'(?P<section>\d+\.\s+[📊🏢🔗])'  # 1. 📊 Summary of Findings, 2. 🏢 Insights, 3. 🔗 Relevant Articles
+    r'|(?P<subsection>\d+\.\s+[A-Z])'  # 1. Investment Opportunities:
+    r'|(?P<heading>## )'  # ## headers (like from perplexity)
+    r'|(?P<bullet>[•-] )'
+    r'|(?P<url>http)'
+)
+# Markdown links and bare URLs that may become anchors: web URLs only, never javascript: or data:
+LINK_PATTERN = MARKDOWN_LINK_PATTERN
+SAFE_URL_PATTERN = re.compile(URL_PATTERN)
+
+SUBSECTION_STYLE = "color: #2c2c2c; font-size: 1rem; font-weight: 600; margin: 1rem 0 0.5rem 0;"
+
+
+def _escape(text):
+    return html.escape(text, quote=False)
+
+
+def _link(url, text):
+    """Anchor for a web URL; anything else is shown as text"""
+    if not SAFE_URL_PATTERN.fullmatch(url):
+        return _escape(text)
+    href = url if "://" in url else f"https://{url}"
+    return f'<a href="{html.escape(href)}" target="_blank">{_escape(text)}</a>'
+
+
+def _inline(text):
+    """Escape text, turning markdown links [text](url) into anchors"""
+    if '](' not in text:
+        return _escape(text)
+    parts = []
+    position = 0
+    for match in LINK_PATTERN.finditer(text):
+        parts.append(_escape(text[position:match.start()]))
+        parts.append(_link(match.group(2), match.group(1)))
+        position = match.end()
+    parts.append(_escape(text[position:]))
+    return ''.join(parts)
+
+
+class HtmlConverter:
+    """Line-by-line markdown converter; the only state is whether a <ul> is open"""
+
+    def __init__(self):
+        self.in_list = False
+
+    def _open_list(self, html_lines):
+        if not self.in_list:
+            html_lines.append('<ul>')
+            self.in_list = True
+
+    def _close_list(self, html_lines):
+        if self.in_list:
+            html_lines.append('</ul>')
+            self.in_list = False
+
+    def convert_line(self, line):
+        """Return the HTML lines produced by one line of markdown"""
+        html_lines = []
+        line_stripped = line.strip()
+
+        if not line_stripped:
+            self._close_list(html_lines)
+            html_lines.append('<br>')
+            return html_lines
+        if SKIPPED_PATTERN.search(line_stripped):
+            return html_lines
+
+        match = BLOCK_PATTERN.match(line_stripped)
+        block = match.lastgroup if match else None
+        if block == 'section':
+            self._close_list(html_lines)
+            html_lines.append(f'<h2>{_escape(line_stripped)}</h2>')
+        elif block == 'heading':
+            self._close_list(html_lines)
+            html_lines.append(f'<h2>{_escape(line_stripped[3:].strip())}</h2>')
+        elif block == 'subsection':
+            self._close_list(html_lines)
+            html_lines.append(f'<h3 style="{SUBSECTION_STYLE}">{_escape(line_stripped)}</h3>')
+        elif block == 'url' and not ('[' in line_stripped and '](' in line_stripped):
+            # Standalone URL
+            self._open_list(html_lines)
+            html_lines.append(f'<li>{_link(line_stripped, line_stripped)}</li>')
+        else:
+            # Bullets, lines with markdown links and all other text become list items
+            self._open_list(html_lines)
+            item_text = line_stripped[2:].strip() if block == 'bullet' else line_stripped
+            html_lines.append(f'<li>{_inline(item_text)}</li>')
+        return html_lines
+
+    def finish(self):
+        """Return the HTML lines that close any open list"""
+        html_lines = []
+        self._close_list(html_lines)
+        return html_lines
+
+
+def process_content_to_html(content):
+    """Convert markdown content to HTML with proper header styling"""
+    converter = HtmlConverter()
+    html_lines = []
+    for line in content.split('\n'):
+        html_lines.extend(converter.convert_line(line))
+    html_lines.extend(converter.finish())
+    return '\n'.join(html_lines)
+
+
+class StreamingHtmlRenderer:
+    """Incrementally render a growing response
+
+    Each update takes the full text so far. When it extends the previous text
+    only the newly completed lines are converted; the trailing partial line is
+    previewed without being committed. Text that rewrites earlier content
+    (e.g. articles spliced into a section) triggers one full re-render.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._converter = HtmlConverter()
+        self._html_lines = []
+        self._text = ""
+        self._pending = ""
+
+    def update(self, text):
+        """Render text, returning the HTML for everything received so far"""
+        if not text.startswith(self._text):
+            self._reset()
+        buffer = self._pending + text[len(self._text):]
+        self._text = text
+        *complete_lines, self._pending = buffer.split('\n')
+        for line in complete_lines:
+            self._html_lines.extend(self._converter.convert_line(line))
+        return self.html()
+
+    def html(self):
+        """HTML for committed lines plus a preview of the partial last line"""
+        preview = HtmlConverter()
+        preview.in_list = self._converter.in_list
+        tail = preview.convert_line(self._pending) if self._pending else []
+        return '\n'.join(self._html_lines + tail + preview.finish())
+
+
+def user_message_html(content):
+    """Chat bubble markup for a user message (stripped so bubbles can be concatenated)"""
+    return f"""
+        <div class="chat-message user-message">
+            <div class="message-content">
+                {content}
+            </div>
+        </div>
+    """.strip()
+
+
+def assistant_message_html(processed_content):
+    """Chat bubble markup for an already converted assistant message"""
+    return f"""
+        <div class="chat-message assistant-message">
+            <div class="message-content">
+                {processed_content}
+            </div>
+        </div>
+    """.strip()
+
+
+def clean_assistant_content(content):
+    """Remove HTML tags and entities the model emitted and collapse runs of blank lines"""
+    content = TAG_PATTERN.sub('', content)
+    content = ENTITY_PATTERN.sub('', content)
+    content = BLANK_LINES_PATTERN.sub('\n\n', content)
+    return content.strip()
+
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_message_html(role, content):
+    """Chat bubble HTML for a message, memoized on its role and content"""
+    if role == "user":
+        # Escaped, and without blank lines, so bubbles can be joined into one markdown block
+        return user_message_html(html.escape(content).replace('\n', '<br>'))
+    return assistant_message_html(process_content_to_html(clean_assistant_content(content)))
+
+
+def message_html(message):
+    """Bubble HTML for a transcript message, rendered once and kept on the message"""
+    if "html" not in message:
+        message["html"] = render_message_html(message["role"], message["content"])
+    return message["html"]
+
+
+def transcript_html(messages):
+    """HTML for a run of messages as a single markdown block"""
+    return '\n'.join(message_html(message) for message in messages)
+
+
+def transcript_page(messages, visible_count):
+    """(number of older messages paged out, HTML of the latest visible_count messages)"""
+    hidden_count = max(0, len(messages) - visible_count)
+    return hidden_count, transcript_html(messages[hidden_count:])
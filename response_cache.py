@@ -0,0 +1,150 @@
+"""Semantic cache of AI responses for near-identical analyst questions"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from embeddings import embed_text, entity_signature
+
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.85"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+RESPONSE_CACHE_MAX_AGE = float(os.getenv("RESPONSE_CACHE_MAX_AGE", str(6 * 3600)))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class SemanticResponseCache:
+    """In-process cache matching queries by embedding similarity
+
+    Entries live in a namespace (e.g. first query vs follow-up) and are tied to a
+    dataset version; carry_over() moves the ones a dataset change left valid to
+    the new version, and an unannounced newer version drops every entry. Two
+    queries only match if their cosine similarity reaches the threshold and they
+    have the same entity_signature: countries, numbers, comparison directions,
+    negation and, when the caller passes the parsed query, the values, filters
+    and ranking retrieval understood.
+    """
+
+    def __init__(self, threshold=RESPONSE_CACHE_THRESHOLD, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_age=RESPONSE_CACHE_MAX_AGE):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = []
+        self._matrix = None
+
+    def lookup(self, query, namespace, version, parsed=None):
+        """Return the cached response for a similar query, or None"""
+        vector = embed_text(query)
+        signature = entity_signature(query, parsed)
+        now = time.time()
+        with self._lock:
+            current = self._sync_version(version)
+            self._expire(now)
+            best = None
+            if self._entries and current:
+                scores = self._vectors() @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = self._entries[i]
+                    if entry["namespace"] == namespace and entry["signature"] == signature:
+                        best = entry
+                        break
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            best["used_at"] = now
+            return best["response"]
+
+    def store(self, query, namespace, version, response, segments=None, parsed=None):
+        """Cache response for query, evicting the least recently used entries beyond the size limit
+
+        segments are the {dimension: [values]} the answer is about, which decide
+        whether it survives a dataset change; parsed is the query as retrieval
+        understood it, which lookups must match.
+        """
+        now = time.time()
+        entry = {
+            "query": query,
+            "namespace": namespace,
+            "segments": segments or {},
+            "signature": entity_signature(query, parsed),
+            "vector": embed_text(query),
+            "response": response,
+            "created_at": now,
+            "used_at": now,
+        }
+        with self._lock:
+            if not self._sync_version(version):
+                # Answered from a dataset version that has since been replaced
+                return
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries.sort(key=lambda e: e["used_at"], reverse=True)
+                del self._entries[self.max_entries:]
+            self._matrix = None
+
+    def carry_over(self, version, keep):
+        """Move to a new dataset version, keeping the entries for whose segments keep(segments) is true"""
+        with self._lock:
+            if self._version is not None and self._version >= version:
+                # A lookup on the new version got here first and already dropped every older entry
+                return
+            kept = [entry for entry in self._entries if keep(entry["segments"])]
+            self.invalidated += len(self._entries) - len(kept)
+            self._entries = kept
+            self._version = version
+            self._matrix = None
+
+    def stats(self):
+        """Hit/miss counters for tuning the similarity threshold"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "invalidated": self.invalidated,
+                "threshold": self.threshold,
+            }
+
+    def _sync_version(self, version):
+        """Whether version is the current one, dropping every entry when a newer one shows up unannounced"""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self.invalidated += len(self._entries)
+            self._version = version
+            self._entries = []
+            self._matrix = None
+        return True
+
+    def _expire(self, now):
+        fresh = [e for e in self._entries if now - e["created_at"] < self.max_age]
+        if len(fresh) != len(self._entries):
+            self._entries = fresh
+            self._matrix = None
+
+    def _vectors(self):
+        if self._matrix is None:
+            self._matrix = np.vstack([e["vector"] for e in self._entries])
+        return self._matrix
+
+
+def get_response_cache():
+    """Return the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticResponseCache()
+    return _cache
@@ -0,0 +1,244 @@
+"""Relevance-ranked retrieval of company rows for prompt context"""
+import copy
+import re
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+INDEXED_COLUMNS = ("Country", "Subsector", "Investors")
+NAME_COLUMN = "Company Name"
+
+# Phrases analysts use for values stored differently in the dataset
+VALUE_ALIASES = {
+    "Country": {
+        "KSA": ("saudi arabia", "saudi", "ksa"),
+        "UAE": ("united arab emirates", "emirates", "uae", "dubai", "abu dhabi"),
+    },
+    "Subsector": {
+        "Last-Mile Delivery": ("last mile", "last-mile", "final mile"),
+        "Cold Chain": ("cold chain", "cold-chain", "refrigerated", "temperature controlled"),
+        "Warehouse Automation": ("warehouse automation", "warehousing", "automated warehouse"),
+        "Crowdsourced Delivery": ("crowdsourced", "crowd-sourced", "gig delivery"),
+        "Freight": ("freight", "trucking", "haulage", "shipping"),
+        "Express": ("express", "courier", "parcel"),
+    },
+}
+
+# Phrases that name a numeric column, longest first so "net profit margin" beats "profit margin"
+METRIC_ALIASES = {
+    "EBITDA Margin (%)": ("ebitda margin", "ebitda"),
+    "Net Profit Margin (%)": ("net profit margin", "net margin", "profit margin", "profitability"),
+    "ROE (%)": ("return on equity", "roe"),
+    "ROA (%)": ("return on assets", "roa"),
+    "Debt-to-Equity": ("debt-to-equity", "debt to equity", "d/e", "leverage", "gearing"),
+    "Current Ratio": ("current ratio",),
+    "Quick Ratio": ("quick ratio", "acid test"),
+    "Cash Conversion Cycle (days)": ("cash conversion cycle", "cash cycle", "ccc"),
+    "Inventory Turnover": ("inventory turnover",),
+    "Asset Turnover": ("asset turnover",),
+    "Revenue (USD)": ("revenue", "sales"),
+    "Growth Rate": ("growth rate", "growth", "growing"),
+}
+
+COMPARATORS = {
+    ">": ("above", "over", "greater than", "more than", "higher than", "exceeding", "in excess of", ">"),
+    ">=": ("at least", "no less than", "minimum of", ">="),
+    "<": ("below", "under", "less than", "lower than", "beneath", "<"),
+    "<=": ("at most", "no more than", "maximum of", "<="),
+}
+
+UNIT_SCALES = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mn": 1e6, "million": 1e6, "b": 1e9, "bn": 1e9, "billion": 1e9}
+
+ASCENDING_WORDS = re.compile(r"\b(lowest|least|smallest|worst|bottom|cheapest|shortest|fewest)\b")
+
+
+def _alternation(phrases):
+    return "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+
+
+METRIC_LOOKUP = {phrase: column for column, phrases in METRIC_ALIASES.items() for phrase in phrases}
+METRIC_PATTERN = _alternation(METRIC_LOOKUP)
+_COMPARATOR_LOOKUP = {phrase: op for op, phrases in COMPARATORS.items() for phrase in phrases}
+FILTER_PATTERN = re.compile(
+    rf"(?P<metric>{METRIC_PATTERN})\s*(?:\([^)]*\)\s*)?(?:of|is|are|was|at|:)?\s*"
+    rf"(?:(?P<between>between)\s*(?P<low>-?\d+(?:\.\d+)?)\s*%?\s*(?:and|-|to)\s*(?P<high>-?\d+(?:\.\d+)?)"
+    rf"|(?P<op>{_alternation(_COMPARATOR_LOOKUP)})\s*(?P<value>-?\d+(?:\.\d+)?))"
+    rf"\s*(?P<unit>%|k|thousand|mn|m|million|bn|b|billion)?\b",
+    re.IGNORECASE
+)
+SORT_PATTERN = re.compile(rf"\b(?:by|highest|lowest|best|worst|top|bottom|most|least|strongest|weakest)\s+(?:\w+\s+)?(?P<metric>{METRIC_PATTERN})", re.IGNORECASE)
+
+# Filter on one numeric column: op is one of > >= < <= between, value a number or (low, high)
+NumericFilter = namedtuple("NumericFilter", ["column", "op", "value"])
+
+# Everything retrieval understood about a question
+ParsedQuery = namedtuple("ParsedQuery", ["values", "filters", "sort_column", "ascending"])
+
+
+def to_numeric(series):
+    """Numeric view of a column, accepting percentage strings like "40%\""""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return pd.to_numeric(series.astype(str).str.rstrip("%").str.replace(",", ""), errors="coerce")
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text.lower().replace("-", " ")).strip()
+
+
+def parse_numeric_filters(query):
+    """Extract filters such as "EBITDA margin above 20%" or "revenue between 5 and 10 million\""""
+    filters = []
+    for match in FILTER_PATTERN.finditer(query):
+        column = METRIC_LOOKUP[match.group("metric").lower()]
+        scale = UNIT_SCALES.get((match.group("unit") or "").lower(), 1.0)
+        if match.group("between"):
+            low, high = float(match.group("low")) * scale, float(match.group("high")) * scale
+            filters.append(NumericFilter(column, "between", (min(low, high), max(low, high))))
+        else:
+            op = _COMPARATOR_LOOKUP[match.group("op").lower()]
+            filters.append(NumericFilter(column, op, float(match.group("value")) * scale))
+    return filters
+
+
+def _numeric_columns(df):
+    return {column: to_numeric(df[column]).to_numpy() for column in METRIC_ALIASES if column in df}
+
+
+class DatasetRetriever:
+    """Pre-built inverted indexes over the dataset for picking the rows a question is about"""
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self._numeric = _numeric_columns(self.df)
+        # column -> normalized phrase -> row positions
+        self._index = {column: defaultdict(list) for column in INDEXED_COLUMNS if column in self.df}
+        self._canonical = {column: {} for column in self._index}
+        for column, postings in self._index.items():
+            for position, cell in enumerate(self.df[column]):
+                if pd.isna(cell):
+                    continue
+                for value in re.split(r"\s*[,;&/]\s*", str(cell)):
+                    if value:
+                        postings[_normalize(value)].append(position)
+                        self._canonical[column][_normalize(value)] = value
+            for canonical, phrases in VALUE_ALIASES.get(column, {}).items():
+                key = _normalize(canonical)
+                for phrase in phrases:
+                    if key in postings:
+                        self._canonical[column].setdefault(_normalize(phrase), canonical)
+        self._name_positions = {name: position for position, name in enumerate(self.df[NAME_COLUMN])} if NAME_COLUMN in self.df else {}
+        self._phrase_patterns = {
+            column: re.compile(rf"\b({_alternation(phrases)})\b") for column, phrases in self._canonical.items() if phrases
+        }
+
+    def refreshed(self, df):
+        """Retriever for a new version of the dataset, reusing the inverted indexes if names and indexed values are unchanged"""
+        df = df.reset_index(drop=True)
+        keys = [column for column in (NAME_COLUMN, *self._index) if column in df]
+        if list(df.columns) != list(self.df.columns) or not df[keys].equals(self.df[keys]):
+            return DatasetRetriever(df)
+        retriever = copy.copy(self)
+        retriever.df = df
+        retriever._numeric = _numeric_columns(df)
+        return retriever
+
+    def parse(self, query):
+        """Identify indexed values, numeric filters and the sort order a question asks for"""
+        normalized = _normalize(query)
+        values = {}
+        for column, pattern in self._phrase_patterns.items():
+            found = {self._canonical[column][phrase] for phrase in pattern.findall(normalized)}
+            if found:
+                values[column] = sorted(found)
+        filters = parse_numeric_filters(query)
+        sort_match = SORT_PATTERN.search(query)
+        if sort_match:
+            sort_column = METRIC_LOOKUP[sort_match.group("metric").lower()]
+        elif filters:
+            sort_column = filters[0].column
+        else:
+            sort_column = "Revenue (USD)"
+        # Conditions are left out: "at least 15" asks for a floor, not the lowest values
+        ascending = bool(ASCENDING_WORDS.search(FILTER_PATTERN.sub(" ", query).lower()))
+        # Lower is better for leverage and the cash cycle unless the question says otherwise
+        if sort_column in ("Debt-to-Equity", "Cash Conversion Cycle (days)") and not re.search(r"\b(highest|most)\b", query.lower()):
+            ascending = True
+        return ParsedQuery(values, filters, sort_column, ascending)
+
+    def without_values(self, query):
+        """query normalized, with the indexed values it mentions (countries, subsectors, investors) blanked out"""
+        normalized = _normalize(query)
+        for pattern in self._phrase_patterns.values():
+            normalized = pattern.sub(" ", normalized)
+        return normalized
+
+    def numeric(self, column):
+        """Float values of a metric column by row position, or None if the dataset lacks it"""
+        return self._numeric.get(column)
+
+    def filter_mask(self, filters):
+        """Boolean mask of rows passing every numeric filter"""
+        mask = np.ones(len(self.df), dtype=bool)
+        for numeric_filter in filters:
+            column = self._numeric.get(numeric_filter.column)
+            if column is None:
+                continue
+            with np.errstate(invalid="ignore"):
+                if numeric_filter.op == "between":
+                    low, high = numeric_filter.value
+                    mask &= (column >= low) & (column <= high)
+                elif numeric_filter.op == ">":
+                    mask &= column > numeric_filter.value
+                elif numeric_filter.op == ">=":
+                    mask &= column >= numeric_filter.value
+                elif numeric_filter.op == "<":
+                    mask &= column < numeric_filter.value
+                elif numeric_filter.op == "<=":
+                    mask &= column <= numeric_filter.value
+        return mask
+
+    def match_scores(self, parsed):
+        """Per-row count of indexed dimensions (country, subsector, investor) matching the question"""
+        scores = np.zeros(len(self.df), dtype=np.int32)
+        for column, values in parsed.values.items():
+            hits = np.zeros(len(self.df), dtype=bool)
+            for value in values:
+                hits[self._index[column][_normalize(value)]] = True
+            scores += hits
+        return scores
+
+    def search(self, query, k=10, related=None):
+        """Return the k rows most relevant to query as a DataFrame
+
+        related are row positions matching the question's meaning (e.g. from the
+        semantic index); they count as one more dimension the question asks about.
+        """
+        parsed = self.parse(query)
+        scores = self.match_scores(parsed)
+        mask = self.filter_mask(parsed.filters)
+        # Keep rows matching every dimension asked about; relax to partial matches if none do
+        wanted = len(parsed.values)
+        if related is not None and len(related):
+            scores[related] += 1
+            wanted += 1
+        candidates = mask & (scores == wanted) if wanted else mask
+        if not candidates.any():
+            candidates = mask & (scores > 0) if wanted else mask
+        if not candidates.any():
+            candidates = scores > 0 if wanted else np.ones(len(self.df), dtype=bool)
+
+        positions = np.flatnonzero(candidates)
+        sort_values = self._numeric.get(parsed.sort_column)
+        if sort_values is not None:
+            keys = sort_values[positions]
+            keys = np.where(np.isnan(keys), np.inf if parsed.ascending else -np.inf, keys)
+            order = np.lexsort((keys if parsed.ascending else -keys, -scores[positions]))
+            positions = positions[order]
+        return self.df.iloc[positions[:k]]
+
+    def rows_for(self, names):
+        """Rows for the given company names in that order, skipping names not in the dataset"""
+        positions = [self._name_positions[name] for name in names if name in self._name_positions]
+        return self.df.iloc[positions]
@@ -0,0 +1,139 @@
+"""Local intent router for follow-up questions"""
+import logging
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from embeddings import embed_text, embed_texts
+from tracing import loggable_query
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ("SEARCH_WEB", "ANALYZE_DATA", "SEARCH_AND_ANALYZE", "GENERAL_RESPONSE")
+
+# Below this the classifier defers to the LLM
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.55"))
+
+# Which stage decided, how sure it was
+RouteDecision = namedtuple("RouteDecision", ["route", "stage", "confidence"])
+
+# Stage 1: keyword rules, mirroring the keywords listed in the LLM routing prompt
+ROUTE_PATTERNS = {
+    "SEARCH_AND_ANALYZE": re.compile(
+        r"\b(compar\w*|global|industry averages?|benchmarks?|market averages?|versus|vs\.?|"
+        r"external comparison|ebitda margins?|profit margins?|industry standards?|typical ranges?|peers?)\b",
+        re.IGNORECASE
+    ),
+    "SEARCH_WEB": re.compile(
+        r"\b(articles?|news|headlines?|web search|search the web|search online|latest|recent developments|"
+        r"press|sources?|links?|read more)\b",
+        re.IGNORECASE
+    ),
+    "ANALYZE_DATA": re.compile(
+        r"\b(dataset|our data|internal data|the data|in the data|these companies|those companies|"
+        r"(which|what) compan(y|ies)|previous (response|answer)|you mentioned|from (the|your) (list|answer|response)|"
+        r"co \d+|revenue|roe|roa|debt[- ]to[- ]equity|current ratio|quick ratio|cash conversion|"
+        r"inventory turnover|asset turnover|growth rate|investors?|top \d+|rank\w*|highest|lowest)\b",
+        re.IGNORECASE
+    ),
+    # Definitions and explanations that do not point back at the data
+    "GENERAL_RESPONSE": re.compile(
+        r"^\s*(what is|what's|what does|explain|define|definition of|meaning of)\b"
+        r"(?!.*\b(these|those|our|their|dataset|compan(y|ies))\b)",
+        re.IGNORECASE
+    ),
+}
+
+# Stage 2: labelled examples for the nearest-centroid classifier
+TRAINING_EXAMPLES = {
+    "SEARCH_WEB": [
+        "show me more articles on this",
+        "any recent news about saudi logistics",
+        "find the latest reports on last mile delivery in the gulf",
+        "what is happening in the market right now",
+        "search for updates on port expansions",
+        "give me further reading on warehouse automation",
+    ],
+    "ANALYZE_DATA": [
+        "tell me more about the second company",
+        "which of these has the best balance sheet",
+        "what do we know about the freight operators in oman",
+        "break down the cold chain players in the dataset",
+        "which companies are backed by sequoia",
+        "summarize the financials of the companies you listed",
+        "how leveraged is the egyptian portfolio",
+    ],
+    "SEARCH_AND_ANALYZE": [
+        "how do these margins stack up against the industry",
+        "is this profitability good relative to international players",
+        "compare our companies to global logistics leaders",
+        "are these returns above the sector norm",
+        "how does this compare with dhl and aramex",
+        "what is a healthy margin for logistics and do ours meet it",
+    ],
+    "GENERAL_RESPONSE": [
+        "what is a cash conversion cycle",
+        "explain how private equity values logistics businesses",
+        "thanks that is helpful",
+        "what should i consider before investing in a startup",
+        "define working capital",
+        "how does pif make investment decisions",
+        "can you rephrase that more concisely",
+    ],
+}
+
+_centroids = None
+
+
+def _rule_scores(query):
+    return {route: len(pattern.findall(query)) for route, pattern in ROUTE_PATTERNS.items()}
+
+
+def _route_by_rules(query):
+    """Decide from keywords when exactly one route is clearly indicated"""
+    scores = _rule_scores(query)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (top_route, top_score), (_, runner_up) = ranked[0], ranked[1]
+    if top_score == 0:
+        return None
+    # Benchmark keywords win over plain data/web mentions, as in the LLM prompt
+    if scores["SEARCH_AND_ANALYZE"] > 0:
+        return RouteDecision("SEARCH_AND_ANALYZE", "rules", 1.0)
+    if top_score >= 2 * runner_up:
+        return RouteDecision(top_route, "rules", top_score / (top_score + runner_up))
+    return None
+
+
+def _get_centroids():
+    global _centroids
+    if _centroids is None:
+        centroids = np.vstack([embed_texts(TRAINING_EXAMPLES[route]).mean(axis=0) for route in ROUTES])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        _centroids = centroids / np.where(norms == 0, 1, norms)
+    return _centroids
+
+
+def _route_by_classifier(query):
+    """Nearest-centroid classification; confidence is the softmax probability of the winner"""
+    similarities = _get_centroids() @ embed_text(query)
+    weights = np.exp((similarities - similarities.max()) * 10)
+    probabilities = weights / weights.sum()
+    best = int(np.argmax(probabilities))
+    # Queries resembling none of the examples are not worth trusting
+    if similarities[best] <= 0.05:
+        return RouteDecision(ROUTES[best], "classifier", 0.0)
+    return RouteDecision(ROUTES[best], "classifier", float(probabilities[best]))
+
+
+def route_query(query, llm_fallback=None, min_confidence=ROUTER_MIN_CONFIDENCE):
+    """Pick the follow-up route for query, asking llm_fallback(query) only when unsure"""
+    decision = _route_by_rules(query)
+    if decision is None:
+        decision = _route_by_classifier(query)
+        if decision.confidence < min_confidence and llm_fallback is not None:
+            label = llm_fallback(query).strip().upper()
+            decision = RouteDecision(label if label in ROUTES else "GENERAL_RESPONSE", "llm", decision.confidence)
+    logger.info("Routed %s to %s via %s (confidence %.2f)", loggable_query(query), decision.route, decision.stage, decision.confidence)
+    return decision
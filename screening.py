@@ -0,0 +1,143 @@
+"""Vectorized screening engine with precomputed per-segment aggregates"""
+import copy
+import itertools
+
+import pandas as pd
+
+from retrieval import METRIC_ALIASES, to_numeric
+
+KEY_COLUMN = "Company Name"
+DIMENSIONS = ("Country", "Subsector", "Investors")
+STATS = ("count", "mean", "median", "p25", "p75", "min", "max")
+
+# Metrics quoted in prompts unless the question names others
+DEFAULT_METRICS = (
+    "EBITDA Margin (%)",
+    "Net Profit Margin (%)",
+    "ROE (%)",
+    "Debt-to-Equity",
+    "Cash Conversion Cycle (days)",
+    "Growth Rate",
+)
+
+# Every subset of the dimensions, from the full Country x Subsector x Investors cube down to all companies
+GROUPINGS = tuple(keys for size in range(len(DIMENSIONS), -1, -1) for keys in itertools.combinations(DIMENSIONS, size))
+
+
+def _prepare(df):
+    """Company-indexed frame of dimensions (missing -> "Unknown") and float metrics"""
+    frame = pd.DataFrame(index=pd.Index(df[KEY_COLUMN].astype(str), name=KEY_COLUMN))
+    for column in DIMENSIONS:
+        frame[column] = df[column].astype(object).where(df[column].notna(), "Unknown").astype(str).to_numpy()
+    for column in METRIC_ALIASES:
+        if column in df:
+            frame[column] = to_numeric(df[column]).to_numpy(dtype=float)
+    return frame[~frame.index.duplicated(keep="last")]
+
+
+def _aggregate(frame, keys, metrics):
+    """Aggregate metrics per group of keys; one row labelled "All" when keys is empty"""
+    if keys:
+        grouped = frame.groupby(list(keys), sort=True)[list(metrics)]
+        stats = grouped.agg(["count", "mean", "median", "min", "max"])
+        quantiles = grouped.quantile([0.25, 0.75]).unstack(level=-1)
+    else:
+        values = frame[list(metrics)]
+        stats = values.agg(["count", "mean", "median", "min", "max"]).unstack().to_frame("All").T
+        quantiles = values.quantile([0.25, 0.75]).unstack().to_frame("All").T
+    quantiles.columns = pd.MultiIndex.from_tuples(
+        [(metric, "p25" if q == 0.25 else "p75") for metric, q in quantiles.columns]
+    )
+    table = stats.join(quantiles)
+    return table.reindex(columns=pd.MultiIndex.from_product([metrics, STATS]))
+
+
+def _key_index(frame, keys):
+    """Group keys of every row as a MultiIndex"""
+    return pd.MultiIndex.from_frame(frame[list(keys)])
+
+
+def _segment_keys(frame, keys):
+    """Set of group keys present in frame, as tuples"""
+    return set(_key_index(frame, keys).unique())
+
+
+def _updated_tables(tables, old, new, metrics):
+    """Copy of tables with the segments holding added, removed or changed rows recomputed from new"""
+    removed = old.index.difference(new.index)
+    added = new.index.difference(old.index)
+    common = old.index.intersection(new.index)
+    old_common, new_common = old.loc[common], new.loc[common, old.columns]
+    differs = (old_common != new_common) & ~(old_common.isna() & new_common.isna())
+    changed = common[differs.any(axis=1).to_numpy()]
+    if removed.empty and added.empty and changed.empty:
+        return tables
+
+    before = old.loc[removed.union(changed)]
+    after = new.loc[added.union(changed)]
+    updated = {}
+    for keys in GROUPINGS:
+        if not keys:
+            updated[keys] = _aggregate(new, keys, metrics)
+            continue
+        affected = list(_segment_keys(before, keys) | _segment_keys(after, keys))
+        recomputed = _aggregate(new[_key_index(new, keys).isin(affected)], keys, metrics)
+        table = tables[keys]
+        table_keys = table.index if len(keys) > 1 else pd.MultiIndex.from_arrays([table.index])
+        updated[keys] = pd.concat([table[~table_keys.isin(affected)], recomputed]).sort_index()
+    return updated
+
+
+class ScreeningEngine:
+    """Exact statistics per segment; refreshed() derives the engine for a new version of the dataset incrementally
+
+    An engine never changes once built, so a request can keep using the one it
+    started with while the dataset is reloaded underneath it.
+    """
+
+    def __init__(self, df, version=None):
+        self.version = version
+        self._frame = _prepare(df)
+        self.metrics = tuple(column for column in METRIC_ALIASES if column in self._frame)
+        self.tables = {keys: _aggregate(self._frame, keys, self.metrics) for keys in GROUPINGS}
+
+    def refreshed(self, df, version=None):
+        """Engine for a new version of the dataset, recomputing only segments whose rows changed"""
+        new = _prepare(df)
+        metrics = tuple(column for column in METRIC_ALIASES if column in new)
+        if metrics != self.metrics:
+            return ScreeningEngine(df, version)
+        engine = copy.copy(self)
+        engine.version = version
+        engine._frame = new
+        engine.tables = _updated_tables(self.tables, self._frame, new, metrics)
+        return engine
+
+    def segment_stats(self, values):
+        """Aggregates for the segments selected by {dimension: [values]}, plus all companies"""
+        keys = tuple(column for column in DIMENSIONS if values.get(column))
+        table = self.tables[keys]
+        wanted = list(itertools.product(*(values[column] for column in keys)))
+        if len(keys) == 1:
+            wanted = [key[0] for key in wanted]
+        selected = table[table.index.isin(wanted)] if keys else table.iloc[0:0]
+        return selected, self.tables[()]
+
+    def describe(self, values, metrics=None):
+        """Plain-text segment statistics for a prompt"""
+        metrics = [m for m in (metrics or DEFAULT_METRICS) if m in self.metrics]
+        keys = tuple(column for column in DIMENSIONS if values.get(column))
+        selected, overall = self.segment_stats(values)
+        lines = []
+        for label, row in list(selected.iterrows()) + [("All companies", overall.iloc[0])]:
+            if label != "All companies":
+                parts = label if isinstance(label, tuple) else (label,)
+                label = ", ".join(f"{column}={part}" for column, part in zip(keys, parts))
+            count = int(max(row[(metric, "count")] for metric in metrics)) if metrics else 0
+            figures = "; ".join(
+                f"{metric}: mean {row[(metric, 'mean')]:.2f}, median {row[(metric, 'median')]:.2f}, "
+                f"p25 {row[(metric, 'p25')]:.2f}, p75 {row[(metric, 'p75')]:.2f}"
+                for metric in metrics if row[(metric, "count")] > 0
+            )
+            lines.append(f"- {label} (n={count}): {figures}")
+        return "\n".join(lines)
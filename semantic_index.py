@@ -0,0 +1,197 @@
+"""Local vector index over the dataset's descriptive text, memory-mapped from the cache directory"""
+import copy
+import json
+import logging
+import os
+import zlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from embeddings import embed_text, embed_texts
+from storage import cache_path
+
+logger = logging.getLogger(__name__)
+
+# Text columns embedded per company; a company scores as its best-matching column
+SEMANTIC_COLUMNS = ("Notes", "Subsector", "Investors")
+
+# Wider than the router's embeddings so short notes collide less in the hashed features
+SEMANTIC_INDEX_DIM = int(os.getenv("SEMANTIC_INDEX_DIM", "1536"))
+
+# Cosine similarity a company's text needs to count as matching a question
+SEMANTIC_MIN_SCORE = float(os.getenv("SEMANTIC_MIN_SCORE", "0.15"))
+# ...and at least this fraction of the best match's score, so a strong match drowns out weak ones
+SEMANTIC_RELATIVE_SCORE = float(os.getenv("SEMANTIC_RELATIVE_SCORE", "0.5"))
+
+# Above this many vectors, searches probe the nearest clusters instead of scanning them all
+SEMANTIC_ANN_THRESHOLD = int(os.getenv("SEMANTIC_ANN_THRESHOLD", "20000"))
+SEMANTIC_ANN_PROBES = int(os.getenv("SEMANTIC_ANN_PROBES", "8"))
+
+INDEX_NAME = "semantic_index"
+
+# Companies matching a question best first, their scores and the text columns that matched
+SemanticMatches = namedtuple("SemanticMatches", ["positions", "scores", "columns"])
+
+# One immutable generation of the index; searches read it without locking
+_IndexState = namedtuple("_IndexState", ["texts", "vectors", "columns", "slots", "clusters"])
+
+_NO_MATCHES = SemanticMatches(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), ())
+
+
+def _digest(texts, dim):
+    return f"{zlib.crc32(json.dumps([dim, texts]).encode('utf-8')):08x}"
+
+
+def _build_clusters(vectors, iterations=8):
+    """Spherical k-means over the vectors: (centroids, vector ids grouped by cluster, cluster bounds)"""
+    count = max(1, int(np.sqrt(len(vectors))))
+    rng = np.random.default_rng(0)
+    centroids = np.array(vectors[rng.choice(len(vectors), count, replace=False)])
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # An empty cluster keeps its previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    order = np.argsort(assignment, kind="stable")
+    bounds = np.searchsorted(assignment[order], np.arange(count + 1))
+    return centroids, order, bounds
+
+
+class SemanticIndex:
+    """Embeddings of each distinct text in SEMANTIC_COLUMNS, with brute-force or clustered top-k search
+
+    Vectors live in a float32 file in the cache directory and are memory-mapped;
+    refreshed() returns a new index for a new version of the dataset and
+    re-embeds only texts the previous one did not have, so an edited row costs
+    one embedding rather than a rebuild. An index never changes once built:
+    its row positions always refer to the df it was refreshed with.
+    """
+
+    def __init__(self, dim=SEMANTIC_INDEX_DIM, name=INDEX_NAME):
+        self.dim = dim
+        self.name = name
+        self.version = None
+        self._state = None
+
+    def refreshed(self, df, version=None):
+        """Index over df, embedding only texts this index (or the one left in the cache directory) lacks"""
+        columns = [column for column in SEMANTIC_COLUMNS if column in df]
+        previous = self._state or self._load()
+        slot_of = {text: slot for slot, text in enumerate(previous.texts)} if previous else {}
+        # Per cell, the position of its text among the distinct texts; -1 for empty cells
+        codes, distinct = [], []
+        for column in columns:
+            column_codes, uniques = pd.factorize(df[column].astype("string").str.strip().replace("", pd.NA))
+            codes.append(column_codes)
+            distinct.append(list(uniques))
+        texts = list(dict.fromkeys(text for uniques in distinct for text in uniques))
+        # Keep the previous order for texts still in use so their vectors are copied as one block
+        needed = set(texts)
+        kept = [text for text in previous.texts if text in needed] if previous else []
+        texts = kept + [text for text in texts if text not in slot_of]
+        position = {text: slot for slot, text in enumerate(texts)}
+        slots = np.full((len(df), len(columns)), -1, dtype=np.int32)
+        for i, (column_codes, uniques) in enumerate(zip(codes, distinct)):
+            lookup = np.array([position[text] for text in uniques] + [-1], dtype=np.int32)
+            slots[:, i] = lookup[column_codes]
+
+        if previous is not None and texts == previous.texts:
+            vectors, clusters = previous.vectors, previous.clusters
+        else:
+            vectors, clusters = self._build(texts, previous, slot_of), None
+        if clusters is None and len(vectors) > SEMANTIC_ANN_THRESHOLD:
+            clusters = _build_clusters(vectors)
+        index = copy.copy(self)
+        index._state = _IndexState(texts, vectors, tuple(columns), slots, clusters)
+        index.version = version
+        return index
+
+    def _build(self, texts, previous, slot_of):
+        """Vectors for texts, copying those previous already had and embedding the rest"""
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        new = [i for i, text in enumerate(texts) if text not in slot_of]
+        reused = [i for i, text in enumerate(texts) if text in slot_of]
+        if reused:
+            vectors[reused] = previous.vectors[[slot_of[texts[i]] for i in reused]]
+        if new:
+            vectors[new] = embed_texts([texts[i] for i in new], self.dim)
+        logger.info("Semantic index: %d texts, %d embedded, %d reused", len(texts), len(new), len(reused))
+        try:
+            return self._save(texts, vectors)
+        except OSError:
+            logger.warning("Could not write semantic index to the cache directory", exc_info=True)
+            return vectors
+
+    def _paths(self, digest):
+        return cache_path(f"{self.name}.json"), cache_path(f"{self.name}.{digest}.f32")
+
+    def _save(self, texts, vectors):
+        """Write vectors under a content-named file, point the metadata at it and memory-map it back"""
+        digest = _digest(texts, self.dim)
+        meta_path, vectors_path = self._paths(digest)
+        if not texts:
+            return vectors
+        temporary = f"{vectors_path}.{os.getpid()}.tmp"
+        vectors.tofile(temporary)
+        os.replace(temporary, vectors_path)
+        temporary = f"{meta_path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "digest": digest, "texts": texts}, f, ensure_ascii=False)
+        # The metadata is swapped last so it never names a vectors file that is not complete
+        os.replace(temporary, meta_path)
+        for stale in os.listdir(os.path.dirname(vectors_path)):
+            if stale.startswith(f"{self.name}.") and stale.endswith(".f32") and stale != os.path.basename(vectors_path):
+                try:
+                    os.remove(os.path.join(os.path.dirname(vectors_path), stale))
+                except OSError:
+                    pass
+        return np.memmap(vectors_path, dtype=np.float32, mode="r", shape=vectors.shape)
+
+    def _load(self):
+        """The index another run left in the cache directory, or None"""
+        meta_path, _ = self._paths("")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            texts = meta["texts"]
+            if meta["dim"] != self.dim or meta["digest"] != _digest(texts, self.dim):
+                return None
+            _, vectors_path = self._paths(meta["digest"])
+            vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(len(texts), self.dim))
+        except (OSError, ValueError, KeyError):
+            return None
+        return _IndexState(texts, vectors, (), None, None)
+
+    def _text_scores(self, state, query_vector):
+        """Similarity of every indexed text to the query; texts outside the probed clusters score 0"""
+        if state.clusters is None:
+            return state.vectors @ query_vector
+        centroids, order, bounds = state.clusters
+        probes = min(SEMANTIC_ANN_PROBES, len(centroids))
+        nearest = np.argpartition(-(centroids @ query_vector), probes - 1)[:probes]
+        candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in nearest])
+        scores = np.zeros(len(state.texts), dtype=np.float32)
+        scores[candidates] = state.vectors[candidates] @ query_vector
+        return scores
+
+    def search(self, query, k=None, min_score=SEMANTIC_MIN_SCORE):
+        """Companies whose text matches query (all of them, or the best k), as row positions in the refreshed df"""
+        state = self._state
+        if state is None or not state.texts or not state.slots.size:
+            return _NO_MATCHES
+        text_scores = self._text_scores(state, embed_text(query, self.dim))
+        # Empty cells (slot -1) read the trailing 0
+        cell_scores = np.append(text_scores, np.float32(0))[state.slots]
+        row_scores = cell_scores.max(axis=1)
+        min_score = max(min_score, float(row_scores.max(initial=0)) * SEMANTIC_RELATIVE_SCORE)
+        positions = np.flatnonzero(row_scores >= min_score)
+        if k is not None and len(positions) > k:
+            positions = positions[np.argpartition(-row_scores[positions], k - 1)[:k]]
+        positions = positions[np.argsort(-row_scores[positions], kind="stable")]
+        matched = (cell_scores[positions] >= min_score).any(axis=0)
+        columns = tuple(column for column, hit in zip(state.columns, matched) if hit)
+        return SemanticMatches(positions, row_scores[positions], columns)
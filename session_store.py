@@ -0,0 +1,208 @@
+"""Durable chat sessions shared by every worker, with a small in-memory working set"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from storage import cache_path
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "sqlite")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH") or None
+
+# Transcripts kept in memory: at most this many, and only while used within the idle window
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "256"))
+SESSION_CACHE_MAX_IDLE = float(os.getenv("SESSION_CACHE_MAX_IDLE", str(30 * 60)))
+
+# Only these keys are persisted; anything else on a message (e.g. rendered HTML) is derived
+MESSAGE_FIELDS = ("role", "content")
+
+# Sidebar entry: no message bodies
+SessionSummary = namedtuple("SessionSummary", ["session_id", "title", "created_at", "updated_at"])
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class SessionStore:
+    """Interface for chat session backends; sessions belong to an owner and only grow"""
+
+    def create_session(self, owner, title):
+        """Create an empty session and return its id"""
+        raise NotImplementedError
+
+    def list_sessions(self, owner, limit=50):
+        """Most recently updated sessions of owner as SessionSummary, without messages"""
+        raise NotImplementedError
+
+    def get_session(self, owner, session_id):
+        """SessionSummary for session_id if it belongs to owner, else None"""
+        raise NotImplementedError
+
+    def load_messages(self, session_id):
+        """Messages of a session in order, as a new list"""
+        raise NotImplementedError
+
+    def append_message(self, session_id, message):
+        """Append one message to the end of a session"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local backend for development and tests; nothing survives a restart"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, owner, title):
+        session_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = (owner, SessionSummary(session_id, title, now, now))
+            self._messages[session_id] = []
+        return session_id
+
+    def list_sessions(self, owner, limit=50):
+        with self._lock:
+            summaries = [summary for session_owner, summary in self._sessions.values() if session_owner == owner]
+        return sorted(summaries, key=lambda summary: summary.updated_at, reverse=True)[:limit]
+
+    def get_session(self, owner, session_id):
+        with self._lock:
+            session_owner, summary = self._sessions.get(session_id, (None, None))
+        return summary if session_owner == owner else None
+
+    def load_messages(self, session_id):
+        with self._lock:
+            return [dict(message) for message in self._messages.get(session_id, [])]
+
+    def append_message(self, session_id, message):
+        with self._lock:
+            owner, summary = self._sessions[session_id]
+            self._messages[session_id].append({field: message[field] for field in MESSAGE_FIELDS})
+            self._sessions[session_id] = (owner, summary._replace(updated_at=time.time()))
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite backend in WAL mode; messages are insert-only rows keyed by (session, position)
+
+    Recently used transcripts are kept in memory so switching back and forth
+    between chats does not re-read them; idle ones are dropped.
+    """
+
+    def __init__(self, path, max_cached=SESSION_CACHE_MAX_ENTRIES, max_idle=SESSION_CACHE_MAX_IDLE):
+        self.max_cached = max_cached
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        # session_id -> (messages, last used)
+        self._cached = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, owner TEXT NOT NULL, title TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_owner ON sessions (owner, updated_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, position INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (session_id, position)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def create_session(self, owner, title):
+        session_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, owner, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, owner, title, now, now)
+            )
+            self._conn.commit()
+            self._remember(session_id, [], now)
+        return session_id
+
+    def list_sessions(self, owner, limit=50):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, title, created_at, updated_at FROM sessions "
+                "WHERE owner = ? ORDER BY updated_at DESC LIMIT ?",
+                (owner, limit)
+            ).fetchall()
+        return [SessionSummary(*row) for row in rows]
+
+    def get_session(self, owner, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, title, created_at, updated_at FROM sessions WHERE session_id = ? AND owner = ?",
+                (session_id, owner)
+            ).fetchone()
+        return SessionSummary(*row) if row else None
+
+    def load_messages(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            entry = self._cached.get(session_id)
+            if entry is None:
+                rows = self._conn.execute(
+                    "SELECT role, content FROM messages WHERE session_id = ? ORDER BY position", (session_id,)
+                ).fetchall()
+                messages = [dict(zip(MESSAGE_FIELDS, row)) for row in rows]
+            else:
+                messages = entry[0]
+            self._remember(session_id, messages, now)
+            return [dict(message) for message in messages]
+
+    def append_message(self, session_id, message):
+        now = time.time()
+        record = {field: message[field] for field in MESSAGE_FIELDS}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, position, role, content, created_at) "
+                "SELECT ?, COALESCE(MAX(position) + 1, 0), ?, ?, ? FROM messages WHERE session_id = ?",
+                (session_id, record["role"], record["content"], now, session_id)
+            )
+            self._conn.execute("UPDATE sessions SET updated_at = ? WHERE session_id = ?", (now, session_id))
+            self._conn.commit()
+            entry = self._cached.get(session_id)
+            if entry is not None:
+                entry[0].append(record)
+                self._remember(session_id, entry[0], now)
+
+    def _remember(self, session_id, messages, now):
+        self._cached[session_id] = (messages, now)
+        self._cached.move_to_end(session_id)
+        self._evict(now)
+
+    def _evict(self, now):
+        # Least recently used first, so stop at the first entry that is neither idle nor over the limit
+        while self._cached:
+            session_id, (_, used_at) = next(iter(self._cached.items()))
+            if len(self._cached) <= self.max_cached and now - used_at < self.max_idle:
+                break
+            del self._cached[session_id]
+
+
+# Backend name (SESSION_STORE_BACKEND) -> factory
+BACKENDS = {
+    "sqlite": lambda: SQLiteSessionStore(SESSION_STORE_PATH or cache_path("sessions.sqlite3")),
+    "memory": MemorySessionStore,
+}
+
+
+def get_session_store():
+    """Return the process-wide session store for SESSION_STORE_BACKEND"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown session store backend {SESSION_STORE_BACKEND!r}; expected one of {sorted(BACKENDS)}")
+                _store = BACKENDS[SESSION_STORE_BACKEND]()
+    return _store
@@ -0,0 +1,10 @@
+"""Location of on-disk caches shared by every session in the process"""
+import os
+
+CACHE_DIR = os.getenv("PIF_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def cache_path(name):
+    """Return the path of a file inside the cache directory, creating the directory"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
@@ -1,46 +1,89 @@
 import streamlit as st
-import requests
+import streamlit.components.v1 as components
 import os
-import pandas as pd
-import openai
-import re
 from dotenv import load_dotenv
+import time
 import uuid
 from datetime import datetime
+from agent import get_dataset, stream_ai_response, summarize_conversation, validate_responsible_ai
+from dataset_manager import get_dataset_manager
+from context_window import ConversationContext
+from prompt_builder import token_report
+from query_engine import path_counts
+from rendering import StreamingHtmlRenderer, assistant_message_html, message_html, transcript_page
+from response_cache import get_response_cache
+from session_store import get_session_store
+from tokens import counts_are_exact
+from tracing import observe, span, stage_latencies
+from upstream import queue_depths
 
 # Load API keys
 load_dotenv(override=True)
-openai.api_key = os.getenv("OPENAI_API_KEY")
+openai_key = os.getenv("OPENAI_API_KEY")
 perplexity_key = os.getenv("PERPLEXITY_API_KEY")
 
 # Simple validation
 if not perplexity_key:
     st.error("❌ Perplexity API key not found in environment variables")
     st.stop()
-if not openai.api_key:
+if not openai_key:
     st.error("❌ OpenAI API key not found in environment variables")
     st.stop()
 
-# Load CSV data
-@st.cache_data
-def load_data():
-    return pd.read_csv("investable_logistics_companies_mena.csv")
+# Messages shown before older turns are paged out behind a button
+TRANSCRIPT_PAGE_SIZE = int(os.getenv("TRANSCRIPT_PAGE_SIZE", "20"))
 
-df = load_data()
+# Chats listed in the sidebar, most recently used first
+SIDEBAR_SESSION_LIMIT = int(os.getenv("SIDEBAR_SESSION_LIMIT", "50"))
+
+# Minimum seconds between redraws of a streaming answer
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.05"))
+
+# Cookie that remembers an anonymous analyst's id in this browser when Streamlit auth is not configured
+ANALYST_COOKIE = os.getenv("ANALYST_COOKIE", "pif_analyst")
+ANALYST_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+# Load the dataset and build its indexes before the first question (shared by all sessions)
+get_dataset()
+
+def current_analyst_id():
+    """Owner of the chats: the signed-in Streamlit user, else the id this browser's cookie holds, else a new one
+
+    Never taken from the URL, so a shared chat link does not hand over its owner's chats.
+    """
+    if st.user.get("is_logged_in"):
+        return f"user:{st.user.get('email') or st.user.get('sub')}"
+    return st.context.cookies.get(ANALYST_COOKIE) or uuid.uuid4().hex
 
 # Initialize session state
-if "chat_sessions" not in st.session_state:
-    st.session_state.chat_sessions = {}
+if "analyst_id" not in st.session_state:
+    st.session_state.analyst_id = current_analyst_id()
+# Links from before chats were owned by the cookie carried the owner id
+st.query_params.pop("analyst", None)
 if "current_session_id" not in st.session_state:
     st.session_state.current_session_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "first_message_sent" not in st.session_state:
     st.session_state.first_message_sent = False
+if "visible_message_count" not in st.session_state:
+    st.session_state.visible_message_count = TRANSCRIPT_PAGE_SIZE
+if "conversation_context" not in st.session_state:
+    st.session_state.conversation_context = None
 
 # Page config
 st.set_page_config(page_title="PIF Investment Agent", layout="wide")
 
+# Remember an anonymous analyst in this browser so a reload finds the same chats
+if not st.user.get("is_logged_in") and st.context.cookies.get(ANALYST_COOKIE) != st.session_state.analyst_id:
+    components.html(
+        f"""<script>
+        window.parent.document.cookie = "{ANALYST_COOKIE}={st.session_state.analyst_id}; Max-Age={ANALYST_COOKIE_MAX_AGE}; Path=/; SameSite=Strict"
+            + (window.parent.location.protocol === "https:" ? "; Secure" : "");
+        </script>""",
+        height=0
+    )
+
 # Enhanced CSS Styling with PIF branding
 st.markdown("""
     <style>
@@ -438,389 +481,41 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def create_new_chat():
-    """Create a new chat session"""
-    session_id = str(uuid.uuid4())
-    st.session_state.chat_sessions[session_id] = {
-        "title": "New Chat",
-        "messages": [],
-        "created_at": datetime.now()
-    }
-    st.session_state.current_session_id = session_id
+    """Start a new chat; it is stored once its first message is sent"""
+    st.session_state.current_session_id = None
     st.session_state.messages = []
     st.session_state.first_message_sent = False
-    st.rerun()
+    st.session_state.visible_message_count = TRANSCRIPT_PAGE_SIZE
+    st.session_state.conversation_context = ConversationContext(summarize_conversation)
+    st.query_params.pop("chat", None)
 
 def load_chat_session(session_id):
-    """Load an existing chat session"""
-    if session_id in st.session_state.chat_sessions:
-        st.session_state.current_session_id = session_id
-        st.session_state.messages = st.session_state.chat_sessions[session_id]["messages"]
-        st.session_state.first_message_sent = len(st.session_state.messages) > 0
-        st.rerun()
+    """Load an existing chat session of the current analyst, returning False if there is none"""
+    store = get_session_store()
+    if store.get_session(st.session_state.analyst_id, session_id) is None:
+        return False
+    st.session_state.current_session_id = session_id
+    st.session_state.messages = store.load_messages(session_id)
+    st.session_state.first_message_sent = len(st.session_state.messages) > 0
+    st.session_state.visible_message_count = TRANSCRIPT_PAGE_SIZE
+    st.session_state.conversation_context = ConversationContext(summarize_conversation)
+    st.query_params["chat"] = session_id
+    return True
 
-def save_current_session():
-    """Save current messages to the session"""
-    if st.session_state.current_session_id and st.session_state.current_session_id in st.session_state.chat_sessions:
-        st.session_state.chat_sessions[st.session_state.current_session_id]["messages"] = st.session_state.messages
-        # Update title based on first message
-        if st.session_state.messages and st.session_state.chat_sessions[st.session_state.current_session_id]["title"] == "New Chat":
-            first_message = st.session_state.messages[0]["content"]
-            st.session_state.chat_sessions[st.session_state.current_session_id]["title"] = first_message[:40] + "..." if len(first_message) > 40 else first_message
+def save_message(message):
+    """Append a message to the current chat, creating the chat with its first message as title"""
+    store = get_session_store()
+    if st.session_state.current_session_id is None:
+        content = message["content"]
+        title = content[:40] + "..." if len(content) > 40 else content
+        st.session_state.current_session_id = store.create_session(st.session_state.analyst_id, title)
+        st.query_params["chat"] = st.session_state.current_session_id
+    store.append_message(st.session_state.current_session_id, message)
 
-def fetch_perplexity_articles(query):
-    """Fetch articles from Perplexity API"""
-    try:
-        headers = {
-            "Authorization": f"Bearer {perplexity_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": "sonar-pro",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"Search for 5 recent relevant articles about: {query}. For each article, provide the actual article title and working URL in this exact format: [Article Title](https://actual-working-url.com). Return only clickable links, one per line. Make sure to include 5 different articles with meaningful titles."
-                }
-            ],
-            "search_mode": "web"
-        }
-        
-        response = requests.post("https://api.perplexity.ai/chat/completions", headers=headers, json=payload)
-        
-        if response.status_code == 401:
-            return "• Authentication failed - please check your Perplexity API key"
-        elif response.status_code != 200:
-            return f"• Error fetching articles (Status {response.status_code})"
-        
-        response.raise_for_status()
-        data = response.json()
-        content = data['choices'][0]['message']['content']
-        
-        # More flexible parsing to capture more links
-        lines = content.split('\n')
-        clean_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Look for markdown links [title](url) - be more flexible with detection
-            if '[' in line and '](' in line and ('http' in line or 'www' in line):
-                # Skip generic article patterns like [Article 1], [Article 2], etc.
-                if not re.match(r'^\[Article\s*\d*\]', line, re.IGNORECASE):
-                    clean_lines.append(f"• {line}")
-            
-            # Look for any line that contains a URL
-            elif re.search(r'https?://[^\s]+', line):
-                urls = re.findall(r'https?://[^\s]+', line)
-                if urls:
-                    url = urls[0]
-                    # Extract title from the line
-                    title_part = re.sub(r'https?://[^\s]+', '', line).strip()
-                    title_part = re.sub(r'[•\-\*\d\.\)]+', '', title_part).strip()
-                    
-                    if title_part and len(title_part) > 10:
-                        clean_lines.append(f"• [{title_part}]({url})")
-                    else:
-                        # Extract domain as title
-                        domain = re.search(r'https?://(?:www\.)?([^/]+)', url)
-                        domain_name = domain.group(1) if domain else url
-                        clean_lines.append(f"• [{domain_name}]({url})")
-        
-        # If we still don't have enough, try a different approach
-        if len(clean_lines) < 3:
-            # Look for any URLs in the entire content
-            all_urls = re.findall(r'https?://[^\s)]+', content)
-            for i, url in enumerate(all_urls[:5]):  # Get up to 5 URLs
-                if not any(url in line for line in clean_lines):  # Avoid duplicates
-                    domain = re.search(r'https?://(?:www\.)?([^/]+)', url)
-                    domain_name = domain.group(1) if domain else f"Source {i+1}"
-                    clean_lines.append(f"• [{domain_name}]({url})")
-        
-        return '\n'.join(clean_lines) if clean_lines else "• No relevant articles found for this query"
-        
-    except Exception as e:
-        return f"• Error fetching articles: {str(e)}"
-
-def get_ai_response(query, is_first_query=True):
-    """Get AI response for the query"""
-    if is_first_query:
-        # First query: Single comprehensive call with all data
-        sample_data = df.sample(10).to_dict(orient="records")
-        
-        try:
-            # Single API call that combines everything
-            comprehensive_messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a PIF private equity analyst with access to internal logistics company data. "
-                        "Provide a comprehensive investment analysis in exactly 3 sections:\n"
-                        "1. 📊 Summary of Findings (general market insights, up to 8 bullet points)\n"
-                        "2. 🏢 Insights from PIF Logistics Company Dataset (specific company analysis)\n"
-                        "3. 🔗 Relevant Articles (I will provide current articles separately)\n\n"
-                        "Use bullet points for all content. Be specific and actionable."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"Based on both general market knowledge and this PIF logistics dataset:\n{sample_data}\n\n"
-                        f"User question: {query}\n\n"
-                        "Provide comprehensive analysis covering general market insights and specific company data insights."
-                    )
-                }
-            ]
-            
-            response = openai.chat.completions.create(
-                model="gpt-4",
-                messages=comprehensive_messages,
-                temperature=0.3
-            )
-            
-            ai_analysis = response.choices[0].message.content
-            
-            # Get articles in parallel
-            articles = fetch_perplexity_articles(query)
-            
-            # Combine sections
-            if "3. 🔗 Relevant Articles" in ai_analysis:
-                full_response = ai_analysis.replace("3. 🔗 Relevant Articles", f"3. 🔗 Relevant Articles\n{articles}")
-            else:
-                full_response = f"{ai_analysis}\n\n3. 🔗 Relevant Articles\n{articles}"
-            
-            return full_response
-            
-        except Exception as e:
-            return f"Error: {e}"
-    
-    else:
-        # Follow-up queries: Enhanced decision logic
-        sample_data = df.sample(5).to_dict(orient="records")
-        
-        decision_messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are an intelligent routing assistant. Based on the user's question, determine what action to take:\n"
-                    "1. If they want current articles, news, web search, or ask for 'more articles' → respond with 'SEARCH_WEB'\n"
-                    "2. If they ask about companies in the dataset or previous response → respond with 'ANALYZE_DATA'\n"
-                    "3. If they need to compare data with global/industry averages, benchmarks, margins, or external standards → respond with 'SEARCH_AND_ANALYZE'\n"
-                    "4. If it's a general question → respond with 'GENERAL_RESPONSE'\n\n"
-                    "Keywords that indicate SEARCH_AND_ANALYZE: compare, global, industry average, benchmark, market average, versus, vs, external comparison, EBITDA margin, profit margin, industry standard, typical range\n"
-                    "Only respond with one of these four options: SEARCH_WEB, ANALYZE_DATA, SEARCH_AND_ANALYZE, or GENERAL_RESPONSE"
-                )
-            },
-            {
-                "role": "user",
-                "content": f"User question: {query}"
-            }
-        ]
-        
-        try:
-            decision_response = openai.chat.completions.create(
-                model="gpt-4",
-                messages=decision_messages,
-                temperature=0.1
-            )
-            
-            action = decision_response.choices[0].message.content.strip()
-            
-            if action == "SEARCH_WEB":
-                articles = fetch_perplexity_articles(query)
-                return f"Here are relevant articles about {query}:\n\n{articles}"
-            
-            elif action == "ANALYZE_DATA":
-                analysis_messages = [
-                    {
-                        "role": "system",
-                        "content": "You are a PIF analyst. Answer based on the company dataset provided."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Question: {query}\n\nCompany data: {sample_data}\n\nProvide specific analysis."
-                    }
-                ]
-                
-                analysis_response = openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=analysis_messages,
-                    temperature=0.3
-                )
-                
-                return analysis_response.choices[0].message.content
-            
-            elif action == "SEARCH_AND_ANALYZE":
-                # Enhanced search for benchmarking queries
-                print(f"DEBUG: Executing SEARCH_AND_ANALYZE for query: {query}")
-                
-                # Create more specific search queries for benchmarking
-                search_queries = [
-                    f"global logistics industry EBITDA margin average benchmark 2024",
-                    f"logistics companies profit margin industry standard",
-                    f"transportation logistics sector financial performance metrics"
-                ]
-                
-                # Search with multiple queries to get comprehensive data
-                all_articles = []
-                for search_query in search_queries:
-                    articles = fetch_perplexity_articles(search_query)
-                    all_articles.append(f"Search: {search_query}\n{articles}")
-                
-                combined_articles = "\n\n".join(all_articles)
-                
-                # Enhanced analysis with better context and source citation requirements
-                combined_messages = [
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a PIF financial analyst. Compare the internal company data with external industry benchmarks. "
-                            "IMPORTANT REQUIREMENTS:\n"
-                            "1. Calculate specific metrics from the internal data and show your calculations\n"
-                            "2. ALWAYS cite specific sources for external benchmark data using this format: 'According to [Source Name], global logistics EBITDA margins average X%'\n"
-                            "3. If you cannot find specific benchmarks in the search results, use your knowledge but clearly state: 'Based on industry knowledge (typical ranges):'\n"
-                            "4. Provide actionable investment insights based on the comparison\n"
-                            "5. Include a 'Sources Referenced' section at the end listing all sources used\n"
-                            "Use bullet points for all content."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f"Question: {query}\n\n"
-                            f"Internal PIF dataset (sample): {sample_data}\n\n"
-                            f"External research results: {combined_articles}\n\n"
-                            "Please provide:\n"
-                            "1. Calculated average EBITDA margin from internal data (show calculation)\n"
-                            "2. Global logistics industry EBITDA margin benchmarks (cite specific sources)\n"
-                            "3. Detailed comparison and analysis\n"
-                            "4. Investment implications and recommendations\n"
-                            "5. Sources Referenced section\n\n"
-                            "Remember to cite every external data point with its source."
-                        )
-                    }
-                ]
-                
-                combined_response = openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=combined_messages,
-                    temperature=0.3
-                )
-                
-                return combined_response.choices[0].message.content
-            
-            else:  # GENERAL_RESPONSE
-                general_messages = [
-                    {
-                        "role": "system",
-                        "content": "You are a knowledgeable financial analyst. Provide helpful insights."
-                    },
-                    {
-                        "role": "user",
-                        "content": query
-                    }
-                ]
-                
-                general_response = openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=general_messages,
-                    temperature=0.3
-                )
-                
-                return general_response.choices[0].message.content
-                
-        except Exception as e:
-            return f"Error: {e}"
-
-def process_content_to_html(content):
-    """Convert markdown content to HTML with proper header styling"""
-    lines = content.split('\n')
-    html_lines = []
-    in_list = False
-    
-    for line in lines:
-        line_stripped = line.strip()
-        
-        # Skip empty lines
-        if not line_stripped:
-            if in_list:
-                html_lines.append('</ul>')
-                in_list = False
-            html_lines.append('<br>')
-            continue
-        
-        # Skip unwanted messages
-        if ("Please provide relevant articles" in line_stripped or 
-            "Please provide the relevant articles" in line_stripped or
-            "I will provide current articles separately" in line_stripped or
-            "these will be filled in separately" in line_stripped):
-            continue
-        
-        # Handle main section headers (1. 📊 Summary of Findings, 2. 🏢 Insights, 3. 🔗 Relevant Articles)
-        if re.match(r'^\d+\.\s+[📊🏢🔗]', line_stripped):
-            if in_list:
-                html_lines.append('</ul>')
-                in_list = False
-            html_lines.append(f'<h2>{line_stripped}</h2>')
-            continue
-        
-        # Handle ## headers (like from perplexity)
-        if line_stripped.startswith('## '):
-            if in_list:
-                html_lines.append('</ul>')
-                in_list = False
-            header_text = line_stripped[3:].strip()
-            html_lines.append(f'<h2>{header_text}</h2>')
-            continue
-        
-        # Handle subsection headers within sections (like "1. Investment Opportunities:")
-        if re.match(r'^\d+\.\s+[A-Z]', line_stripped) and not re.match(r'^\d+\.\s+[📊🏢🔗]', line_stripped):
-            if in_list:
-                html_lines.append('</ul>')
-                in_list = False
-            html_lines.append(f'<h3 style="color: #2c2c2c; font-size: 1rem; font-weight: 600; margin: 1rem 0 0.5rem 0;">{line_stripped}</h3>')
-            continue
-        
-        # Handle bullet points - everything else should be bullet points
-        if line_stripped.startswith('• ') or line_stripped.startswith('- '):
-            if not in_list:
-                html_lines.append('<ul>')
-                in_list = True
-            item_text = line_stripped[2:].strip()
-            # Convert markdown links within bullet points
-            item_text = re.sub(r'\[(.+?)\]\((.+?)\)', r'<a href="\2" target="_blank">\1</a>', item_text)
-            html_lines.append(f'<li>{item_text}</li>')
-            continue
-        
-        # Handle markdown links [text](url) - these should be compact list items
-        if '[' in line_stripped and '](' in line_stripped:
-            if not in_list:
-                html_lines.append('<ul>')
-                in_list = True
-            # Convert all markdown links in the line
-            converted_line = re.sub(r'\[(.+?)\]\((.+?)\)', r'<a href="\2" target="_blank">\1</a>', line_stripped)
-            html_lines.append(f'<li>{converted_line}</li>')
-            continue
-        
-        # Handle standalone URLs - should be bullet points
-        if line_stripped.startswith('http'):
-            if not in_list:
-                html_lines.append('<ul>')
-                in_list = True
-            html_lines.append(f'<li><a href="{line_stripped}" target="_blank">{line_stripped}</a></li>')
-            continue
-        
-        # All other text should be bullet points
-        if not in_list:
-            html_lines.append('<ul>')
-            in_list = True
-        html_lines.append(f'<li>{line_stripped}</li>')
-    
-    if in_list:
-        html_lines.append('</ul>')
-    
-    return '\n'.join(html_lines)
+# Reopen the chat named in the URL after a reload
+if st.session_state.current_session_id is None and "chat" in st.query_params:
+    if not load_chat_session(st.query_params["chat"]):
+        st.query_params.pop("chat", None)
 
 # Sidebar for chat sessions
 with st.sidebar:
@@ -829,20 +524,67 @@ with st.sidebar:
     # New chat button
     if st.button("➕ New Chat", key="new_chat_btn"):
         create_new_chat()
+        st.rerun()
     
     st.markdown("---")
     
-    # Display chat sessions
-    for session_id, session_data in sorted(st.session_state.chat_sessions.items(), 
-                                          key=lambda x: x[1]["created_at"], reverse=True):
-        is_active = session_id == st.session_state.current_session_id
+    # Titles only; a chat's messages are read when it is opened
+    if st.session_state.current_session_id is None:
+        st.button("🟢 New Chat", key="chat_new", disabled=True)
+    for session in get_session_store().list_sessions(st.session_state.analyst_id, limit=SIDEBAR_SESSION_LIMIT):
+        is_active = session.session_id == st.session_state.current_session_id
         
         if st.button(
-            f"{'🟢' if is_active else '💬'} {session_data['title']}", 
-            key=f"chat_{session_id}",
-            help=f"Created: {session_data['created_at'].strftime('%Y-%m-%d %H:%M')}"
+            f"{'🟢' if is_active else '💬'} {session.title}", 
+            key=f"chat_{session.session_id}",
+            help=f"Created: {datetime.fromtimestamp(session.created_at).strftime('%Y-%m-%d %H:%M')}"
         ):
-            load_chat_session(session_id)
+            load_chat_session(session.session_id)
+            st.rerun()
+    
+    # Response cache counters, for tuning RESPONSE_CACHE_THRESHOLD
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries"
+    )
+    
+    # Dataset version answers are using; each hot reload of the CSV bumps it
+    dataset_manager = get_dataset_manager()
+    current_dataset = get_dataset()
+    dataset_caption = f"Dataset v{current_dataset.version}: {len(current_dataset.df)} companies"
+    if dataset_manager.last_change is not None:
+        change = dataset_manager.last_change
+        dataset_caption += (
+            f", reloaded {datetime.fromtimestamp(dataset_manager.reloaded_at).strftime('%H:%M')} "
+            f"(+{len(change.added)} / -{len(change.removed)} / ~{len(change.changed)})"
+        )
+    st.caption(dataset_caption)
+    
+    # How dataset questions were answered: exactly by the query engine or by the LLM
+    answer_paths = path_counts()
+    if answer_paths:
+        st.caption(f"Dataset questions: {answer_paths.get('query_engine', 0)} answered exactly, {answer_paths.get('llm', 0)} by the LLM")
+    
+    # Where prompt tokens go, averaged over every prompt this process has sent
+    prompt_tokens = token_report()
+    if prompt_tokens:
+        label = "Avg prompt tokens" if counts_are_exact() else "Avg prompt tokens (estimated)"
+        st.caption(f"{label}: " + ", ".join(f"{section} {tokens:.0f}" for section, tokens in prompt_tokens.items()))
+    
+    # Calls waiting for OpenAI/Perplexity rate limit capacity right now
+    waiting = {provider: depth for provider, depth in queue_depths().items() if depth}
+    if waiting:
+        st.caption("Rate limit queue: " + ", ".join(f"{provider} {depth} waiting" for provider, depth in waiting.items()))
+    
+    # Latency per pipeline stage over recent answers in this process
+    latencies = stage_latencies()
+    if latencies:
+        with st.expander("⏱️ Stage latency"):
+            st.table([
+                {"Stage": name, "Count": stats["count"], "p50 (ms)": round(stats["p50"]), "p95 (ms)": round(stats["p95"])}
+                for name, stats in latencies.items()
+            ])
 
 # Main header
 st.markdown("""
@@ -852,10 +594,6 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Initialize first chat if none exists
-if not st.session_state.chat_sessions:
-    create_new_chat()
-
 # Main content area
 if not st.session_state.first_message_sent:
     # Reduced spacing to move content up
@@ -885,6 +623,9 @@ if not st.session_state.first_message_sent:
                 height=100
             )
             submit_button = st.form_submit_button("Send", use_container_width=True)
+    
+    # The first answer streams in below the form
+    response_placeholder = st.empty()
 
 else:
     # Show chat messages and bottom input when messages exist
@@ -894,38 +635,18 @@ else:
         # Chat messages area
         st.markdown('<div class="chat-messages">', unsafe_allow_html=True)
         
+        # Only the most recent page of turns is shown; older ones load on demand
+        hidden_count, page_html = transcript_page(st.session_state.messages, st.session_state.visible_message_count)
+        if hidden_count and st.button(f"⬆️ Show {min(TRANSCRIPT_PAGE_SIZE, hidden_count)} earlier messages", key="show_earlier"):
+            st.session_state.visible_message_count += TRANSCRIPT_PAGE_SIZE
+            st.rerun()
+        
+        # Each message is converted to HTML once; the visible page goes out as one block
         if st.session_state.messages:
-            for message in st.session_state.messages:
-                if message["role"] == "user":
-                    st.markdown(f"""
-                        <div class="chat-message user-message">
-                            <div class="message-content">
-                                {message["content"]}
-                            </div>
-                        </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    # More thorough HTML cleaning for follow-up messages
-                    content = message["content"]
-                    
-                    # Remove all HTML tags and artifacts
-                    content = re.sub(r'<[^>]*>', '', content)
-                    content = re.sub(r'&[a-zA-Z]+;', '', content)  # Remove HTML entities
-                    
-                    # Clean up whitespace
-                    content = re.sub(r'\n\s*\n', '\n\n', content)
-                    content = content.strip()
-                    
-                    # Convert markdown to HTML with proper header styling
-                    processed_content = process_content_to_html(content)
-                    
-                    st.markdown(f"""
-                        <div class="chat-message assistant-message">
-                            <div class="message-content">
-                                {processed_content}
-                            </div>
-                        </div>
-                    """, unsafe_allow_html=True)
+            st.markdown(page_html, unsafe_allow_html=True)
+        
+        # The next answer streams in here
+        response_placeholder = st.empty()
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -961,68 +682,63 @@ else:
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def validate_responsible_ai(user_input):
-    """Validate user input against responsible AI guidelines"""
-    user_input_lower = user_input.lower()
-    
-    # Define violation patterns
-    violations = {
-        # PII patterns
-        'pii': [
-            r'\b\d{3}-\d{2}-\d{4}\b',  # SSN pattern
-            r'\b\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b',  # Credit card pattern
-            r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # Email pattern
-        ],
-        
-        # Harmful content keywords
-        'harmful': [
-            'racial slur', 'discrimination', 'violence against', 'hate speech',
-            'terrorist', 'terrorism', 'bomb', 'explosive', 'weapon', 'gun',
-            'suicide', 'self harm', 'kill yourself', 'harm others',
-            'sexual content', 'explicit', 'pornographic', 'arousal',
-            'gambling', 'casino', 'betting', 'illegal drugs', 'pharmaceuticals',
-            'phishing', 'scam', 'fraud', 'illegal activity', 'jailbreak',
-            'threaten', 'intimidate', 'bully', 'abuse', 'harass'
-        ]
-    }
-    
-    # Check for PII patterns
-    for pattern in violations['pii']:
-        if re.search(pattern, user_input):
-            return False
-    
-    # Check for harmful content keywords
-    for keyword in violations['harmful']:
-        if keyword in user_input_lower:
-            return False
-    
-    return True
-
 # Handle form submission
 if submit_button and user_input:
     # Validate input against responsible AI guidelines
-    if not validate_responsible_ai(user_input):
+    if validate_responsible_ai(user_input) is not None:
         st.error("These are not part of the Responsible AI Framework")
         st.stop()
     
     # Mark first message as sent
     st.session_state.first_message_sent = True
     
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": user_input})
+    # Add user message, rendered once now rather than on every rerun
+    user_message = {"role": "user", "content": user_input}
+    message_html(user_message)
+    st.session_state.messages.append(user_message)
+    save_message(user_message)
     
     # Determine if this is the first query
     is_first_query = len([msg for msg in st.session_state.messages if msg["role"] == "user"]) == 1
     
-    # Show loading state
-    with st.spinner("🤖 Analyzing investment opportunities..."):
-        ai_response = get_ai_response(user_input, is_first_query)
+    # Stream the answer into the chat as it arrives
+    question_html = message_html(user_message)
+    queued = sum(queue_depths().values())
+    busy_note = f" (providers are busy: {queued} requests queued)" if queued else ""
+    response_placeholder.markdown(
+        question_html + "\n" + assistant_message_html(f"<p>🤖 Analyzing investment opportunities...{busy_note}</p>"),
+        unsafe_allow_html=True
+    )
+    renderer = StreamingHtmlRenderer()
+    ai_response = ""
+    last_render = 0.0
+    if st.session_state.conversation_context is None:
+        st.session_state.conversation_context = ConversationContext(summarize_conversation)
+    history = st.session_state.messages[:-1]
+    with span("render_loop", session_id=st.session_state.current_session_id) as render_span:
+        render_seconds = 0.0
+        renders = 0
+        try:
+            for ai_response in stream_ai_response(user_input, is_first_query, st.session_state.conversation_context, history):
+                # Throttle redraws; every update carries the full text so nothing is lost
+                if time.monotonic() - last_render >= STREAM_RENDER_INTERVAL:
+                    render_started = time.perf_counter()
+                    response_placeholder.markdown(question_html + "\n" + assistant_message_html(renderer.update(ai_response)), unsafe_allow_html=True)
+                    last_render = time.monotonic()
+                    # Redraws are too frequent to export one by one; the panel still gets each duration
+                    observe("render", time.perf_counter() - render_started)
+                    render_seconds += time.perf_counter() - render_started
+                    renders += 1
+        except Exception as e:
+            # The question is already saved, so it always gets a reply
+            ai_response = f"Error: {e}"
+        render_span.set(renders=renders, render_ms=round(render_seconds * 1e3, 1), response_chars=len(ai_response))
     
     # Add AI response
-    st.session_state.messages.append({"role": "assistant", "content": ai_response})
-    
-    # Save session
-    save_current_session()
+    assistant_message = {"role": "assistant", "content": ai_response}
+    message_html(assistant_message)
+    st.session_state.messages.append(assistant_message)
+    save_message(assistant_message)
     
     # Rerun to show new messages
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""Shared fixtures: the modules live at the repository root and write their caches to a scratch directory"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PIF_CACHE_DIR", tempfile.mkdtemp(prefix="pif-cache-"))
+os.environ.setdefault("DATASET_WATCH", "0")
+
+DATA_PATH = os.path.join(ROOT, "investable_logistics_companies_mena.csv")
+
+
+@pytest.fixture(scope="session")
+def companies():
+    """The bundled dataset, typed as the app loads it"""
+    from dataset import parse_csv
+    return parse_csv(DATA_PATH)
+
+
+@pytest.fixture
+def raw_companies():
+    """The bundled CSV as plain text columns, for writing edited copies"""
+    return pd.read_csv(DATA_PATH)
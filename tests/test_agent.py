@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+import agent
+from concurrency import SingleFlight
+from context_window import ConversationContext
+
+
+def _fail(*args, **kwargs):
+    raise RuntimeError("index unavailable")
+
+
+@pytest.mark.parametrize("stage", ["retrieve_companies", "segment_statistics", "plan_query"])
+def test_get_ai_response_reports_a_failing_stage_as_an_error_reply(monkeypatch, stage):
+    monkeypatch.setattr(agent, stage, _fail)
+    first_query = stage != "plan_query"
+    response = agent.get_ai_response("Top cold chain companies in Egypt by ROE " + stage, is_first_query=first_query)
+    assert response == "Error: index unavailable"
+
+
+def test_get_ai_response_reports_an_unreadable_dataset_as_an_error_reply(monkeypatch):
+    monkeypatch.setattr(agent, "get_dataset", _fail)
+    assert agent.get_ai_response("Top freight companies in Oman") == "Error: index unavailable"
+
+
+def test_follow_ups_are_shared_within_a_conversation_only(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def answer(query, is_first_query, context, history, dataset):
+        started.set()
+        release.wait(5)
+        yield f"answer for {context.conversation_id}"
+
+    monkeypatch.setattr(agent, "_stream_ai_response", answer)
+    monkeypatch.setattr(agent, "_answer_flights", SingleFlight("answers"))
+    first, second = ConversationContext(None), ConversationContext(None)
+    outcomes = {}
+
+    def ask(name, context):
+        outcomes[name] = agent.get_ai_response("And in Oman?", is_first_query=False, context=context)
+
+    threads = [threading.Thread(target=ask, args=(name, context)) for name, context in (("a", first), ("b", first), ("c", second))]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while agent._answer_flights.stats()["leaders"] + agent._answer_flights.stats()["shared"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert agent._answer_flights.stats()["shared"] == 1
+    assert outcomes["a"] == outcomes["b"] == f"answer for {first.conversation_id}"
+    assert outcomes["c"] == f"answer for {second.conversation_id}"
@@ -0,0 +1,120 @@
+import time
+import types
+
+import pytest
+
+import article_cache
+from article_cache import ArticleCache
+
+NO_ARTICLES = "• No relevant articles found for this query"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class _Search:
+    """A fetch function returning queued results and counting calls"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        return self.results.pop(0)
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(article_cache, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ArticleCache(str(tmp_path / "articles.sqlite3"), ttl=100, max_stale=1000, max_entries=3)
+
+
+def _not_empty(articles):
+    return articles != NO_ARTICLES
+
+
+def test_fresh_entry_is_served_without_fetching(cache, clock):
+    search = _Search("• [Cold chain in Egypt](https://example.com/a)")
+    assert cache.get_or_fetch("Cold chain in Egypt?", search) == "• [Cold chain in Egypt](https://example.com/a)"
+    clock.now += 99
+    # Case, spacing and trailing punctuation share the entry
+    assert cache.get_or_fetch("  cold chain in egypt ", search) == "• [Cold chain in Egypt](https://example.com/a)"
+    assert search.calls == ["Cold chain in Egypt?"]
+
+
+def test_stale_entry_is_served_while_it_refreshes_in_the_background(cache, clock):
+    search = _Search("old articles", "new articles")
+    cache.get_or_fetch("freight", search)
+    clock.now += 500
+
+    assert cache.get_or_fetch("freight", search) == "old articles"
+    _wait_until(lambda: len(search.calls) == 2 and not cache._refreshing)
+    assert cache.get_or_fetch("freight", search) == "new articles"
+
+
+def test_expired_entry_is_fetched_again_before_answering(cache, clock):
+    search = _Search("old articles", "new articles")
+    cache.get_or_fetch("freight", search)
+    clock.now += 1100
+
+    assert cache.get_or_fetch("freight", search) == "new articles"
+    assert len(search.calls) == 2
+
+
+def test_least_recently_used_entries_are_evicted_beyond_max_entries(cache, clock):
+    search = _Search("a", "b", "c", "d", "a again")
+    for query in ("a", "b", "c"):
+        cache.get_or_fetch(query, search)
+        clock.now += 1
+    # Reading "a" makes "b" the least recently used
+    cache.get_or_fetch("a", search)
+    clock.now += 1
+    cache.get_or_fetch("d", search)
+
+    assert cache._get("b", clock.now) is None
+    assert [cache._get(key, clock.now)[0] for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+def test_results_without_articles_are_not_cached(cache, clock):
+    search = _Search(NO_ARTICLES, "• [Found](https://example.com/found)")
+    assert cache.get_or_fetch("new topic", search, _not_empty) == NO_ARTICLES
+    assert cache.get_or_fetch("new topic", search, _not_empty) == "• [Found](https://example.com/found)"
+    assert len(search.calls) == 2
+
+
+def test_an_empty_refresh_keeps_the_stale_articles(cache, clock):
+    search = _Search("• [Found](https://example.com/found)", NO_ARTICLES)
+    cache.get_or_fetch("topic", search, _not_empty)
+    clock.now += 500
+
+    cache.get_or_fetch("topic", search, _not_empty)
+    _wait_until(lambda: len(search.calls) == 2 and not cache._refreshing)
+    assert cache.get_or_fetch("topic", search, _not_empty) == "• [Found](https://example.com/found)"
+
+
+def test_fetch_errors_propagate_and_are_not_cached(cache):
+    def failing(query):
+        raise ConnectionError("Perplexity is down")
+
+    with pytest.raises(ConnectionError):
+        cache.get_or_fetch("topic", failing)
+    assert cache.get_or_fetch("topic", _Search("articles")) == "articles"
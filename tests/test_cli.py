@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import cli
+from cli import completed_ids, read_questions, run_batch
+
+
+def _write_jsonl(path, records, tail=b""):
+    with open(path, "wb") as f:
+        for record in records:
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.write(tail)
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read().split("\n")
+
+
+def test_read_questions_assigns_ids_and_skips_blank_lines(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"question": "Cold chain in KSA?"}\n\n{"id": 7, "question": "Freight in Oman?"}\n', encoding="utf-8")
+    assert read_questions(str(path)) == [
+        {"id": "line-1", "question": "Cold chain in KSA?"},
+        {"id": "7", "question": "Freight in Oman?"},
+    ]
+
+
+def test_read_questions_rejects_duplicate_ids(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"id": "a", "question": "one"}\n{"id": "a", "question": "two"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="duplicate id 'a'"):
+        read_questions(str(path))
+
+
+def test_completed_ids_counts_final_statuses_and_skips_a_cut_off_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    # The run was interrupted half-way through a two-byte character
+    partial = '{"id": "d", "status": "ok", "answer": "سلسلة'.encode("utf-8")[:-1]
+    _write_jsonl(path, [
+        {"id": "a", "status": "ok"}, {"id": "b", "status": "error"}, {"id": "c", "status": "withheld"},
+    ], partial)
+
+    assert completed_ids(str(path)) == {"a", "c"}
+    assert completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+@pytest.mark.parametrize("tail", [b"", '{"id": "c", "answer": "سلسلة'.encode("utf-8")[:-1]], ids=["complete", "cut-mid-character"])
+def test_resumed_batch_runs_only_unfinished_questions_on_lines_of_their_own(tmp_path, monkeypatch, tail):
+    output = tmp_path / "results.jsonl"
+    _write_jsonl(output, [{"id": "a", "status": "ok", "answer": "done"}, {"id": "b", "status": "error"}], tail)
+    answered = []
+
+    def answer(item, include_html=False):
+        answered.append(item["id"])
+        return {"id": item["id"], "status": "ok", "answer": "تم", "elapsed_seconds": 0.0}
+
+    monkeypatch.setattr(cli, "answer_question", answer)
+    questions = [{"id": question_id, "question": f"question {question_id}"} for question_id in "abc"]
+
+    assert run_batch(questions, str(output), concurrency=2) == 2
+    assert sorted(answered) == ["b", "c"]
+    lines = _read_jsonl(output)
+    assert lines[-1] == ""
+    records = [json.loads(line) for line in lines[:-1] if not line.startswith('{"id": "c", "answer"')]
+    assert [record["id"] for record in records[:2]] == ["a", "b"]
+    assert sorted(record["id"] for record in records[2:]) == ["b", "c"]
+    assert completed_ids(str(output)) == {"a", "b", "c"}
@@ -0,0 +1,247 @@
+import threading
+import time
+
+from concurrency import CallTimeout, SingleFlight, fan_out
+from rate_limit import BATCH, INTERACTIVE, current_priority, priority
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.001)
+
+
+def _in_threads(count, target):
+    """Run target(i) on count threads; returns what each returned or raised, by index"""
+    outcomes = [None] * count
+
+    def run(i):
+        try:
+            outcomes[i] = target(i)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    return threads, outcomes
+
+
+def test_do_shares_one_call_between_concurrent_callers():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    threads, outcomes = _in_threads(3, lambda i: flight.do("key", slow, 21))
+    threads[0].start()
+    _wait_until(lambda: calls)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_until(lambda: flight.stats()["shared"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes == [42, 42, 42]
+    assert calls == [21]
+    assert flight.stats() == {"leaders": 1, "shared": 2, "in_flight": 0}
+
+
+def test_do_raises_the_leaders_exception_in_every_caller_and_then_forgets_it():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    threads, outcomes = _in_threads(2, lambda i: flight.do("key", failing))
+    threads[0].start()
+    started.wait(5)
+    threads[1].start()
+    _wait_until(lambda: flight.stats()["shared"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert outcomes[0] is outcomes[1]
+    assert flight.stats()["in_flight"] == 0
+    # A failed call is not remembered: the next caller runs func again
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_do_keeps_different_keys_apart():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats() == {"leaders": 2, "shared": 0, "in_flight": 0}
+
+
+def test_do_runs_at_the_most_urgent_priority_among_its_callers():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    levels = []
+
+    def call():
+        started.set()
+        levels.append(current_priority())
+        release.wait(5)
+        levels.append(current_priority())
+        return "answer"
+
+    def batch_leader():
+        with priority(BATCH):
+            flight.do("key", call)
+
+    leader = threading.Thread(target=batch_leader)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: flight.do("key", call))
+    follower.start()
+    _wait_until(lambda: flight.shared == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert levels == [BATCH, INTERACTIVE]
+
+
+def test_stream_shares_one_generator_and_ends_on_its_last_snapshot():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    runs = []
+
+    def chunks():
+        runs.append(1)
+        yield "Top"
+        release.wait(5)
+        yield "Top cold chain"
+        yield "Top cold chain companies"
+
+    threads, outcomes = _in_threads(2, lambda i: list(flight.stream("key", chunks)))
+    threads[0].start()
+    _wait_until(lambda: runs)
+    threads[1].start()
+    _wait_until(lambda: flight.stats()["shared"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert runs == [1]
+    # A reader may skip snapshots but always sees the final one
+    assert all(outcome[-1] == "Top cold chain companies" for outcome in outcomes)
+    _wait_until(lambda: flight.stats()["in_flight"] == 0)
+
+
+def test_stream_raises_the_generators_exception_in_every_reader():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        yield "partial"
+        release.wait(5)
+        raise ConnectionError("stream dropped")
+
+    threads, outcomes = _in_threads(2, lambda i: list(flight.stream("key", failing)))
+    threads[0].start()
+    started.wait(5)
+    threads[1].start()
+    _wait_until(lambda: flight.stats()["shared"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(outcome, ConnectionError) for outcome in outcomes)
+    _wait_until(lambda: flight.stats()["in_flight"] == 0)
+    assert list(flight.stream("key", lambda: iter(["again"]))) == ["again"]
+
+
+def test_stream_finishes_the_generator_after_every_reader_stops():
+    flight = SingleFlight("test")
+    finished = threading.Event()
+
+    def chunks():
+        yield "first"
+        time.sleep(0.01)
+        yield "second"
+        finished.set()
+
+    reader = flight.stream("key", chunks)
+    assert next(reader) == "first"
+    reader.close()
+
+    assert finished.wait(5)
+    _wait_until(lambda: flight.stats()["in_flight"] == 0)
+
+
+
+def test_fan_out_returns_results_in_item_order_with_bounded_concurrency():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        # Later items finish first
+        time.sleep(0.005 * (6 - item))
+        with lock:
+            running[0] -= 1
+        if item == 3:
+            raise ValueError("no results")
+        return item * 10
+
+    results = fan_out(call, list(range(6)), max_concurrency=2)
+
+    assert [result.value for result in results] == [0, 10, 20, None, 40, 50]
+    assert isinstance(results[3].error, ValueError)
+    assert peak[0] <= 2
+
+
+def test_fan_out_abandons_a_call_past_its_timeout():
+    release = threading.Event()
+
+    def call(item):
+        if item == "slow":
+            release.wait(5)
+        return item
+
+    try:
+        started = time.monotonic()
+        fast, slow = fan_out(call, ["fast", "slow"], timeout=0.05)
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+
+    assert (fast.value, fast.error) == ("fast", None)
+    assert isinstance(slow.error, CallTimeout)
+    assert "timed out" in str(slow.error)
+
+
+def test_fan_out_cancels_unstarted_calls_at_the_deadline():
+    release = threading.Event()
+    started_items = []
+
+    def call(item):
+        started_items.append(item)
+        release.wait(5)
+        return item
+
+    try:
+        results = fan_out(call, ["a", "b", "c", "d"], max_concurrency=2, deadline=0.05)
+    finally:
+        release.set()
+
+    assert set(started_items) <= {"a", "b"}
+    assert all(isinstance(result.error, CallTimeout) for result in results)
+    assert "deadline" in str(results[0].error)
+    assert [str(result.error) for result in results[2:]] == ["cancelled at deadline before starting"] * 2
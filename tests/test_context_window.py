@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+from context_window import ConversationContext
+from tokens import count_message_tokens
+
+BUDGET = 300
+
+
+def _turn(i):
+    return [
+        {"role": "user", "content": f"Question {i}: how do the cold chain companies in Egypt compare on ROE and leverage?"},
+        {"role": "assistant", "content": " ".join(f"Answer {i} point {j} about margins, growth and investors." for j in range(8))},
+    ]
+
+
+def _wait_for_summary(context):
+    if context._pending is not None:
+        wait([context._pending[0]], timeout=5)
+
+
+def _conversation(context, turns):
+    """Ask turns follow-ups, yielding the messages sent with each one"""
+    history = []
+    for i in range(turns):
+        history += _turn(i)
+        yield context.messages(history)
+        _wait_for_summary(context)
+
+
+def test_prompt_stays_within_budget_when_the_summarizer_fails():
+    def failing(previous, turns):
+        raise RuntimeError("summarizer down")
+
+    context = ConversationContext(failing, budget=BUDGET)
+    for messages in _conversation(context, 60):
+        assert count_message_tokens(messages) <= BUDGET
+
+    assert context.summarized_count == 0
+    # The newest unsummarized questions are still there to stand in for the summary
+    assert "Question 57" in messages[0]["content"]
+
+
+def test_prompt_stays_within_budget_while_a_summary_is_pending():
+    release = threading.Event()
+
+    def slow(previous, turns):
+        release.wait(5)
+        return "Analyst compared Egyptian cold chain companies."
+
+    context = ConversationContext(slow, budget=BUDGET)
+    try:
+        history = []
+        for i in range(60):
+            history += _turn(i)
+            assert count_message_tokens(context.messages(history)) <= BUDGET
+    finally:
+        release.set()
+
+    _wait_for_summary(context)
+    messages = context.messages(history)
+    assert count_message_tokens(messages) <= BUDGET
+    assert context.summarized_count > 0
+    assert "Analyst compared Egyptian cold chain companies." in messages[0]["content"]
+
+
+def test_an_oversized_summary_is_cut_to_the_budget():
+    context = ConversationContext(lambda previous, turns: "word " * 2000, budget=BUDGET)
+    context.add_references([f"MENA Logistics Co {i}" for i in range(20)])
+    for messages in _conversation(context, 20):
+        assert count_message_tokens(messages) <= BUDGET
+    assert context.summary
+
+
+@pytest.mark.parametrize("budget", [40, 120])
+def test_a_single_long_turn_is_truncated_to_fit(budget):
+    context = ConversationContext(lambda previous, turns: "", budget=budget)
+    history = [{"role": "user", "content": "word " * 500}]
+    messages = context.messages(history)
+    assert count_message_tokens(messages) <= budget
+    assert messages[-1]["role"] == "user"
+
+
+def test_references_keep_the_most_recent_companies():
+    context = ConversationContext(lambda previous, turns: "", max_references=3)
+    context.add_references(["Co 1", "Co 2", "Co 3"])
+    context.add_references(["Co 4", "Co 2"])
+    assert context.references == ["Co 3", "Co 4", "Co 2"]
+
+
+def test_conversation_ids_are_not_reused_like_object_ids():
+    # CPython hands a freed object's address to the next one, so id() repeats here
+    ids = [ConversationContext(None).conversation_id for _ in range(100)]
+    assert len(set(ids)) == 100
@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import pytest
+
+import dataset
+from dataset import SCHEMA, _sidecar_path, load_companies, parse_csv
+
+
+@pytest.fixture
+def csv_path(raw_companies, tmp_path, request):
+    # The sidecar is named after the CSV, so each test gets its own
+    path = tmp_path / f"{request.node.name}.csv"
+    raw_companies.to_csv(path, index=False)
+    os.utime(path, (1_000_000, 1_000_000))
+    return str(path)
+
+
+def test_columns_are_loaded_with_the_schema_dtypes(companies):
+    assert {column: str(dtype) for column, dtype in companies.dtypes.items()} == {
+        column: "string" if dtype == "string[pyarrow]" else dtype for column, dtype in SCHEMA.items()
+    }
+    assert companies["Company Name"].dtype == pd.StringDtype("pyarrow")
+
+
+def test_percent_text_is_parsed_as_a_number(tmp_path):
+    path = tmp_path / "growth.csv"
+    path.write_text('Company Name,Growth Rate,ROE (%)\nA,40%,12.5\nB," 1,250% ",\nC,n/a,3\n', encoding="utf-8")
+    df = parse_csv(str(path))
+    assert df["Growth Rate"].tolist()[:2] == [40.0, 1250.0]
+    assert df["Growth Rate"].isna().tolist() == [False, False, True]
+    assert str(df["ROE (%)"].dtype) == "float32"
+
+
+def test_sidecar_is_written_and_reused_while_the_csv_is_unchanged(csv_path, monkeypatch):
+    first = load_companies(csv_path)
+    assert os.path.exists(_sidecar_path(csv_path))
+
+    def not_parsed(path):
+        raise AssertionError("CSV parsed although the sidecar is fresh")
+
+    monkeypatch.setattr(dataset, "parse_csv", not_parsed)
+    second = load_companies(csv_path)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_sidecar_is_rebuilt_when_the_csv_changes(csv_path, raw_companies):
+    load_companies(csv_path)
+    edited = raw_companies.head(5)
+    edited.to_csv(csv_path, index=False)
+    os.utime(csv_path, (2_000_000, 2_000_000))
+
+    assert len(load_companies(csv_path)) == 5
+    # ...and the rebuilt sidecar now serves the new version
+    assert len(dataset._read_sidecar(_sidecar_path(csv_path), dataset.dataset_fingerprint(csv_path))) == 5
+
+
+def test_an_unreadable_sidecar_falls_back_to_the_csv(csv_path, raw_companies):
+    with open(_sidecar_path(csv_path), "wb") as f:
+        f.write(b"not an arrow file")
+    assert len(load_companies(csv_path)) == len(raw_companies)
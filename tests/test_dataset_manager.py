@@ -0,0 +1,109 @@
+import os
+
+import agent
+from dataset_manager import DatasetManager, _answer_still_valid, diff_rows, touched_segments
+from response_cache import SemanticResponseCache
+
+
+def _write(df, path, mtime):
+    df.to_csv(path, index=False)
+    # Distinct modification times so the fingerprint changes even within one clock tick
+    os.utime(path, (mtime, mtime))
+
+
+def test_diff_rows_reports_added_removed_and_changed_companies(raw_companies):
+    old = raw_companies.head(10)
+    new = raw_companies.iloc[1:12].copy()
+    new.loc[new["Company Name"] == "MENA Logistics Co 5", "ROE (%)"] += 1
+
+    change = diff_rows(old, new)
+
+    assert change.added == ["MENA Logistics Co 11", "MENA Logistics Co 12"]
+    assert change.removed == ["MENA Logistics Co 1"]
+    assert change.changed == ["MENA Logistics Co 5"]
+
+
+def test_diff_rows_ignores_row_order(raw_companies):
+    old = raw_companies.head(20)
+    assert diff_rows(old, old.iloc[::-1]) == ([], [], [])
+
+
+def test_diff_rows_treats_a_new_column_as_touching_every_company(raw_companies):
+    old = raw_companies.head(3)
+    new = old.assign(Rating="A")
+    change = diff_rows(old, new)
+    assert sorted(change.added) == sorted(old["Company Name"])
+    assert sorted(change.removed) == sorted(old["Company Name"])
+
+
+def test_answer_still_valid_drops_answers_about_a_changed_segment(raw_companies):
+    old = raw_companies.head(10)
+    new = old.copy()
+    # Co 1 is Oman / Freight / Sequoia
+    new.loc[new["Company Name"] == "MENA Logistics Co 1", "ROE (%)"] += 1
+    keep = _answer_still_valid(touched_segments(old, new, diff_rows(old, new)))
+
+    assert not keep({"Country": ["Oman"]})
+    assert not keep({"Country": ["Oman"], "Subsector": ["Freight"]})
+    assert keep({"Country": ["Oman"], "Subsector": ["Cold Chain"]})
+    assert keep({"Country": ["Egypt"]})
+    # An answer about no segment in particular may have used the changed company
+    assert not keep({})
+
+
+def test_answer_still_valid_checks_a_company_before_and_after_it_moved(raw_companies):
+    old = raw_companies.head(10)
+    new = old.copy()
+    new.loc[new["Company Name"] == "MENA Logistics Co 1", "Country"] = "Qatar"
+    keep = _answer_still_valid(touched_segments(old, new, diff_rows(old, new)))
+
+    assert not keep({"Country": ["Oman"]})
+    assert not keep({"Country": ["Qatar"]})
+    assert keep({"Country": ["Egypt"]})
+
+
+def test_reload_leaves_earlier_snapshots_usable(raw_companies, tmp_path):
+    path = tmp_path / "companies.csv"
+    _write(raw_companies.head(60), path, 1_000_000)
+    manager = DatasetManager(str(path), watch=False)
+    old = manager.snapshot()
+
+    _write(raw_companies, path, 2_000_000)
+    manager.reload()
+    new = manager.snapshot()
+
+    assert (old.version, new.version) == (1, 2)
+    assert old.semantic_index is not new.semantic_index
+    assert old.screening_engine is not new.screening_engine
+    # Semantic row positions of the old snapshot still index its own 60 rows
+    rows, _ = agent.retrieve_companies(old, "which companies are expanding in free zones", 5)
+    assert set(rows["Company Name"]) <= set(old.df["Company Name"])
+    assert old.screening_engine.tables[()].iloc[0][("ROE (%)", "count")] == 60
+    assert new.screening_engine.tables[()].iloc[0][("ROE (%)", "count")] == len(raw_companies)
+
+
+def test_reload_without_edits_keeps_the_version(raw_companies, tmp_path):
+    path = tmp_path / "companies.csv"
+    _write(raw_companies, path, 1_000_000)
+    manager = DatasetManager(str(path), watch=False)
+    first = manager.snapshot()
+
+    _write(raw_companies, path, 2_000_000)
+    change = manager.reload()
+
+    assert change == ([], [], [])
+    assert manager.snapshot() is first
+
+
+def test_carry_over_keeps_entries_for_untouched_segments():
+    cache = SemanticResponseCache()
+    cache.store("Top cold chain companies in Egypt", "first_query", 1, "egypt answer", {"Country": ["Egypt"]})
+    cache.store("Top cold chain companies in Oman", "first_query", 1, "oman answer", {"Country": ["Oman"]})
+
+    cache.carry_over(2, lambda segments: segments.get("Country") != ["Oman"])
+
+    assert cache.lookup("Top cold chain companies in Egypt", "first_query", 2) == "egypt answer"
+    assert cache.lookup("Top cold chain companies in Oman", "first_query", 2) is None
+    # Answers computed from the replaced version are not stored
+    cache.store("Top freight companies in Oman", "first_query", 1, "stale", {"Country": ["Oman"]})
+    assert cache.lookup("Top freight companies in Oman", "first_query", 2) is None
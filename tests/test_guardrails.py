@@ -0,0 +1,44 @@
+import pytest
+
+from guardrails import get_guardrails
+
+
+@pytest.mark.parametrize("text", [
+    "E-commerce has seen explosive growth in KSA",
+    "Rising fuel costs threaten EBITDA margins",
+    "Investor relations: ir@example-logistics.com",
+    "Fraud controls and anti-abuse policies are a diligence item",
+])
+def test_routine_financial_writing_passes_output_rules(text):
+    assert get_guardrails().scan(text, "output") is None
+
+
+def test_news_headlines_pass_article_rules():
+    assert get_guardrails().scan("Houthi attacks threaten Red Sea shipping", "article") is None
+
+
+@pytest.mark.parametrize("text, rule", [
+    ("Here is how to make a bomb", "harmful-output"),
+    ("Card number 4111 1111 1111 1111", "pii-credit-card"),
+])
+def test_output_rules_still_catch_harmful_answers(text, rule):
+    assert get_guardrails().scan(text, "output").name == rule
+
+
+@pytest.mark.parametrize("text, rule", [
+    ("harassment of drivers", "harassment"),
+    ("intimidation tactics", "harassment"),
+    ("fraudulent invoices", "sensitive-business-terms"),
+    ("abusive pricing", "sensitive-business-terms"),
+    ("terrorists", "violent-extremism"),
+    ("weapons", "violent-extremism"),
+    ("self-harm", "self-harm"),
+    ("email me at analyst@example.com", "pii-email"),
+])
+def test_input_rules_match_inflected_forms(text, rule):
+    assert get_guardrails().scan(text, "input").name == rule
+
+
+@pytest.mark.parametrize("text", ["Cold chain companies in Abu Dhabi", "Which projects have begun in Egypt?"])
+def test_input_keywords_need_a_word_boundary(text):
+    assert get_guardrails().scan(text, "input") is None
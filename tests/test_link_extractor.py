@@ -0,0 +1,86 @@
+import pytest
+
+from link_extractor import Link, LinkExtractor, canonical_url, extract_links
+
+ANSWER = """Recent coverage of cold chain logistics in Egypt:
+
+1. [Egypt's cold chain market doubles](https://www.example.com/news/cold-chain?utm_source=pplx#top)
+2. Gulf freight operators expand - https://freight.example.org/oman(2024)/report.
+3. [Article 3](https://trade.example.net/egypt)
+Duplicate: [Cold chain market](http://example.com/news/cold-chain/)
+"""
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.example.com/news/cold-chain",
+    "http://example.com/news/cold-chain/",
+    "https://EXAMPLE.com/news/cold-chain#section",
+    "https://example.com/news/cold-chain?utm_source=newsletter&fbclid=abc",
+    "www.example.com/news/cold-chain",
+])
+def test_canonical_url_ignores_scheme_www_fragment_tracking_and_trailing_slash(url):
+    assert canonical_url(url) == "example.com/news/cold-chain"
+
+
+def test_canonical_url_keeps_parameters_that_pick_the_page():
+    assert canonical_url("https://example.com/article?id=7&utm_medium=email") == "example.com/article?id=7"
+    assert canonical_url("https://example.com/article?id=7") != canonical_url("https://example.com/article?id=8")
+
+
+def test_links_are_deduplicated_by_canonical_url():
+    links = extract_links(ANSWER)
+    assert links == [
+        Link("Egypt's cold chain market doubles", "https://www.example.com/news/cold-chain?utm_source=pplx#top"),
+        Link("Gulf freight operators expand", "https://freight.example.org/oman(2024)/report"),
+        # Too few real titles, so the placeholder one is kept under its site name
+        Link("trade.example.net", "https://trade.example.net/egypt"),
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 40, len(ANSWER)])
+def test_streamed_chunks_give_the_same_links_as_the_whole_text(chunk_size):
+    extractor = LinkExtractor()
+    added = []
+    for i in range(0, len(ANSWER), chunk_size):
+        added += extractor.feed(ANSWER[i:i + chunk_size])
+    added += extractor.close()
+
+    assert added == extractor.links == extract_links(ANSWER)
+
+
+def test_a_link_split_across_chunks_is_found_once_its_line_is_complete():
+    extractor = LinkExtractor()
+    assert extractor.feed("See [Oman ports report](https://ports.exam") == []
+    assert extractor.feed("ple.com/oman) for details") == []
+    assert extractor.close() == [Link("Oman ports report", "https://ports.example.com/oman")]
+
+
+def test_feed_stops_at_max_links():
+    extractor = LinkExtractor(max_links=2)
+    extractor.feed("".join(f"[Company report {i}](https://example.com/{i})\n" for i in range(5)))
+    assert [link.url for link in extractor.links] == ["https://example.com/0", "https://example.com/1"]
+
+
+def test_search_results_are_preferred_over_links_in_the_text():
+    search_results = [
+        {"title": "Cold chain investment in Egypt [1]", "url": "https://news.example.com/egypt"},
+        {"title": "", "url": "https://www.example.com/news/cold-chain/"},
+    ]
+    links = extract_links(ANSWER, citations=["https://elsewhere.example.com/"], search_results=search_results)
+
+    assert links == [
+        Link("Cold chain investment in Egypt", "https://news.example.com/egypt"),
+        Link("example.com", "https://www.example.com/news/cold-chain/"),
+        Link("elsewhere.example.com", "https://elsewhere.example.com/"),
+    ]
+
+
+def test_citations_take_their_titles_from_matching_links_in_the_text():
+    citations = ["https://example.com/news/cold-chain", "https://unmentioned.example.com/page", "https://freight.example.org/oman(2024)/report"]
+    links = extract_links(ANSWER, citations=citations)
+
+    assert links == [
+        Link("Egypt's cold chain market doubles", "https://example.com/news/cold-chain"),
+        Link("unmentioned.example.com", "https://unmentioned.example.com/page"),
+        Link("Gulf freight operators expand", "https://freight.example.org/oman(2024)/report"),
+    ]
@@ -0,0 +1,107 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import prompt_builder
+import tokens
+from prompt_builder import PromptBuilder, rows_to_csv_lines, select_columns, token_report
+from retrieval import DatasetRetriever
+
+
+QUESTIONS = ("Top cold chain companies", "Which freight operators in Oman grow fastest?")
+
+
+class _FakeEncoding:
+    """Stands in for a tiktoken encoding: one token per four characters"""
+
+    def encode(self, text, disallowed_special=()):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, pieces):
+        return "".join(pieces)
+
+
+@pytest.fixture(params=["estimate", "tiktoken"], autouse=True)
+def tokenizer(request, monkeypatch):
+    """Run every test with the regex estimate and with an exact encoding"""
+    encoding = _FakeEncoding() if request.param == "tiktoken" else None
+    monkeypatch.setattr(tokens, "_encoding", lambda: encoding)
+    return request.param
+
+
+@pytest.fixture
+def totals(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "_totals", Counter())
+    monkeypatch.setattr(prompt_builder, "_prompt_count", 0)
+
+
+@pytest.fixture
+def retriever(companies):
+    return DatasetRetriever(companies)
+
+
+def test_first_query_sends_identity_and_default_metrics(retriever, companies):
+    columns = select_columns(companies.columns, "Top cold chain companies", retriever.parse("Top cold chain companies"), first_query=True)
+    assert columns[:3] == ["Company Name", "Country", "Subsector"]
+    assert set(prompt_builder.DEFAULT_PROMPT_METRICS) <= set(columns)
+    assert "Notes" not in columns and "Investors" not in columns
+
+
+def test_follow_up_sends_only_the_metrics_it_names_and_the_text_it_asks_for(retriever, companies):
+    query = "Which of these are backed by investors with debt to equity under 1?"
+    columns = select_columns(companies.columns, query, retriever.parse(query), matched_columns=("Notes",))
+    assert columns == ["Company Name", "Country", "Subsector", "Revenue (USD)", "Debt-to-Equity", "Investors", "Notes"]
+    assert select_columns(["Company Name", "ROE (%)"], "highest ROE", retriever.parse("highest ROE")) == ["Company Name", "ROE (%)"]
+
+
+def test_csv_lines_drop_float_noise_and_leave_missing_values_blank():
+    rows = pd.DataFrame({"Company Name": ["A", "B"], "ROE (%)": np.array([17.65, np.nan], dtype=np.float32), "Revenue (USD)": [4040177.56, 1e6]})
+    header, lines = rows_to_csv_lines(rows, ["Company Name", "ROE (%)", "Revenue (USD)"])
+    assert header == "Company Name,ROE (%),Revenue (USD)"
+    assert lines == ["A,17.65,4040177.56", "B,,1000000"]
+
+
+def test_add_rows_keeps_the_most_relevant_rows_that_fit(companies):
+    columns = ["Company Name", "Country", "Subsector", "ROE (%)"]
+    header, lines = rows_to_csv_lines(companies, columns)
+    builder = PromptBuilder("ANALYZE_DATA", budget=400)
+    builder.add("instructions", "Answer from the rows below. " * 10)
+
+    text = builder.add_rows("rows", companies, columns)
+
+    kept = text.split("\n")
+    assert kept[0] == header
+    # A prefix of the rows, in relevance order
+    assert 0 < len(kept) - 1 < len(lines)
+    assert kept[1:] == lines[:len(kept) - 1]
+    assert builder.sections["rows"] == tokens.count_tokens(text)
+    assert builder.remaining() >= 0
+
+
+def test_add_rows_keeps_everything_when_there_is_room(companies):
+    builder = PromptBuilder("ANALYZE_DATA", budget=100_000)
+    text = builder.add_rows("rows", companies.head(5), ["Company Name", "ROE (%)"])
+    assert text.count("\n") == 5
+
+
+def test_finish_reports_tokens_per_section_and_averages_them(totals):
+    for question in QUESTIONS:
+        builder = PromptBuilder("ANALYZE_DATA", budget=1000)
+        instructions = builder.add("instructions", "You are an investment analyst.")
+        asked = builder.add("question", question)
+        messages = [{"role": "system", "content": instructions}, {"role": "user", "content": f"Question: {asked}"}]
+        builder.finish(messages)
+
+    report = token_report()
+    assert report["question"] == sum(tokens.count_tokens(question) for question in QUESTIONS) / 2
+    assert report["instructions"] == tokens.count_tokens("You are an investment analyst.")
+    assert report["template"] > 0
+    assert set(report) == {"instructions", "question", "template"}
+
+
+def test_token_report_is_empty_before_any_prompt(totals, tokenizer):
+    assert token_report() == {}
+    # The sidebar labels the figures as estimates unless the tokenizer is exact
+    assert tokens.counts_are_exact() == (tokenizer == "tiktoken")
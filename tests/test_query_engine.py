@@ -0,0 +1,54 @@
+import pytest
+
+from query_engine import execute, format_answer, plan_query
+
+
+@pytest.fixture
+def retriever(companies):
+    from retrieval import DatasetRetriever
+    return DatasetRetriever(companies)
+
+
+def test_top_n_by_metric_in_a_country(retriever, companies):
+    plan = plan_query("Top 5 by ROE in Egypt", retriever)
+
+    assert plan.values == {"Country": ["Egypt"]}
+    assert (plan.sort_column, plan.ascending, plan.limit) == ("ROE (%)", False, 5)
+    result, matched = execute(plan, retriever)
+    egypt = companies[companies["Country"] == "Egypt"]
+    assert matched == len(egypt)
+    assert list(result["Company Name"]) == list(egypt.nlargest(5, "ROE (%)")["Company Name"])
+    assert format_answer(plan, result, matched).startswith(f"Companies with the highest ROE (Egypt; showing 5 of {len(egypt)}):")
+
+
+def test_segment_with_a_numeric_condition(retriever, companies):
+    plan = plan_query("Cold chain companies with debt-to-equity under 1", retriever)
+
+    assert plan.values == {"Subsector": ["Cold Chain"]}
+    assert [(f.column, f.op, f.value) for f in plan.filters] == [("Debt-to-Equity", "<", 1.0)]
+    result, matched = execute(plan, retriever)
+    expected = companies[(companies["Subsector"] == "Cold Chain") & (companies["Debt-to-Equity"] < 1)]
+    assert matched == len(expected)
+    assert set(result["Company Name"]) <= set(expected["Company Name"])
+    assert list(result["Debt-to-Equity"]) == sorted(result["Debt-to-Equity"])
+
+
+def test_grouped_aggregate_and_count(retriever, companies):
+    plan = plan_query("Average ROE by country", retriever)
+    result, matched = execute(plan, retriever)
+    assert matched == len(companies)
+    assert result["value"].to_dict() == pytest.approx(companies.groupby("Country", observed=True)["ROE (%)"].mean().to_dict())
+
+    plan = plan_query("How many companies in Egypt?", retriever)
+    assert format_answer(plan, *execute(plan, retriever)) == f"• Number of companies (Egypt): {(companies['Country'] == 'Egypt').sum()}"
+
+
+@pytest.mark.parametrize("query", [
+    "Why are these companies attractive?",
+    "Which of these have the best margins?",
+    "Recommend companies to invest in",
+    "Show the balance sheet of MENA Logistics Co 1",
+    "Tell me about the logistics market",
+])
+def test_questions_needing_reasoning_or_the_conversation_go_to_the_llm(retriever, query):
+    assert plan_query(query, retriever) is None
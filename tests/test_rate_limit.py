@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import BACKGROUND, BATCH, INTERACTIVE, RateLimiter, RateLimitTimeout, SharedPriority, priority
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.001)
+
+
+def _queue(limiter, calls):
+    """Start one acquire per (label, level), each after the previous is waiting; returns the threads and served order"""
+    served = []
+
+    def call(label, level):
+        with priority(level):
+            limiter.acquire()
+        served.append(label)
+
+    threads = []
+    for label, level in calls:
+        thread = threading.Thread(target=call, args=(label, level))
+        thread.start()
+        threads.append(thread)
+        _wait_until(lambda: limiter.depth() == len(threads))
+    return threads, served
+
+
+def test_waiting_calls_are_served_by_priority_then_arrival():
+    limiter = RateLimiter("test", rpm=600)
+    # Empty the buckets and hold everything back until all calls are queued
+    limiter.pause(0.2)
+    threads, served = _queue(limiter, [
+        ("background", BACKGROUND), ("batch", BATCH), ("first question", INTERACTIVE), ("second question", INTERACTIVE),
+    ])
+    for thread in threads:
+        thread.join(5)
+
+    assert served == ["first question", "second question", "batch", "background"]
+    assert limiter.depth() == 0
+
+
+def test_a_raised_shared_priority_moves_a_call_already_waiting_up_the_queue():
+    limiter = RateLimiter("test", rpm=600)
+    limiter.pause(0.2)
+    shared = SharedPriority(BATCH)
+    threads, served = _queue(limiter, [("batch", BATCH), ("shared", shared), ("background", BACKGROUND)])
+    # An interactive caller joins the shared call while it waits
+    shared.raise_to(INTERACTIVE)
+    for thread in threads:
+        thread.join(5)
+
+    assert served == ["shared", "batch", "background"]
+
+
+def test_acquire_waits_for_capacity_to_refill():
+    limiter = RateLimiter("test", rpm=600)
+    limiter.pause(0)
+    # Drained to empty, one request refills in 0.1 s at 10 per second
+    waited = limiter.acquire()
+    assert 0.05 < waited < 1
+
+
+def test_acquire_gives_up_after_max_wait_and_leaves_the_queue():
+    limiter = RateLimiter("test", rpm=60, max_wait=0.05)
+    limiter.pause(10)
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire()
+
+    assert time.monotonic() - started < 1
+    assert limiter.depth() == 0
+
@@ -0,0 +1,72 @@
+import pytest
+
+from rendering import StreamingHtmlRenderer, message_html, process_content_to_html, render_message_html, transcript_page
+
+
+@pytest.mark.parametrize("line", [
+    "• [Click](javascript:alert(document.cookie))",
+    "• [Click](data:text/html;base64,PHNjcmlwdD4=)",
+    "• [Click](vbscript:msgbox(1))",
+    "javascript:alert(1)",
+])
+def test_only_web_urls_become_anchors(line):
+    assert "<a " not in process_content_to_html(line)
+
+
+def test_markdown_link_keeps_parentheses_in_the_url():
+    html = process_content_to_html("• [Port of Jeddah](https://en.wikipedia.org/wiki/Jeddah_(port)) expands")
+    assert '<a href="https://en.wikipedia.org/wiki/Jeddah_(port)" target="_blank">Port of Jeddah</a> expands' in html
+
+
+def test_www_link_gets_a_scheme():
+    assert 'href="https://www.example.com/report"' in process_content_to_html("• [Report](www.example.com/report)")
+
+
+def test_link_text_and_url_are_escaped():
+    html = process_content_to_html('• [<b>Deal</b>](https://example.com/?a=1&b="2")')
+    assert '<a href="https://example.com/?a=1&amp;b=&quot;2&quot;" target="_blank">&lt;b&gt;Deal&lt;/b&gt;</a>' in html
+
+
+ANSWER = "1. 📊 Summary of Findings\n• [Deal](https://example.com/deal) closed\n\n2. 🏢 Insights\nFreight leads"
+
+
+def test_message_html_is_rendered_once_per_distinct_message():
+    render_message_html.cache_clear()
+    first = {"role": "assistant", "content": ANSWER}
+    second = {"role": "assistant", "content": ANSWER}
+
+    assert message_html(first) == message_html(second)
+    info = render_message_html.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+    # The message keeps its HTML, so later reruns skip even the cache lookup
+    assert first["html"] == message_html(first)
+    assert render_message_html.cache_info().hits == 1
+
+
+def test_user_messages_are_escaped_and_kept_on_one_markdown_block():
+    html = render_message_html("user", "<script>x</script>\n\nsecond line")
+    assert "&lt;script&gt;" in html
+    assert "second line" in html and "\n\n" not in html
+
+
+def test_transcript_page_shows_the_latest_messages():
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(25)]
+
+    hidden, html = transcript_page(messages, 20)
+    assert hidden == 5
+    assert "message 5" in html and "message 4" not in html and "message 24" in html
+
+    hidden, html = transcript_page(messages, 40)
+    assert hidden == 0
+    assert html.count("chat-message") == 25
+    assert transcript_page([], 20) == (0, "")
+
+
+def test_streaming_render_matches_a_full_render_however_the_text_arrives():
+    renderer = StreamingHtmlRenderer()
+    for end in range(1, len(ANSWER) + 1, 7):
+        renderer.update(ANSWER[:end])
+    assert renderer.update(ANSWER) == process_content_to_html(ANSWER)
+    # Text that rewrites what came before is rendered again from the start
+    rewritten = ANSWER.replace("Summary", "Overview")
+    assert renderer.update(rewritten) == process_content_to_html(rewritten)
@@ -0,0 +1,48 @@
+import pytest
+
+from response_cache import SemanticResponseCache
+
+ABOVE = "Which last mile companies in the UAE have EBITDA margin above 20% and strong growth?"
+
+
+@pytest.fixture
+def retriever(companies):
+    from retrieval import DatasetRetriever
+    return DatasetRetriever(companies)
+
+
+def _cache_with(retriever, query, response):
+    cache = SemanticResponseCache()
+    parsed = retriever.parse(query)
+    cache.store(query, "first_query", 1, response, parsed.values, parsed)
+    return cache
+
+
+def _lookup(cache, retriever, query):
+    return cache.lookup(query, "first_query", 1, retriever.parse(query))
+
+
+def test_paraphrase_is_served_from_the_cache(retriever):
+    cache = _cache_with(retriever, "What are the best cold chain investments in Saudi Arabia?", "answer")
+    assert _lookup(cache, retriever, "What are the best cold chain investment opportunities in KSA?") == "answer"
+
+
+@pytest.mark.parametrize("query", [
+    ABOVE.replace("above", "below"),
+    ABOVE.replace("above", "at least"),
+    ABOVE.replace("EBITDA margin", "net margin"),
+    ABOVE.replace("UAE", "Egypt"),
+])
+def test_opposite_condition_is_not_served_the_cached_answer(retriever, query):
+    cache = _cache_with(retriever, ABOVE, "above answer")
+    assert _lookup(cache, retriever, query) is None
+
+
+def test_negated_question_is_not_served_the_cached_answer(retriever):
+    cache = _cache_with(retriever, "Top cold chain companies in Egypt including Sequoia-backed ones", "including answer")
+    assert _lookup(cache, retriever, "Top cold chain companies in Egypt excluding Sequoia-backed ones") is None
+
+
+def test_ranking_direction_is_part_of_the_match(retriever):
+    cache = _cache_with(retriever, "Freight companies in Oman with the highest ROE", "highest answer")
+    assert _lookup(cache, retriever, "Freight companies in Oman with the lowest ROE") is None
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from retrieval import DatasetRetriever, NumericFilter, parse_numeric_filters, to_numeric
+
+
+@pytest.fixture
+def retriever(companies):
+    return DatasetRetriever(companies)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("debt to equity < 1", [NumericFilter("Debt-to-Equity", "<", 1.0)]),
+    ("D/E under 0.5", [NumericFilter("Debt-to-Equity", "<", 0.5)]),
+    ("EBITDA margin above 20%", [NumericFilter("EBITDA Margin (%)", ">", 20.0)]),
+    ("ROE (%) of at least 15", [NumericFilter("ROE (%)", ">=", 15.0)]),
+    ("revenue between 10 and 5 million", [NumericFilter("Revenue (USD)", "between", (5e6, 1e7))]),
+    ("sales over 20m and growth rate at most 30%", [
+        NumericFilter("Revenue (USD)", ">", 2e7), NumericFilter("Growth Rate", "<=", 30.0),
+    ]),
+    ("companies with strong growth", []),
+])
+def test_numeric_filters_are_parsed_with_units(query, expected):
+    assert parse_numeric_filters(query) == expected
+
+
+def test_percentage_strings_are_read_as_numbers():
+    assert list(to_numeric(pd.Series(["40%", "1,250", "n/a"]))[:2]) == [40.0, 1250.0]
+    assert np.isnan(to_numeric(pd.Series(["n/a"]))[0])
+
+
+def test_filter_mask_matches_the_typed_and_the_raw_dataset(companies, raw_companies):
+    filters = parse_numeric_filters("growth rate above 30% and debt to equity < 1")
+    expected = (companies["Growth Rate"] > 30) & (companies["Debt-to-Equity"] < 1)
+
+    assert DatasetRetriever(companies).filter_mask(filters).tolist() == expected.tolist()
+    # The CSV as text ("40%") gives the same rows
+    assert DatasetRetriever(raw_companies).filter_mask(filters).tolist() == expected.tolist()
+
+
+def test_parse_finds_indexed_values_through_aliases(retriever):
+    parsed = retriever.parse("Saudi cold chain companies backed by Sequoia")
+    assert parsed.values == {"Country": ["KSA"], "Subsector": ["Cold Chain"], "Investors": ["Sequoia"]}
+    assert retriever.parse("firms in Dubai or Abu Dhabi").values == {"Country": ["UAE"]}
+
+
+@pytest.mark.parametrize("query, column, ascending", [
+    ("highest ROE in Egypt", "ROE (%)", False),
+    ("lowest net margin", "Net Profit Margin (%)", True),
+    # Lower is better for leverage unless the question asks for the highest
+    ("debt to equity < 1", "Debt-to-Equity", True),
+    ("highest debt to equity", "Debt-to-Equity", False),
+    # "at least" is a condition, not a request for the lowest values
+    ("ROE at least 15", "ROE (%)", False),
+    ("cold chain companies", "Revenue (USD)", False),
+])
+def test_parse_picks_the_sort_order(retriever, query, column, ascending):
+    parsed = retriever.parse(query)
+    assert (parsed.sort_column, parsed.ascending) == (column, ascending)
+
+
+def test_match_scores_use_the_inverted_index(retriever, companies):
+    scores = retriever.match_scores(retriever.parse("cold chain companies in Egypt"))
+    egypt = (companies["Country"] == "Egypt").to_numpy()
+    cold_chain = (companies["Subsector"] == "Cold Chain").to_numpy()
+    assert scores.tolist() == (egypt.astype(int) + cold_chain).tolist()
+
+
+def test_search_keeps_full_matches_and_ranks_them(retriever, companies):
+    rows = retriever.search("Egyptian cold chain companies in Egypt with the highest ROE", k=50)
+    expected = companies[(companies["Country"] == "Egypt") & (companies["Subsector"] == "Cold Chain")]
+    assert set(rows["Company Name"]) == set(expected["Company Name"])
+    assert list(rows["ROE (%)"]) == sorted(rows["ROE (%)"], reverse=True)
+
+
+def test_search_relaxes_to_partial_matches_when_nothing_matches_fully(retriever, companies):
+    rows = retriever.search("companies in Egypt backed by an investor named Nobody", k=5)
+    assert (rows["Country"] == "Egypt").all()
+    assert len(retriever.search("EBITDA margin above 1000%", k=5)) == 5
+
+
+def test_rows_for_keeps_the_requested_order_and_skips_unknown_names(retriever):
+    rows = retriever.rows_for(["MENA Logistics Co 3", "Unknown Co", "MENA Logistics Co 1"])
+    assert list(rows["Company Name"]) == ["MENA Logistics Co 3", "MENA Logistics Co 1"]
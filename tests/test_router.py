@@ -0,0 +1,73 @@
+import pytest
+
+from router import RouteDecision, TRAINING_EXAMPLES, route_query
+
+
+def _never_called(query):
+    raise AssertionError(f"LLM fallback called for {query!r}")
+
+
+@pytest.mark.parametrize("query, route", [
+    ("Show me the latest news on this", "SEARCH_WEB"),
+    ("Which companies have the highest ROE?", "ANALYZE_DATA"),
+    ("What does EBITDA stand for?", "GENERAL_RESPONSE"),
+    # Benchmark keywords win even when the data is mentioned too
+    ("How do the ROE figures of these companies compare with global peers?", "SEARCH_AND_ANALYZE"),
+])
+def test_clear_keywords_are_routed_by_rules(query, route):
+    decision = route_query(query, _never_called)
+    assert (decision.route, decision.stage) == (route, "rules")
+
+
+def test_mixed_keywords_are_left_to_the_classifier():
+    # One data keyword and one web keyword: neither dominates
+    assert route_query("revenue and news", _never_called).stage != "rules"
+
+
+@pytest.mark.parametrize("route", sorted(TRAINING_EXAMPLES))
+def test_classifier_places_training_examples_without_keywords_in_their_route(route):
+    for example in TRAINING_EXAMPLES[route]:
+        decision = route_query(example)
+        if decision.stage == "classifier":
+            assert decision.route == route, example
+
+
+def test_confident_classification_skips_the_llm():
+    decision = route_query("which of these has the best balance sheet", _never_called)
+    assert decision.stage == "classifier"
+    assert decision.route == "ANALYZE_DATA"
+    assert decision.confidence >= 0.55
+
+
+def test_unsure_classification_asks_the_llm():
+    asked = []
+
+    def llm(query):
+        asked.append(query)
+        return " analyze_data\n"
+
+    decision = route_query("how about Egypt?", llm)
+
+    assert asked == ["how about Egypt?"]
+    assert decision.route == "ANALYZE_DATA"
+    assert decision.stage == "llm"
+    # The classifier's confidence is kept, to show how often the fallback runs and why
+    assert decision.confidence < 0.55
+
+
+def test_unknown_llm_label_falls_back_to_a_general_response():
+    assert route_query("how about Egypt?", lambda query: "I am not sure").route == "GENERAL_RESPONSE"
+
+
+def test_min_confidence_sets_when_the_llm_is_asked():
+    query = "how about Egypt?"
+    below = route_query(query, min_confidence=0.0)
+    assert below.stage == "classifier"
+    assert route_query(query, lambda q: "SEARCH_WEB", min_confidence=below.confidence + 0.01).stage == "llm"
+    assert route_query(query, _never_called, min_confidence=below.confidence) == RouteDecision(below.route, "classifier", below.confidence)
+
+
+def test_without_a_fallback_an_unsure_decision_is_returned_as_is():
+    decision = route_query("xyzzy")
+    assert decision.stage == "classifier"
+    assert decision.confidence == 0.0
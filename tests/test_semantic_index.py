@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pytest
+
+import semantic_index
+from semantic_index import SemanticIndex
+
+QUESTIONS = ("cold chain warehousing", "expanding in free zones", "recently raised a series B round")
+
+
+@pytest.fixture
+def name(request):
+    # The index files are named after the index, so each test gets its own
+    return f"index_{request.node.name}"
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Texts passed to the embedder, per call"""
+    calls = []
+    embed_texts = semantic_index.embed_texts
+
+    def recording(texts, dim):
+        calls.append(list(texts))
+        return embed_texts(texts, dim)
+
+    monkeypatch.setattr(semantic_index, "embed_texts", recording)
+    return calls
+
+
+def _results(index):
+    return [(matches.positions.tolist(), matches.columns) for matches in map(index.search, QUESTIONS)]
+
+
+def test_vectors_are_memory_mapped_from_the_cache_directory(companies, name):
+    index = SemanticIndex(name=name).refreshed(companies)
+    vectors = index._state.vectors
+
+    assert isinstance(vectors, np.memmap)
+    assert os.path.dirname(vectors.filename) == os.path.dirname(semantic_index.cache_path(name))
+    assert vectors.shape == (len(index._state.texts), semantic_index.SEMANTIC_INDEX_DIM)
+    positions, columns = _results(index)[0]
+    assert positions and columns == ("Subsector",)
+    assert set(companies["Subsector"].iloc[positions]) == {"Cold Chain"}
+
+
+def test_another_run_reuses_the_vectors_left_in_the_cache_directory(companies, name, embedded):
+    first = SemanticIndex(name=name).refreshed(companies)
+    assert len(embedded) == 1
+
+    second = SemanticIndex(name=name).refreshed(companies)
+    assert len(embedded) == 1
+    assert _results(second) == _results(first)
+
+
+def test_a_corrupt_cache_is_rebuilt(companies, name, embedded):
+    SemanticIndex(name=name).refreshed(companies)
+    with open(semantic_index.cache_path(f"{name}.json"), "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    index = SemanticIndex(name=name).refreshed(companies)
+    assert len(embedded) == 2
+    assert _results(index)[0][0]
+
+
+def test_large_indexes_search_clusters_and_find_the_same_companies(companies, name, monkeypatch):
+    exact = SemanticIndex(name=name).refreshed(companies)
+    assert exact._state.clusters is None
+
+    monkeypatch.setattr(semantic_index, "SEMANTIC_ANN_THRESHOLD", 10)
+    clustered = SemanticIndex(name=name).refreshed(companies)
+    centroids, order, bounds = clustered._state.clusters
+    assert len(centroids) == int(np.sqrt(len(clustered._state.texts)))
+    assert sorted(order.tolist()) == list(range(len(clustered._state.texts)))
+    assert _results(clustered) == _results(exact)
+
+
+def test_clustered_search_only_scores_the_probed_clusters(companies, name, monkeypatch):
+    monkeypatch.setattr(semantic_index, "SEMANTIC_ANN_THRESHOLD", 10)
+    monkeypatch.setattr(semantic_index, "SEMANTIC_ANN_PROBES", 1)
+    index = SemanticIndex(name=name).refreshed(companies)
+    state = index._state
+    centroids, order, bounds = state.clusters
+
+    query = semantic_index.embed_text(QUESTIONS[0], index.dim)
+    nearest = int(np.argmax(centroids @ query))
+    scored = np.flatnonzero(index._text_scores(state, query))
+    assert set(scored) <= set(order[bounds[nearest]:bounds[nearest + 1]].tolist())
+
+
+def test_refreshing_after_a_reload_embeds_only_new_texts(companies, name, embedded):
+    old = SemanticIndex(name=name).refreshed(companies, 1)
+    edited = companies.head(60).copy()
+    edited["Notes"] = edited["Notes"].cat.add_categories(["Opened a cold chain hub in the Jebel Ali free zone"])
+    edited.loc[0, "Notes"] = "Opened a cold chain hub in the Jebel Ali free zone"
+
+    new = old.refreshed(edited, 2)
+
+    assert embedded[1:] == [["Opened a cold chain hub in the Jebel Ali free zone"]]
+    assert (old.version, new.version) == (1, 2)
+    assert new._state.slots.shape[0] == 60
+    # Only the current vectors file stays in the cache directory
+    assert [f for f in os.listdir(os.path.dirname(semantic_index.cache_path(name))) if f.startswith(f"{name}.") and f.endswith(".f32")] == [
+        os.path.basename(new._state.vectors.filename)
+    ]
+    # The earlier index still answers in terms of its own 100 rows
+    assert max(max(positions, default=0) for positions, _ in _results(old)) >= 60
+    assert all(max(positions, default=0) < 60 for positions, _ in _results(new))
+    assert 0 in new.search("Jebel Ali free zone hub").positions
+
+
+def test_refreshing_an_unchanged_dataset_keeps_the_vectors(companies, name, embedded):
+    old = SemanticIndex(name=name).refreshed(companies, 1)
+    new = old.refreshed(companies, 2)
+    assert len(embedded) == 1
+    assert new._state.vectors is old._state.vectors
@@ -0,0 +1,98 @@
+import types
+
+import pytest
+
+import session_store
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(session_store, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+def test_sessions_are_scoped_to_their_owner(store):
+    alice = store.create_session("alice", "Cold chain in Egypt")
+    bob = store.create_session("bob", "Freight in Oman")
+
+    assert [summary.session_id for summary in store.list_sessions("alice")] == [alice]
+    assert store.get_session("alice", alice).title == "Cold chain in Egypt"
+    # Knowing another owner's session id is not enough to open it
+    assert store.get_session("alice", bob) is None
+    assert store.get_session("mallory", alice) is None
+    assert store.list_sessions("mallory") == []
+
+
+def test_messages_come_back_in_append_order_without_derived_fields(store):
+    session_id = store.create_session("alice", "chat")
+    for i in range(12):
+        store.append_message(session_id, {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}", "html": "<p>"})
+
+    messages = store.load_messages(session_id)
+    assert [message["content"] for message in messages] == [f"message {i}" for i in range(12)]
+    assert set(messages[0]) == {"role", "content"}
+    # Callers get a copy they can decorate freely
+    messages[0]["html"] = "<p>"
+    messages.append({"role": "user", "content": "not saved"})
+    assert len(store.load_messages(session_id)) == 12
+    assert "html" not in store.load_messages(session_id)[0]
+
+
+def test_sessions_are_listed_most_recently_updated_first(store, clock):
+    first = store.create_session("alice", "first")
+    clock.now += 1
+    second = store.create_session("alice", "second")
+    clock.now += 1
+    store.append_message(first, {"role": "user", "content": "back to the first chat"})
+
+    assert [summary.session_id for summary in store.list_sessions("alice")] == [first, second]
+    assert [summary.session_id for summary in store.list_sessions("alice", limit=1)] == [first]
+
+
+def test_sqlite_store_survives_a_restart(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    session_id = SQLiteSessionStore(path).create_session("alice", "chat")
+    SQLiteSessionStore(path).append_message(session_id, {"role": "user", "content": "hello"})
+
+    reopened = SQLiteSessionStore(path)
+    assert reopened.get_session("alice", session_id).title == "chat"
+    assert reopened.load_messages(session_id) == [{"role": "user", "content": "hello"}]
+
+
+def test_sqlite_cache_drops_idle_transcripts(tmp_path, clock):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path, max_idle=60)
+    session_id = store.create_session("alice", "chat")
+    store.load_messages(session_id)
+    # Another worker appends to the same chat
+    SQLiteSessionStore(path).append_message(session_id, {"role": "user", "content": "from another worker"})
+
+    assert store.load_messages(session_id) == []
+    clock.now += 61
+    assert store.load_messages(session_id) == [{"role": "user", "content": "from another worker"}]
+
+
+def test_sqlite_cache_keeps_at_most_max_cached_transcripts(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), max_cached=2)
+    sessions = [store.create_session("alice", f"chat {i}") for i in range(3)]
+    clock.now += 1
+    store.load_messages(sessions[0])
+
+    assert list(store._cached) == [sessions[2], sessions[0]]
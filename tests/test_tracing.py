@@ -0,0 +1,32 @@
+import json
+
+import tracing
+from tracing import JsonlExporter, Span, loggable_query
+
+
+def _finished_span(name, **attributes):
+    finished = Span(name, attributes=attributes)
+    finished.duration = 0.001
+    return finished
+
+
+def test_exporter_rotates_by_size_and_keeps_the_newest_spans(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonlExporter(str(path), max_bytes=2000, backup_count=2)
+    for i in range(40):
+        exporter.export(_finished_span("stage", index=i))
+
+    files = sorted(tmp_path.iterdir())
+    assert [f.name for f in files] == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(f.stat().st_size <= 2000 for f in files)
+    last = json.loads(path.read_text(encoding="utf-8").splitlines()[-1])
+    assert last["attributes"]["index"] == 39
+
+
+def test_queries_are_hashed_unless_opted_in(monkeypatch):
+    question = "Top cold chain companies in Egypt"
+    hashed = loggable_query(question)
+    assert question not in hashed
+    assert hashed == loggable_query(question)
+    monkeypatch.setattr(tracing, "TRACE_QUERY_TEXT", True)
+    assert loggable_query(question) == question
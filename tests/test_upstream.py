@@ -0,0 +1,171 @@
+import types
+
+import httpx
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, CircuitOpenError, Provider, RetryableStatusError, RetryBudget
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class _Attempts:
+    """Raises or returns the queued outcomes in turn, counting calls"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def _status_error(status, retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    return RetryableStatusError(httpx.Response(status, headers=headers))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(upstream, "time", types.SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    monkeypatch.setattr(upstream.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def test_retry_budget_allows_a_fraction_of_requests_plus_a_trickle(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0.1, max_balance=2)
+
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    clock.now += 10
+    assert budget.try_spend()
+
+
+def test_breaker_opens_after_the_threshold_and_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=30)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    probe = breaker.before_call()
+    assert probe is not None
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is None
+
+
+def test_a_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    clock.now += 30
+    assert breaker.before_call() is not None
+
+
+def test_an_interrupted_probe_does_not_wedge_the_breaker(clock):
+    provider = Provider("test")
+    provider.breaker.failure_threshold = 1
+    provider.breaker.record_failure()
+    clock.now += upstream.BREAKER_COOLDOWN
+
+    with pytest.raises(KeyboardInterrupt):
+        provider.call(_Attempts(KeyboardInterrupt()))
+
+    assert provider.breaker.state == "half-open"
+    assert provider.call(_Attempts("ok")) == "ok"
+    assert provider.breaker.state == "closed"
+
+
+def test_retryable_failures_are_retried_with_backoff(clock):
+    provider = Provider("test")
+    attempt = _Attempts(httpx.ConnectError("refused"), _status_error(503), "ok")
+
+    assert provider.call(attempt) == "ok"
+    assert attempt.calls == 3
+    assert clock.slept == [upstream.BACKOFF_BASE, upstream.BACKOFF_BASE * 2]
+
+
+def test_the_last_retryable_failure_is_raised_after_max_attempts(clock):
+    provider = Provider("test")
+    attempt = _Attempts(*[_status_error(502) for _ in range(upstream.MAX_ATTEMPTS)])
+
+    with pytest.raises(RetryableStatusError):
+        provider.call(attempt)
+    assert attempt.calls == upstream.MAX_ATTEMPTS
+
+
+def test_client_errors_are_not_retried_and_count_as_the_service_answering(clock):
+    provider = Provider("test")
+    provider.breaker.record_failure()
+    attempt = _Attempts(ValueError("bad request"))
+
+    with pytest.raises(ValueError):
+        provider.call(attempt)
+    assert attempt.calls == 1
+    assert provider.breaker._failures == 0
+
+
+def test_retries_stop_when_the_budget_is_spent(clock):
+    provider = Provider("test")
+    provider.budget = RetryBudget(ratio=0, min_per_second=0, max_balance=1)
+    provider.budget.try_spend()
+    attempt = _Attempts(_status_error(500), "ok")
+
+    with pytest.raises(RetryableStatusError):
+        provider.call(attempt)
+    assert attempt.calls == 1
+
+
+def test_retry_after_pauses_the_provider(clock, monkeypatch):
+    provider = Provider("test")
+    paused = []
+    monkeypatch.setattr(provider.limiter, "pause", paused.append)
+
+    assert provider.call(_Attempts(_status_error(429, "7"), "ok")) == "ok"
+    assert paused == [7.0]
+    # An unreadable header is ignored, and an excessive one is capped
+    provider.call(_Attempts(_status_error(429, "soon"), _status_error(429, "99999"), "ok"))
+    assert paused == [7.0, upstream.RATE_LIMIT_MAX_WAIT]
+
+
+def test_a_retry_in_progress_is_not_cut_off_when_the_breaker_opens(clock):
+    provider = Provider("test")
+    provider.breaker.failure_threshold = 1
+    attempt = _Attempts(_status_error(503), "ok")
+
+    assert provider.call(attempt) == "ok"
+    assert attempt.calls == 2
+    assert provider.breaker.state == "closed"
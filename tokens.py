@@ -0,0 +1,49 @@
+"""Token counting for prompt budgets: exact with tiktoken when installed, estimated otherwise"""
+import functools
+import re
+
+TOKENIZER_MODEL = "gpt-4"
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Without tiktoken: words and punctuation marks count as one token each, numbers one per three digits as BPE splits them
+_ESTIMATE_RE = re.compile(r"\d{1,3}|[^\W\d]+|[^\w\s]")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception:
+        # Not installed, or the encoding could not be downloaded
+        return None
+
+
+def counts_are_exact():
+    """Whether counts come from the model's tokenizer rather than the estimate"""
+    return _encoding() is not None
+
+
+def count_tokens(text):
+    """Number of tokens text takes up in a prompt"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_ESTIMATE_RE.findall(text))
+
+
+def count_message_tokens(messages):
+    """Tokens taken up by a list of chat messages"""
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def truncate_to_tokens(text, limit):
+    """Longest prefix of text that fits in limit tokens"""
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= limit else encoding.decode(tokens[:limit])
+    matches = list(_ESTIMATE_RE.finditer(text))
+    return text if len(matches) <= limit else text[:matches[limit].start()].rstrip()
@@ -0,0 +1,196 @@
+"""Tracing spans for the answer pipeline, exported as OpenTelemetry-shaped JSON lines"""
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+from storage import cache_path
+
+logger = logging.getLogger(__name__)
+
+# Finished spans are appended here, one JSON object per line; set to "" to keep them in memory only
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+
+# The export file is rotated once it would grow past this many bytes, keeping this many older files (traces.jsonl.1, ...)
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "3"))
+
+# Record analyst questions verbatim in spans and logs; by default only a short hash that still groups repeats
+TRACE_QUERY_TEXT = os.getenv("TRACE_QUERY_TEXT", "0") == "1"
+
+# Durations kept per stage for the latency panel
+TRACE_STATS_WINDOW = int(os.getenv("TRACE_STATS_WINDOW", "500"))
+
+SERVICE_NAME = "pif-investment-agent"
+
+_current = ContextVar("current_span", default=None)
+_durations = defaultdict(lambda: deque(maxlen=TRACE_STATS_WINDOW))
+_stats_lock = threading.Lock()
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+class Span:
+    """One timed stage; attributes and events are attached while it runs"""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def add_event(self, name, **attributes):
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes})
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = self.elapsed()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        observe(self.name, self.duration)
+        get_exporter().export(self)
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.start_ns + int(self.duration * 1e9),
+            "durationMs": round(self.duration * 1e3, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+def loggable_query(text):
+    """text as traces and logs may record it: verbatim if TRACE_QUERY_TEXT is set, else a short hash"""
+    if TRACE_QUERY_TEXT:
+        return text
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file, rotating it by size; the file is opened once and shared"""
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backup_count=TRACE_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def export(self, span):
+        if self._file is None:
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock:
+                size = self._file.tell()
+                # A span larger than the limit still gets a file of its own
+                if self.max_bytes and size and size + len(line.encode("utf-8")) > self.max_bytes:
+                    self._rotate()
+                self._file.write(line)
+                self._file.flush()
+        except OSError:
+            logger.warning("Could not write span %s to %s", span.name, self.path, exc_info=True)
+
+    def _rotate(self):
+        """Shift path -> path.1 -> path.2 ..., dropping the oldest, and start an empty file"""
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "w", encoding="utf-8")
+
+
+def get_exporter():
+    """Return the process-wide span exporter for TRACE_EXPORT_PATH"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                path = TRACE_EXPORT_PATH
+                if path and not os.path.isabs(path):
+                    path = cache_path(path)
+                _exporter = JsonlExporter(path)
+    return _exporter
+
+
+def current_span():
+    """The innermost open span in this context, or None"""
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Set attributes on the current span, if there is one"""
+    active = _current.get()
+    if active is not None:
+        active.set(**attributes)
+
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Time the enclosed block as a child of parent (default: the current span)
+
+    Works inside generators: the span stays current between yields and the
+    previous span is restored when it ends.
+    """
+    previous = _current.get()
+    active = Span(name, parent if parent is not None else previous, attributes)
+    _current.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        # A generator closed early is not a failure
+        active.end(None if isinstance(e, GeneratorExit) else e)
+        raise
+    else:
+        active.end()
+    finally:
+        # Only undo our own change; a generator finalized elsewhere must not clobber another context
+        if _current.get() is active:
+            _current.set(previous)
+
+
+def observe(name, seconds):
+    """Record a duration for the latency panel without exporting a span"""
+    with _stats_lock:
+        _durations[name].append(seconds)
+
+
+def stage_latencies():
+    """Count, p50 and p95 (milliseconds) per stage over its most recent durations"""
+    with _stats_lock:
+        samples = {name: np.array(values) * 1e3 for name, values in _durations.items() if values}
+    return {
+        name: {"count": len(values), "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+        for name, values in sorted(samples.items())
+    }
@@ -0,0 +1,299 @@
+"""Shared, pooled clients for OpenAI and Perplexity with timeouts, retries and circuit breaking"""
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import openai
+
+from rate_limit import OPENAI_RPM, OPENAI_TPM, PERPLEXITY_RPM, RATE_LIMIT_MAX_WAIT, RateLimiter
+from tokens import count_message_tokens
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+PERPLEXITY_URL = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai") + "/chat/completions"
+
+# Timeouts (seconds); read timeouts bound the gap between bytes, not the whole call
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "90"))
+PERPLEXITY_TIMEOUT = float(os.getenv("PERPLEXITY_TIMEOUT", "30"))
+
+# Connection pool shared by every session in the process
+MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "16"))
+KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+
+# Retries: at most MAX_ATTEMPTS per call, and overall no more than RETRY_BUDGET_RATIO of traffic
+MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+RETRY_BUDGET_RATIO = float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND", "0.2"))
+
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))
+
+# Completion tokens reserved against the TPM limit when a request sets no max_tokens
+EXPECTED_COMPLETION_TOKENS = int(os.getenv("OPENAI_EXPECTED_COMPLETION_TOKENS", "600"))
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+RETRYABLE_ERRORS = (
+    httpx.TimeoutException,
+    httpx.TransportError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_lock = threading.Lock()
+_http_client = None
+_openai_client = None
+
+
+class CircuitOpenError(Exception):
+    """The provider has been failing; calls are short-circuited until the cooldown ends"""
+
+
+class RetryableStatusError(Exception):
+    """An HTTP response whose status is worth retrying"""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent requests so retries cannot amplify an outage"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_BUDGET_MIN_PER_SECOND, max_balance=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = max_balance
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.max_balance, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_spend(self):
+        """Take one retry from the budget, returning False if it is exhausted"""
+        with self._lock:
+            self._refill()
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open single probe after the cooldown"""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        # Token of the call probing a half-open circuit, None when no probe is out
+        self._probe = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now; returns a probe token if this call is the probe"""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            if time.monotonic() - self._opened_at < self.cooldown or self._probe is not None:
+                raise CircuitOpenError(f"{self.name} is temporarily unavailable, please try again shortly")
+            self._probe = object()
+            return self._probe
+
+    def end_probe(self, probe):
+        """Give up probe if it ended without a success or failure being recorded, e.g. on KeyboardInterrupt"""
+        with self._lock:
+            if self._probe is probe:
+                self._probe = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            probing = self._probe is not None
+            if probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or probing:
+                    logger.warning("Circuit for %s opened after %d failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
+                self._probe = None
+
+
+class Provider:
+    """Rate limiter, retry budget and circuit breaker for one upstream service"""
+
+    def __init__(self, name, rpm=0, tpm=0):
+        self.name = name
+        self.limiter = RateLimiter(name, rpm, tpm)
+        self.budget = RetryBudget()
+        self.breaker = CircuitBreaker(name)
+
+    def call(self, attempt, tokens=0):
+        """Run attempt() once the rate limits allow, with jittered exponential backoff on retryable failures
+
+        The circuit breaker is consulted once per call: retries of a call that
+        got through carry on even if other calls open the circuit meanwhile.
+        """
+        with span("upstream.call", provider=self.name) as call_span:
+            probe = self.breaker.before_call()
+            try:
+                return self._attempts(attempt, tokens, call_span)
+            finally:
+                if probe is not None:
+                    self.breaker.end_probe(probe)
+
+    def _attempts(self, attempt, tokens, call_span):
+        self.budget.record_request()
+        queued = 0.0
+        for attempt_number in range(1, MAX_ATTEMPTS + 1):
+            # Every attempt, retries included, counts against the provider's limits
+            queued += self.limiter.acquire(tokens)
+            call_span.set(attempts=attempt_number, retries=attempt_number - 1, queue_ms=round(queued * 1e3, 1))
+            try:
+                result = attempt()
+            except (RetryableStatusError,) + RETRYABLE_ERRORS as e:
+                call_span.set(http_status=_status_code(e))
+                self.breaker.record_failure()
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    # The provider says when it will take requests again; hold every caller back until then
+                    self.limiter.pause(retry_after)
+                if attempt_number == MAX_ATTEMPTS or not self.budget.try_spend():
+                    raise
+                # Full jitter keeps retries from many sessions from arriving in lockstep
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt_number - 1)))
+                logger.info("Retrying %s in %.2fs after %s (attempt %d)", self.name, delay, e, attempt_number)
+                call_span.add_event("retry", error=str(e), delay=round(delay, 3))
+                time.sleep(delay)
+            except Exception as e:
+                # The service answered; a client-side error says nothing about its health
+                call_span.set(http_status=_status_code(e))
+                self.breaker.record_success()
+                raise
+            else:
+                call_span.set(http_status=getattr(result, "status_code", 200))
+                self.breaker.record_success()
+                return result
+
+
+def _status_code(error):
+    """HTTP status carried by an upstream error, if any"""
+    response = getattr(error, "response", None)
+    return getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on an upstream error, if it has one"""
+    response = getattr(error, "response", None)
+    try:
+        return min(RATE_LIMIT_MAX_WAIT, float(response.headers["retry-after"]))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+PROVIDERS = {
+    "openai": Provider("OpenAI", OPENAI_RPM, OPENAI_TPM),
+    "perplexity": Provider("Perplexity", PERPLEXITY_RPM),
+}
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def get_http_client():
+    """Return the process-wide keep-alive HTTP client used for Perplexity"""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    limits=_limits(),
+                    timeout=httpx.Timeout(PERPLEXITY_TIMEOUT, connect=CONNECT_TIMEOUT)
+                )
+    return _http_client
+
+
+def get_openai_client():
+    """Return the process-wide OpenAI client; retries are handled here, not by the SDK"""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=0,
+                    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    http_client=httpx.Client(limits=_limits())
+                )
+    return _openai_client
+
+
+def create_chat_completion(**kwargs):
+    """Call the OpenAI chat completions API through the shared client
+
+    With stream=True only opening the stream is retried; a stream that breaks
+    midway surfaces its error to the caller. The prompt plus max_tokens (or
+    EXPECTED_COMPLETION_TOKENS) is reserved against the TPM limit.
+    """
+    tokens = count_message_tokens(kwargs["messages"]) + (kwargs.get("max_tokens") or EXPECTED_COMPLETION_TOKENS)
+    return PROVIDERS["openai"].call(lambda: get_openai_client().chat.completions.create(**kwargs), tokens)
+
+
+def queue_depths():
+    """Calls waiting for rate limit capacity, per provider"""
+    return {provider.name: provider.limiter.depth() for provider in PROVIDERS.values()}
+
+
+def post_perplexity(payload):
+    """POST a chat completion request to Perplexity and return the final response"""
+    headers = {
+        "Authorization": f"Bearer {os.getenv('PERPLEXITY_API_KEY')}",
+        "Content-Type": "application/json"
+    }
+
+    def attempt():
+        response = get_http_client().post(PERPLEXITY_URL, headers=headers, json=payload)
+        if response.status_code in RETRYABLE_STATUS:
+            raise RetryableStatusError(response)
+        return response
+
+    try:
+        return PROVIDERS["perplexity"].call(attempt)
+    except RetryableStatusError as e:
+        return e.response